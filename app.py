@@ -1,103 +1,645 @@
-from flask import Flask, request, jsonify, redirect, url_for
-import importlib
-import smtplib
+from flask import Flask, g, request, jsonify, redirect, url_for
+import atexit
+import click
 from email.message import EmailMessage
+import logging
 import os
+from time import perf_counter
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from flask_jwt_extended import create_access_token, JWTManager, jwt_required, get_jwt_identity, get_jwt
-from requests_oauthlib import OAuth2Session
-import requests
-import stripe
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt
+from werkzeug.exceptions import RequestEntityTooLarge
 
+from auth.tokens import create_jwt_manager
+from codec import CodecJSONProvider, create_codec
 from config import config
+from delivery.breaker import create_breakers
+from delivery.queue import DeliveryQueue, QueueFull, create_backend, parse_weights
+from delivery.http import DeliveryError, create_delivery
+from delivery.log import create_delivery_log
+from delivery.routes import load_routes
+from delivery.smtp import create_transport
+from ingest.batch import BatchFormatError, iter_batch
+from ingest.body import create_limits, spool
+from ingest.capture import create_capture
+from ingest.idempotency import create_guard, event_key
+from ingest.signatures import create_verifier
+from observability import metrics
+from observability.logs import configure_logging, new_request_id, request_id
+import ratelimit.gcra  # noqa: F401 - registers the "gcra" strategy
+import ratelimit.storage  # noqa: F401 - registers the sqlite:// storage
+from ratelimit.keys import make_key_func, source_limit
+from storage.users import create_user_store
+from transformers.digest import create_aggregator
+from transformers.registry import load_registry
 
 app = Flask(__name__)
 
-# Stripe API Key
-stripe.api_key = config.STRIPE_SECRET_KEY
+# Records are formatted and written on a background thread
+log_listener = configure_logging(config)
+logger = logging.getLogger(__name__)
 
-# In-memory storage for paid users (replace with a database in production)
-paid_users = set()
+# Requests and responses go through the fastest installed JSON codec
+codec = create_codec(config.JSON_CODEC)
+app.json = CodecJSONProvider(app, codec)
+app.config["RATELIMIT_ENABLED"] = config.RATELIMIT_ENABLED
+
+# Parsers and formatters are discovered once, at startup
+registry = load_registry()
+
+# Routes that fan one event out to several formats and destinations
+routes = load_routes(config.ROUTES_FILE, registry)
+
+# Providers retry deliveries; recently seen events are dropped
+idempotency = create_guard(config)
+
+# Sources with a secret must sign their webhooks
+verifier = create_verifier(config)
+
+# Raw inbound webhooks are recorded for replay when CAPTURE_DIR is set
+capture = create_capture(config)
+atexit.register(capture.close)
+
+# Bodies are capped per source before they are read, and large ones are
+# spooled to disk instead of held in memory
+body_limits = create_limits(config)
+app.config['MAX_CONTENT_LENGTH'] = config.BODY_MAX_BYTES
+
+# Metrics of every gunicorn worker are added up when /metrics is scraped.
+# A preloaded master starts no threads; see start_workers().
+metrics_store = metrics.create_store(config)
+if config.METRICS_ENABLED and not config.GUNICORN_PRELOAD:
+    metrics_store.start()
+REQUEST_SECONDS = metrics.histogram(
+    'webhookmaster_request_duration_seconds', 'Time to handle a request',
+    ('endpoint', 'source', 'format', 'status'),
+)
+STAGE_SECONDS = metrics.histogram(
+    'webhookmaster_stage_duration_seconds', 'Time spent decoding, parsing, formatting and delivering',
+    ('stage', 'transformer'),
+)
+DELIVERY_FAILURES = metrics.counter('webhookmaster_delivery_failures_total', 'Deliveries that failed', ('format',))
+SIGNATURE_FAILURES = metrics.counter('webhookmaster_signature_failures_total', 'Webhooks rejected for a missing or invalid signature', ('source',))
+OVERSIZED_BODIES = metrics.counter('webhookmaster_oversized_bodies_total', 'Webhooks rejected for a body over the source limit', ('source',))
+STRIPE_EVENTS = metrics.counter('webhookmaster_stripe_events_total', 'Verified Stripe events handled', ('type',))
+
+# Endpoints whose source and format are recorded with their requests
+INGEST_ENDPOINTS = {'webhook', 'webhook_route', 'webhook_batch'}
+
+# Endpoints whose bodies are limited by the source that sent them
+LIMITED_ENDPOINTS = INGEST_ENDPOINTS | {'stripe_webhook'}
+
+@app.before_request
+def start_timer():
+    g.started = perf_counter()
+
+@app.before_request
+def assign_request_id():
+    g.request_id_token = request_id.set(new_request_id(request.headers.get('X-Request-ID')))
+
+@app.after_request
+def return_request_id(response):
+    response.headers['X-Request-ID'] = request_id.get()
+    return response
+
+@app.teardown_request
+def clear_request_id(exc):
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        request_id.reset(token)
+
+def request_source():
+    if request.endpoint == 'stripe_webhook':
+        return 'stripe'
+    return request.args.get('source', 'default')
+
+@app.before_request
+def limit_body():
+    """
+    Applies the source's body limit. A declared Content-Length over it is
+    rejected before any of the body is read; a chunked body is cut off as
+    soon as it passes the limit.
+    """
+    if request.endpoint not in LIMITED_ENDPOINTS:
+        return None
+    request.max_content_length = body_limits.limit(request_source())
+    if request.content_length is not None and request.content_length > request.max_content_length:
+        raise RequestEntityTooLarge()
+    return None
+
+@app.errorhandler(RequestEntityTooLarge)
+def payload_too_large(error):
+    if request.endpoint in LIMITED_ENDPOINTS:
+        source = request_source()
+        OVERSIZED_BODIES.inc((source if source in registry.sources else 'invalid',))
+    return jsonify({'error': 'Payload too large', 'limit': request.max_content_length}), 413
+
+def request_body():
+    """
+    Returns the raw body of the current request, read once. Bodies over
+    BODY_SPOOL_THRESHOLD are spooled to a temp file and returned as a
+    read-only memory map.
+    """
+    if 'body' not in g:
+        g.body = spool(request.stream, config.BODY_SPOOL_THRESHOLD, directory=config.BODY_SPOOL_DIR)
+    return g.body.view()
+
+@app.teardown_request
+def close_body(exc):
+    body = g.pop('body', None)
+    if body is not None:
+        body.close()
+
+@app.after_request
+def record_request(response):
+    started = g.pop('started', None)
+    if started is None:
+        return response
+    endpoint = request.endpoint or 'unknown'
+    source = output_format = ''
+    if endpoint in INGEST_ENDPOINTS:
+        # Only known names become label values, so clients cannot add series
+        source = request.args.get('source', 'default')
+        source = source if source in registry.sources else 'invalid'
+        if endpoint != 'webhook_route':
+            output_format = request.args.get('format', 'default')
+            output_format = output_format if output_format in registry.formats else 'invalid'
+    REQUEST_SECONDS.observe((endpoint, source, output_format, str(response.status_code)), perf_counter() - started)
+    return response
+
+@app.after_request
+def capture_request(response):
+    # Oversized bodies were never read, so there is nothing to record
+    if not capture.wants(request.path) or response.status_code == 413:
+        return response
+    try:
+        body = request.get_data() if request.endpoint == 'stripe_webhook' else request_body()
+        capture.record(
+            request.method, request.path, request.query_string.decode('latin-1'),
+            request.headers.items(), body, response.status_code,
+        )
+    except OSError as e:
+        logger.error("Could not capture request: %s", e, extra={'event': 'capture.failed'})
+    return response
+
+def payments():
+    """
+    Returns the stripe module, imported on first use since most processes
+    never take a payment.
+    """
+    import stripe
+    stripe.api_key = config.STRIPE_SECRET_KEY
+    return stripe
+
+def oauth_session(client_id, **kwargs):
+    """
+    Starts a Discord OAuth2 session, importing requests_oauthlib on first use.
+    """
+    from requests_oauthlib import OAuth2Session
+    return OAuth2Session(client_id, **kwargs)
+
+# Paid users persist in DATABASE_PATH and are shared by every worker
+paid_users = create_user_store(config)
 
 # Setup the Flask-JWT-Extended extension
 app.config["JWT_SECRET_KEY"] = config.JWT_SECRET_KEY
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = config.JWT_ACCESS_TOKEN_EXPIRES
 app.config["JWT_REFRESH_TOKEN_EXPIRES"] = config.JWT_REFRESH_TOKEN_EXPIRES
-jwt = JWTManager(app)
+# Tokens are verified once per worker, then served from a cache until they expire
+jwt = create_jwt_manager(app, config)
+
+def premium_claims(user_id):
+    """
+    Returns the claims that let /protected admit a paid user without a lookup.
+    """
+    if config.JWT_PREMIUM_CLAIM and user_id in paid_users:
+        return {'premium': True}
+    return {}
 
 limiter = Limiter(
     get_remote_address,
     app=app,
     default_limits=["200 per day", "50 per hour"],
-    storage_uri="memory://",
+    storage_uri=config.RATELIMIT_STORAGE_URI,
+    strategy=config.RATELIMIT_STRATEGY,
 )
 
+# Webhook quotas can be keyed on source and identity and set per source
+webhook_rate_key = make_key_func(config.RATELIMIT_KEY, verifier.secrets)
+webhook_rate_limit = source_limit(config.WEBHOOK_RATE_LIMIT, config.RATELIMIT_SOURCE_LIMITS)
+
+def is_duplicate(key):
+    """
+    Records an event key and returns True if the event was already accepted.
+    """
+    return config.IDEMPOTENCY_ENABLED and key is not None and idempotency.seen(key)
+
+def forget_event(key):
+    """
+    Un-records an event key when the event could not be accepted, so the
+    provider's retry is not dropped as a duplicate.
+    """
+    if config.IDEMPOTENCY_ENABLED and key is not None:
+        idempotency.forget(key)
+
+def check_signature(source, body):
+    """
+    Returns an error response if the raw body is not signed by the source.
+    """
+    if verifier.verify(source, request.headers, body):
+        return None
+    SIGNATURE_FAILURES.inc((source,))
+    return jsonify({'error': 'Invalid signature'}), 401
+
+def destination_busy(error, **details):
+    """
+    Asks the sender to retry later while the destination's queue is full.
+    """
+    response = jsonify({'error': str(error), **details})
+    response.headers['Retry-After'] = str(int(config.CIRCUIT_BREAKER_OPEN_SECONDS))
+    return response, 503
+
 @app.route('/webhook', methods=['POST'])
-@limiter.limit("10 per minute")
+@limiter.limit(webhook_rate_limit, key_func=webhook_rate_key)
 def webhook():
     """
-    Ingests a webhook, transforms its payload, and sends it to a new destination.
+    Ingests a webhook, transforms its payload, and queues it for delivery to a new destination.
     """
-    data = request.get_json()
-
     # Get the source and format from the query parameters
     source = request.args.get('source', 'default')
     output_format = request.args.get('format', 'default')
 
-    ALLOWED_SOURCES = ['default', 'github', 'stripe', 'shopify', 'wix', 'cloudflare', 'webflow']
-    ALLOWED_FORMATS = ['default', 'slack', 'discord', 'msteams', 'email']
-
-    if source not in ALLOWED_SOURCES or output_format not in ALLOWED_FORMATS:
+    # Only registered transformers can be selected
+    pipeline = registry.pipeline(source, output_format)
+    if pipeline is None:
         return jsonify({'error': 'Invalid source or format'}), 400
 
-    # Dynamically load the parser and formatter
-    parser_module = importlib.import_module(f"transformers.parsers.{source}")
-    formatter_module = importlib.import_module(f"transformers.formatters.{output_format}")
+    # Unsigned traffic is rejected before any time is spent decoding it
+    body = request_body()
+    rejected = check_signature(source, body)
+    if rejected:
+        return rejected
 
-    # Parse the incoming webhook
-    parsed_data = parser_module.parse_payload(data)
+    if not request.is_json:
+        return jsonify({'error': 'Expected a JSON payload'}), 415
+    started = perf_counter()
+    try:
+        # Sources with a schema only decode the fields their parser reads
+        data = codec.loads(body, registry.schema(source))
+    except ValueError:
+        return jsonify({'error': 'Invalid JSON payload'}), 400
+    decoded = perf_counter()
+
+    # Parse the incoming webhook and format the outgoing payload, timing each
+    parsed = registry.parsers[source](data)
+    parsed_at = perf_counter()
+    STAGE_SECONDS.observe(('decode', source), decoded - started)
+    STAGE_SECONDS.observe(('parse', source), parsed_at - decoded)
+
+    # Retries of an event that was already accepted are not delivered again
+    key = event_key(request.headers, body, f"{source}:{output_format}", config.IDEMPOTENCY_CONTENT_HASH)
+
+    # Events of bursty sources are formatted and delivered as one digest per window
+    if digests.handles(source):
+        if is_duplicate(key):
+            return jsonify({'status': 'duplicate'}), 200
+        digests.add(source, output_format, parsed)
+        return jsonify({'status': 'aggregated'}), 202
+
+    formatted_data = registry.formatters[output_format](parsed)
+    STAGE_SECONDS.observe(('format', output_format), perf_counter() - parsed_at)
+    if is_duplicate(key):
+        return jsonify({'status': 'duplicate'}), 200
+
+    # Queue the transformed payload for delivery to the new destination
+    try:
+        delivery_id = delivery_queue.enqueue({'format': output_format, 'payload': formatted_data})
+    except QueueFull as e:
+        forget_event(key)
+        return destination_busy(e)
+    logger.debug("Accepted %s event for %s", source, output_format, extra={'event': 'webhook.accepted', 'delivery_id': delivery_id})
 
-    # Format the outgoing payload
-    formatted_data = formatter_module.format_payload(parsed_data)
+    return jsonify({'status': 'accepted', 'delivery_id': delivery_id}), 202
 
-    # Send the transformed payload to the new destination
-    send_payload(formatted_data, output_format)
+@app.route('/webhook/route', methods=['POST'])
+@limiter.limit(webhook_rate_limit, key_func=webhook_rate_key)
+def webhook_route():
+    """
+    Ingests a webhook once and queues a delivery for every target of the
+    routes that match it.
+    """
+    source = request.args.get('source', 'default')
+    if source not in registry.sources:
+        return jsonify({'error': 'Invalid source'}), 400
 
-    return jsonify({'status': 'success'}), 200
+    body = request_body()
+    rejected = check_signature(source, body)
+    if rejected:
+        return rejected
 
-def send_payload(data, output_format):
+    if not request.is_json:
+        return jsonify({'error': 'Expected a JSON payload'}), 415
+    try:
+        data = codec.loads(body, registry.schema(source))
+    except ValueError:
+        return jsonify({'error': 'Invalid JSON payload'}), 400
+
+    # Parse once; each target only runs its formatter
+    parsed = registry.parsers[source](data)
+    targets = routes.targets(source, parsed)
+    if not targets:
+        return jsonify({'status': 'unrouted', 'deliveries': []}), 200
+
+    key = event_key(request.headers, body, f"{source}:route", config.IDEMPOTENCY_CONTENT_HASH)
+    if is_duplicate(key):
+        return jsonify({'status': 'duplicate'}), 200
+
+    deliveries = []
+    busy = None
+    for target in targets:
+        format_ = target.template or registry.formatters[target.format]
+        try:
+            job = {'format': target.format, 'payload': format_(parsed)}
+        except Exception as e:
+            deliveries.append({'format': target.format, 'error': f"Could not format event: {e}"})
+            continue
+        if target.url:
+            job['url'] = target.url
+        try:
+            deliveries.append({'format': target.format, 'delivery_id': delivery_queue.enqueue(job)})
+        except QueueFull as e:
+            busy = e
+            deliveries.append({'format': target.format, 'error': str(e)})
+    if busy is not None:
+        # The sender retries the whole event; targets already queued may get it twice
+        forget_event(key)
+        return destination_busy(busy, deliveries=deliveries)
+    return jsonify({'status': 'accepted', 'deliveries': deliveries}), 202
+
+@app.route('/webhook/batch', methods=['POST'])
+@limiter.limit(webhook_rate_limit, key_func=webhook_rate_key)
+def webhook_batch():
     """
-    Sends the payload to the new destination.
+    Ingests many events in one request, sent as a JSON array or as NDJSON.
+
+    The body is decoded one event at a time, and every event goes through the
+    same transformer pipeline as /webhook. Responds with a result per event.
     """
-    if output_format == 'email':
-        sender_email = config.EMAIL_SENDER
-        sender_password = config.EMAIL_PASSWORD
-        receiver_email = config.EMAIL_RECEIVER
-        smtp_host = config.SMTP_HOST
-        smtp_port = config.SMTP_PORT
-
-        if not all([sender_email, sender_password, receiver_email, smtp_host]):
-            print("Email configuration missing. Please set EMAIL_SENDER, EMAIL_PASSWORD, EMAIL_RECEIVER, and SMTP_HOST environment variables.")
-            return
+    source = request.args.get('source', 'default')
+    output_format = request.args.get('format', 'default')
+
+    pipeline = registry.pipeline(source, output_format)
+    if pipeline is None:
+        return jsonify({'error': 'Invalid source or format'}), 400
 
-        msg = EmailMessage()
-        msg["From"] = sender_email
-        msg["To"] = receiver_email
-        msg["Subject"] = data.get('subject', 'Webhook Notification')
-        msg.set_content(data.get('body', str(data)))
+    # A signature covers the whole body, so signed batches are read in full
+    # and checked before any event is accepted
+    stream = request.stream
+    # Captured batches are read in full too, so the body can be recorded
+    if source in verifier.secrets or verifier.required or capture.wants(request.path):
+        rejected = check_signature(source, request_body())
+        if rejected:
+            return rejected
+        stream = g.body.open()
+
+    aggregate = digests.handles(source)
+    results = []
+    try:
+        for index, data in enumerate(iter_batch(stream)):
+            if len(results) >= config.BATCH_MAX_ITEMS:
+                raise BatchFormatError(f"Batches are limited to {config.BATCH_MAX_ITEMS} events")
+            if not isinstance(data, dict):
+                results.append({'index': index, 'error': 'Event must be a JSON object'})
+                continue
+            try:
+                if aggregate:
+                    digests.add(source, output_format, registry.parsers[source](data))
+                    results.append({'index': index, 'status': 'aggregated'})
+                    continue
+                formatted_data = pipeline(data)
+            except Exception as e:
+                results.append({'index': index, 'error': f"Could not transform event: {e}"})
+                continue
+            try:
+                delivery_id = delivery_queue.enqueue({'format': output_format, 'payload': formatted_data})
+            except QueueFull as e:
+                results.append({'index': index, 'error': str(e)})
+                continue
+            results.append({'index': index, 'delivery_id': delivery_id})
+    except BatchFormatError as e:
+        # Events before the error have already been accepted
+        return jsonify({'error': str(e), 'results': results}), 400
+
+    accepted = sum(1 for result in results if 'error' not in result)
+    return jsonify({'status': 'accepted', 'accepted': accepted, 'results': results}), 202
+
+@app.route('/transformers', methods=['GET'])
+def list_transformers():
+    """
+    Lists the sources and formats that /webhook accepts.
+    """
+    return jsonify(sources=sorted(registry.sources), formats=sorted(registry.formats))
 
+@app.route('/routes', methods=['GET'])
+def list_routes():
+    """
+    Lists the fan-out routes used by /webhook/route. Destination URLs carry
+    credentials, so only whether a target has its own URL is shown.
+    """
+    return jsonify(routes=[
+        {
+            'name': route.name,
+            'source': route.source,
+            'match': route.match,
+            'targets': [{'format': target.format, 'custom_url': bool(target.url)} for target in route.targets],
+        }
+        for route in routes.routes
+    ])
+
+def deliver(job):
+    """
+    Delivers a queued job. Runs on the delivery queue's worker threads.
+    Returns a Future for an email left to the SMTP batcher.
+    """
+    started = perf_counter()
+    try:
+        if 'url' in job:
+            sent = send_payload(job['payload'], job['format'], job['url'])
+        else:
+            sent = send_payload(job['payload'], job['format'])
+    except Exception:
+        DELIVERY_FAILURES.inc((job['format'],))
+        raise
+    finally:
+        STAGE_SECONDS.observe(('deliver', job['format']), perf_counter() - started)
+    if sent is not None:
+        sent.add_done_callback(lambda done: done.exception() and DELIVERY_FAILURES.inc((job['format'],)))
+    return sent
+
+# Pooled SMTP connections and HTTP sessions, shared by all delivery workers
+email_transport = create_transport(config)
+http_delivery = create_delivery(config)
+
+# Incoming webhook URLs for the chat formats
+WEBHOOK_URLS = {
+    'slack': config.SLACK_WEBHOOK_URL,
+    'discord': config.DISCORD_WEBHOOK_URL,
+    'msteams': config.MSTEAMS_WEBHOOK_URL,
+}
+
+CIRCUIT_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+# Accepted deliveries are logged before the 202, so a crashed worker's are replayed
+delivery_log = create_delivery_log(config)
+# Each destination gets its own queue, a share of the workers and a circuit
+# breaker, so one that is down or slow does not hold up the others
+breakers = create_breakers(config)
+delivery_queue = DeliveryQueue(
+    deliver,
+    backend=create_backend(
+        config.DELIVERY_QUEUE_BACKEND,
+        config.DELIVERY_QUEUE_PATH,
+        breakers=breakers,
+        capacity=config.DELIVERY_DESTINATION_QUEUE_SIZE,
+        concurrency=config.DELIVERY_DESTINATION_CONCURRENCY,
+        weights=parse_weights(config.DELIVERY_DESTINATION_WEIGHTS),
+    ),
+    workers=config.DELIVERY_WORKERS,
+    log=delivery_log,
+    breakers=breakers,
+)
+
+def emit_digest(source, output_format, parsed):
+    """
+    Formats a closed digest window and queues it like a single event.
+    """
+    delivery_queue.enqueue({'format': output_format, 'payload': registry.formatters[output_format](parsed)})
+
+# Bursty sources are grouped into windows; open windows are sent on shutdown
+digests = create_aggregator(config, emit_digest)
+
+@atexit.register
+def flush_digests():
+    if len(digests):
+        digests.close()
+        delivery_queue.join(timeout=config.DIGEST_SHUTDOWN_TIMEOUT)
+
+metrics.gauge(
+    'webhookmaster_delivery_queue_depth', 'Deliveries waiting in the queue',
+    collect=lambda: {(): delivery_queue.depth()},
+    # Workers share a durable queue, so each of them reports its whole depth
+    aggregate='max' if delivery_queue.backend.durable else 'sum',
+)
+metrics.gauge(
+    'webhookmaster_circuit_state', 'Circuit breaker state per destination: 0 closed, 1 half-open, 2 open', ('destination',),
+    collect=lambda: {
+        (destination,): CIRCUIT_STATES[state] for destination, state in (breakers.states() if breakers else {}).items()
+    },
+)
+metrics.gauge(
+    'webhookmaster_smtp_connections', 'Pooled SMTP connections, by state', ('state',),
+    collect=lambda: {(state,): count for state, count in getattr(email_transport, 'pool', email_transport).stats().items()},
+)
+metrics.gauge(
+    'webhookmaster_http_in_flight', 'HTTP deliveries holding a pooled connection, by host', ('host',),
+    collect=lambda: {(host,): count for host, count in http_delivery.stats().items()},
+)
+
+@app.route('/metrics', methods=['GET'])
+@limiter.exempt
+def metrics_endpoint():
+    """
+    Exposes the metrics of every worker in the Prometheus text format.
+    """
+    if not config.METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return app.response_class(metrics.render(metrics_store.collect()), mimetype='text/plain; version=0.0.4')
+
+@app.cli.group()
+def deliveries():
+    """Inspect and re-drive failed deliveries."""
+
+@deliveries.command('dead-letters')
+def list_dead_letters():
+    """List deliveries that failed for good."""
+    if delivery_log is None:
+        raise click.ClickException("The delivery log is disabled (DELIVERY_LOG_DIR is empty).")
+    for entry in delivery_log.dead_letters.entries():
+        click.echo(f"{entry['id']}  {entry['job']['format']}  {entry['error']}")
+
+@deliveries.command('redrive')
+@click.argument('delivery_ids', nargs=-1)
+def redrive(delivery_ids):
+    """Retry dead letters now, all of them unless IDs are given."""
+    if delivery_log is None:
+        raise click.ClickException("The delivery log is disabled (DELIVERY_LOG_DIR is empty).")
+    dead_letters = delivery_log.dead_letters
+    for entry in dead_letters.entries():
+        if delivery_ids and entry['id'] not in delivery_ids:
+            continue
         try:
-            with smtplib.SMTP(smtp_host, smtp_port) as smtp:
-                smtp.starttls() # Use starttls for port 587
-                smtp.login(sender_email, sender_password)
-                smtp.send_message(msg)
-            print("Email sent successfully!")
+            sent = deliver(entry['job'])
+            if sent is not None:
+                sent.result()
         except Exception as e:
-            print(f"Error sending email: {e}")
+            click.echo(f"Still failing {entry['id']}: {e}")
+            dead_letters.add(entry['id'], entry['job'], str(e))
+        else:
+            click.echo(f"Re-drove {entry['id']}")
+            dead_letters.resolve(entry['id'])
+
+def build_email(data):
+    """
+    Builds the notification email for a formatted payload, or returns None if
+    email is not configured.
+    """
+    sender_email = config.EMAIL_SENDER
+    sender_password = config.EMAIL_PASSWORD
+    receiver_email = config.EMAIL_RECEIVER
+    smtp_host = config.SMTP_HOST
+
+    if not all([sender_email, sender_password, receiver_email, smtp_host]):
+        logger.warning(
+            "Email configuration missing. Please set EMAIL_SENDER, EMAIL_PASSWORD, EMAIL_RECEIVER, and SMTP_HOST environment variables.",
+            extra={'event': 'email.unconfigured'},
+        )
+        return None
+
+    msg = EmailMessage()
+    msg["From"] = sender_email
+    msg["To"] = receiver_email
+    msg["Subject"] = data.get('subject', 'Webhook Notification')
+    msg.set_content(data.get('body', str(data)))
+    return msg
+
+def send_payload(data, output_format, url=None):
+    """
+    Sends the payload to the new destination, or to `url` for a chat format
+    routed to its own webhook. Returns a Future if the email is batched.
+    """
+    url = url or WEBHOOK_URLS.get(output_format)
+    if output_format == 'email':
+        msg = build_email(data)
+        if msg is None:
+            return
+
+        # Errors reach the delivery queue, which dead-letters the job and
+        # counts it against the breaker. Batching transports return a future,
+        # which the queue settles the job with once the batch is sent.
+        sent = email_transport.send(msg)
+        if sent is not None:
+            return sent
+        logger.info("Email sent", extra={'event': 'delivery.sent', 'format': 'email'})
+    elif url:
+        status = http_delivery.deliver(url, data)
+        logger.info("Delivered %s payload (%s)", output_format, status, extra={'event': 'delivery.sent', 'format': output_format})
     else:
-        # For now, we'll just print it to the console.
-        print(f"Sending payload: {data}")
+        # No destination configured, so just log it; the payload is truncated
+        # and only formatted on the logging thread
+        logger.info(
+            "No destination for %s payload", output_format,
+            extra={'event': 'delivery.no_destination', 'format': output_format, 'payload': data},
+        )
 
 
 # Discord OAuth2 settings
@@ -120,7 +662,7 @@ def login():
     if not client_id or not redirect_uri:
         return jsonify({"error": "Discord client ID or redirect URI not configured"}), 500
 
-    discord = OAuth2Session(client_id, scope=DISCORD_SCOPE, redirect_uri=redirect_uri)
+    discord = oauth_session(client_id, scope=DISCORD_SCOPE, redirect_uri=redirect_uri)
     authorization_url, state = discord.authorization_url(DISCORD_AUTHORIZATION_BASE_URL)
     return redirect(authorization_url)
 
@@ -133,27 +675,30 @@ def callback():
     if not client_id or not client_secret or not redirect_uri:
         return jsonify({"error": "Discord OAuth2 credentials not configured"}), 500
 
-    discord = OAuth2Session(client_id, redirect_uri=redirect_uri)
+    discord = oauth_session(client_id, redirect_uri=redirect_uri)
     try:
         token = discord.fetch_token(
             config.DISCORD_TOKEN_URL,
             client_secret=client_secret,
-            authorization_response=request.url
+            authorization_response=request.url,
+            timeout=config.DISCORD_API_TIMEOUT,
         )
     except Exception as e:
         return jsonify({"error": f"Failed to fetch Discord token: {e}"}), 400
 
     # Fetch user information
-    user_info = discord.get(config.DISCORD_USER_URL).json()
+    user_info = discord.get(config.DISCORD_USER_URL, timeout=config.DISCORD_API_TIMEOUT).json()
     user_id = user_info['id']
     username = user_info['username']
 
-    # Add user to Discord guild (placeholder)
+    # Joining the guild happens in the background; the tokens are returned now
     add_user_to_discord_guild(user_id, token['access_token'])
 
     # Create JWTs
-    access_token = create_access_token(identity=user_id, expires_delta=app.config["JWT_ACCESS_TOKEN_EXPIRES"])
-    refresh_token = create_access_token(identity=user_id, expires_delta=app.config["JWT_REFRESH_TOKEN_EXPIRES"], fresh=False)
+    access_token = create_access_token(
+        identity=user_id, expires_delta=app.config["JWT_ACCESS_TOKEN_EXPIRES"], additional_claims=premium_claims(user_id),
+    )
+    refresh_token = create_refresh_token(identity=user_id, expires_delta=app.config["JWT_REFRESH_TOKEN_EXPIRES"])
 
     return jsonify(access_token=access_token, refresh_token=refresh_token)
 
@@ -161,7 +706,10 @@ def callback():
 @jwt_required(refresh=True)
 def refresh():
     identity = get_jwt_identity()
-    access_token = create_access_token(identity=identity, expires_delta=app.config["JWT_ACCESS_TOKEN_EXPIRES"])
+    # Refreshing after a payment returns a token carrying the premium claim
+    access_token = create_access_token(
+        identity=identity, expires_delta=app.config["JWT_ACCESS_TOKEN_EXPIRES"], additional_claims=premium_claims(identity),
+    )
     return jsonify(access_token=access_token)
 
 @app.route('/create-checkout-session', methods=['POST'])
@@ -169,7 +717,7 @@ def refresh():
 def create_checkout_session():
     current_user_id = get_jwt_identity()
     try:
-        checkout_session = stripe.checkout.Session.create(
+        checkout_session = payments().checkout.Session.create(
             line_items=[
                 {
                     'price_data': {
@@ -197,6 +745,7 @@ def stripe_webhook():
     sig_header = request.headers.get('stripe-signature')
     webhook_secret = config.STRIPE_WEBHOOK_SECRET
 
+    stripe = payments()
     try:
         event = stripe.Webhook.construct_event(
             payload, sig_header, webhook_secret
@@ -208,18 +757,39 @@ def stripe_webhook():
         # Invalid signature
         return 'Invalid signature', 400
 
+    handle_stripe_event_once(event)
+    return 'OK', 200
+
+def handle_stripe_event_once(event):
+    """
+    Applies a verified Stripe event unless it was already applied. The event
+    only counts as seen once it has been handled, so Stripe's retry after a
+    failure is applied again.
+    """
+    key = f"stripe:{event['id']}" if 'id' in event else None
+    if is_duplicate(key):
+        return
+    try:
+        handle_stripe_event(event)
+    except Exception:
+        forget_event(key)
+        raise
+
+def handle_stripe_event(event):
+    """
+    Applies a verified Stripe event.
+    """
+    STRIPE_EVENTS.inc((event['type'],))
     # Handle the checkout.session.completed event
     if event['type'] == 'checkout.session.completed':
         session = event['data']['object']
         user_id = session.get('client_reference_id')
         if user_id:
             paid_users.add(user_id)
-            print(f"User {user_id} has successfully paid and gained premium access.")
+            logger.info("User %s has successfully paid and gained premium access.", user_id, extra={'event': 'stripe.paid'})
             # In a real application, you would update your database here
         else:
-            print("No user ID found in checkout session.")
-
-    return 'OK', 200
+            logger.warning("No user ID found in checkout session.", extra={'event': 'stripe.missing_user'})
 
 @app.route('/success')
 def success():
@@ -233,45 +803,71 @@ def cancel():
 @jwt_required()
 def protected():
     current_user = get_jwt_identity()
-    if current_user not in paid_users:
+    # A premium claim needs no lookup; tokens issued before payment fall back to the store
+    premium = config.JWT_PREMIUM_CLAIM and get_jwt().get('premium') is True
+    if not premium and current_user not in paid_users:
         return jsonify(message="Access denied. Please subscribe."), 403
     return jsonify(logged_in_as=current_user, message="Welcome, premium user!"), 200
 
 def add_user_to_discord_guild(user_id, access_token):
-    guild_id = config.DISCORD_GUILD_ID
-    bot_token = config.DISCORD_BOT_TOKEN
-
-    if not guild_id or not bot_token:
-        print("Discord guild ID or bot token not configured. Skipping adding user to guild.")
+    """
+    Queues the user to join the Discord guild, so login never waits on Discord.
+    """
+    if not config.DISCORD_GUILD_ID or not config.DISCORD_BOT_TOKEN:
+        logger.warning("Discord guild ID or bot token not configured. Skipping adding user to guild.", extra={'event': 'guild.unconfigured'})
         return
+    guild_queue.enqueue({'user_id': user_id, 'access_token': access_token})
 
-    # This is a placeholder. Actual implementation requires a Discord bot with 'Manage Guild' permissions
-    # and the 'guilds.join' OAuth2 scope.
-    # The bot needs to be in the guild.
-    # The user needs to grant the 'guilds.join' scope during OAuth2.
-    # The bot token should be used for authorization, not the user's access_token for this specific API call.
-    # The user's access_token is used to identify the user to be added.
-
-    headers = {
-        "Authorization": f"Bot {bot_token}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "access_token": access_token
-    }
-    url = f"{config.DISCORD_API_BASE_URL}/guilds/{guild_id}/members/{user_id}"
+def join_discord_guild(job):
+    """
+    Adds a user to the Discord guild through the shared HTTP connection pool.
 
+    The bot token authorizes the call; the user's access token, granted with
+    the 'guilds.join' scope, identifies the user to add. The bot must be in the guild.
+    """
+    guild_id = config.DISCORD_GUILD_ID
+    user_id = job['user_id']
+    members_url = f"{config.DISCORD_API_BASE_URL}/guilds/{guild_id}/members"
     try:
-        response = requests.put(url, headers=headers, json=payload)
-        response.raise_for_status()
-        if response.status_code == 201:
-            print(f"User {user_id} successfully added to Discord guild {guild_id}")
-        elif response.status_code == 204:
-            print(f"User {user_id} is already a member of Discord guild {guild_id}")
-    except requests.exceptions.HTTPError as e:
-        print(f"Error adding user to Discord guild: {e.response.status_code} - {e.response.text}")
-    except Exception as e:
-        print(f"An unexpected error occurred while adding user to Discord guild: {e}")
+        # Every member URL shares one rate limit bucket, so they share a route
+        status = http_delivery.deliver(
+            f"{members_url}/{user_id}",
+            {'access_token': job['access_token']},
+            headers={'Authorization': f"Bot {config.DISCORD_BOT_TOKEN}"},
+            method='PUT',
+            route=members_url,
+        )
+    except DeliveryError as e:
+        logger.error("Error adding user to Discord guild: %s", e, extra={'event': 'guild.failed', 'status': e.status})
+        return
+    if status == 201:
+        logger.info("User %s successfully added to Discord guild %s", user_id, guild_id, extra={'event': 'guild.joined'})
+    elif status == 204:
+        logger.info("User %s is already a member of Discord guild %s", user_id, guild_id, extra={'event': 'guild.joined'})
+
+# Guild joins are retried through Discord's rate limits in the background.
+# Jobs carry users' access tokens, so they are never written to the delivery log.
+guild_queue = DeliveryQueue(join_discord_guild, workers=config.DISCORD_GUILD_JOIN_WORKERS)
+
+def prewarm():
+    """
+    Imports the subsystems that are otherwise loaded on first use. With
+    gunicorn's preload_app, this runs once in the master and every worker
+    forks with them already loaded.
+    """
+    payments()
+    import requests_oauthlib  # noqa: F401 - also loads requests for HTTP deliveries
+
+def start_workers():
+    """
+    Starts the metrics writer and the delivery workers, replaying deliveries
+    left by a crashed worker, rather than on the first request. Called in each
+    gunicorn worker after the fork, so importing the app starts nothing.
+    """
+    if config.METRICS_ENABLED:
+        metrics_store.start()
+    delivery_queue.start()
 
 if __name__ == '__main__':
+    start_workers()
     app.run(debug=config.TESTING)
\ No newline at end of file
@@ -0,0 +1,287 @@
+# asyncio serving mode, run with: uvicorn asgi:app
+#
+# Exposes the same /webhook and /webhook/stripe routes as the Flask app. Parsing
+# and formatting run inline on the event loop and deliveries run as asyncio
+# tasks, so one process can keep thousands of deliveries in flight. Digests of
+# bursty sources go through the Flask app's delivery queue.
+import asyncio
+import logging
+import uuid
+from time import perf_counter
+from urllib.parse import parse_qs
+
+from app import (
+    DELIVERY_FAILURES, OVERSIZED_BODIES, REQUEST_SECONDS, SIGNATURE_FAILURES, STAGE_SECONDS, WEBHOOK_URLS, body_limits,
+    build_email, capture, codec, digests, email_transport, forget_event, handle_stripe_event_once, is_duplicate,
+    metrics_store, payments, registry, start_workers, verifier,
+)
+from config import config
+from delivery.http import create_async_delivery
+from delivery.queue import QueueFull
+from ingest.body import BodySpool, BodyTooLarge
+from ingest.idempotency import event_key
+from observability import metrics
+from observability.logs import new_request_id, request_id
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDeliveries:
+    """
+    Runs deliveries as background tasks, at most `max_in_flight` at a time.
+
+    At most `max_pending` deliveries are held, running or waiting for a slot.
+    Beyond that `submit()` raises QueueFull, so a slow destination cannot
+    grow the backlog without bound.
+    """
+
+    def __init__(self, max_in_flight, max_pending):
+        self.max_in_flight = max_in_flight
+        self.max_pending = max_pending
+        self.http = None
+        self._slots = None
+        self._tasks = set()
+
+    def start(self):
+        self.http = create_async_delivery(config)
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+
+    async def stop(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.http is not None:
+            await self.http.close()
+
+    def submit(self, data, output_format):
+        if self.http is None:
+            self.start()
+        if len(self._tasks) >= self.max_pending:
+            raise QueueFull(f"Too many deliveries waiting ({len(self._tasks)})")
+        delivery_id = uuid.uuid4().hex
+        task = asyncio.create_task(self._deliver(data, output_format))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return delivery_id
+
+    async def _deliver(self, data, output_format):
+        async with self._slots:
+            started = perf_counter()
+            await send_payload(data, output_format, self.http)
+            STAGE_SECONDS.observe(('deliver', output_format), perf_counter() - started)
+
+    def in_flight(self):
+        return len(self._tasks)
+
+
+async def send_payload(data, output_format, http):
+    """
+    Sends the payload to the new destination without blocking the event loop.
+    """
+    if output_format == 'email':
+        msg = build_email(data)
+        if msg is None:
+            return
+        try:
+            # SMTP goes through the shared connection pool on a worker thread
+            sent = await asyncio.to_thread(email_transport.send, msg)
+            if sent is not None:
+                # Waiting holds no thread, so batches still fill up
+                await asyncio.wrap_future(sent)
+        except Exception as e:
+            DELIVERY_FAILURES.inc((output_format,))
+            logger.error("Error sending email: %s", e, extra={'event': 'delivery.failed', 'format': 'email'})
+    elif WEBHOOK_URLS.get(output_format):
+        try:
+            await http.deliver(WEBHOOK_URLS[output_format], data)
+        except Exception as e:
+            DELIVERY_FAILURES.inc((output_format,))
+            logger.error("Error delivering %s payload: %s", output_format, e, extra={'event': 'delivery.failed', 'format': output_format})
+    else:
+        logger.info(
+            "No destination for %s payload", output_format,
+            extra={'event': 'delivery.no_destination', 'format': output_format, 'payload': data},
+        )
+
+
+deliveries = AsyncDeliveries(config.ASGI_MAX_IN_FLIGHT, config.ASGI_MAX_PENDING)
+
+
+async def webhook(scope, body):
+    """
+    Ingests a webhook, transforms its payload, and schedules its delivery.
+    """
+    query = parse_qs(scope.get('query_string', b'').decode())
+    source = query.get('source', ['default'])[0]
+    output_format = query.get('format', ['default'])[0]
+
+    pipeline = registry.pipeline(source, output_format)
+    if pipeline is None:
+        return 400, {'error': 'Invalid source or format'}
+
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', [])}
+    if not verifier.verify(source, headers, body):
+        SIGNATURE_FAILURES.inc((source,))
+        return 401, {'error': 'Invalid signature'}
+
+    started = perf_counter()
+    try:
+        data = codec.loads(body, registry.schema(source))
+    except ValueError:
+        return 400, {'error': 'Invalid JSON payload'}
+    decoded = perf_counter()
+
+    parsed = registry.parsers[source](data)
+    parsed_at = perf_counter()
+    STAGE_SECONDS.observe(('decode', source), decoded - started)
+    STAGE_SECONDS.observe(('parse', source), parsed_at - decoded)
+
+    key = event_key(headers, body, f"{source}:{output_format}", config.IDEMPOTENCY_CONTENT_HASH)
+    if digests.handles(source):
+        if is_duplicate(key):
+            return 200, {'status': 'duplicate'}
+        digests.add(source, output_format, parsed)
+        return 202, {'status': 'aggregated'}
+
+    data = registry.formatters[output_format](parsed)
+    STAGE_SECONDS.observe(('format', output_format), perf_counter() - parsed_at)
+    if is_duplicate(key):
+        return 200, {'status': 'duplicate'}
+
+    try:
+        delivery_id = deliveries.submit(data, output_format)
+    except QueueFull as e:
+        # Not accepted, so the sender's retry must not count as a duplicate
+        forget_event(key)
+        return 503, {'error': str(e)}
+    return 202, {'status': 'accepted', 'delivery_id': delivery_id}
+
+
+async def stripe_webhook(scope, body):
+    headers = dict(scope.get('headers', []))
+    sig_header = headers.get(b'stripe-signature', b'').decode()
+
+    stripe = payments()
+    try:
+        event = stripe.Webhook.construct_event(bytes(body).decode(), sig_header, config.STRIPE_WEBHOOK_SECRET)
+    except ValueError:
+        return 400, 'Invalid payload'
+    except stripe.error.SignatureVerificationError:
+        return 400, 'Invalid signature'
+
+    handle_stripe_event_once(event)
+    return 200, 'OK'
+
+
+async def metrics_endpoint(scope, body):
+    if not config.METRICS_ENABLED:
+        return 404, {'error': 'Metrics are disabled'}
+    return 200, metrics.render(metrics_store.collect()).encode()
+
+
+ROUTES = {
+    ('POST', '/webhook'): webhook,
+    ('POST', '/webhook/stripe'): stripe_webhook,
+    ('GET', '/metrics'): metrics_endpoint,
+}
+
+
+async def read_body(receive, limit):
+    """
+    Reads the request body into a BodySpool, which raises BodyTooLarge as
+    soon as it passes `limit`.
+    """
+    body = BodySpool(config.BODY_SPOOL_THRESHOLD, limit, config.BODY_SPOOL_DIR)
+    try:
+        while True:
+            message = await receive()
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                return body
+    except BaseException:
+        body.close()
+        raise
+
+
+def body_source(scope, handler):
+    if handler is stripe_webhook:
+        return 'stripe'
+    return parse_qs(scope.get('query_string', b'').decode()).get('source', ['default'])[0]
+
+
+async def respond(send, status, content):
+    if isinstance(content, bytes):
+        body, content_type = content, b'text/plain; version=0.0.4'
+    elif isinstance(content, str):
+        body, content_type = content.encode(), b'text/html; charset=utf-8'
+    else:
+        body, content_type = codec.dumps(content), b'application/json'
+    headers = [(b'content-type', content_type), (b'content-length', str(len(body)).encode())]
+    if status == 503:
+        # Only sent while deliveries are backed up, as the Flask app does
+        headers.append((b'retry-after', str(int(config.CIRCUIT_BREAKER_OPEN_SECONDS)).encode()))
+    if request_id.get():
+        headers.append((b'x-request-id', request_id.get().encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            start_workers()
+            deliveries.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await deliveries.stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    handler = ROUTES.get((scope['method'], scope['path']))
+    if handler is None:
+        await respond(send, 404, {'error': 'Not found'})
+        return
+
+    started = perf_counter()
+    # Delivery tasks created by the handler inherit the request ID
+    headers = dict(scope.get('headers', []))
+    token = request_id.set(new_request_id(headers.get(b'x-request-id', b'').decode('latin-1')))
+    source = body_source(scope, handler)
+    limit = body_limits.limit(source)
+    body = None
+    try:
+        # A declared length over the limit is refused before the body is read
+        declared = headers.get(b'content-length', b'')
+        if declared.isdigit() and int(declared) > limit:
+            raise BodyTooLarge(limit)
+        body = await read_body(receive, limit)
+        status, content = await handler(scope, body.view())
+        await respond(send, status, content)
+        if capture.wants(scope['path']):
+            capture.record(
+                scope['method'], scope['path'], scope.get('query_string', b'').decode('latin-1'),
+                [(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope.get('headers', [])],
+                body.view(), status,
+            )
+    except BodyTooLarge:
+        OVERSIZED_BODIES.inc((source if source in registry.sources else 'invalid',))
+        status = 413
+        await respond(send, status, {'error': 'Payload too large', 'limit': limit})
+    finally:
+        request_id.reset(token)
+        if body is not None:
+            body.close()
+    source = output_format = ''
+    if handler is webhook:
+        query = parse_qs(scope.get('query_string', b'').decode())
+        source = query.get('source', ['default'])[0]
+        source = source if source in registry.sources else 'invalid'
+        output_format = query.get('format', ['default'])[0]
+        output_format = output_format if output_format in registry.formats else 'invalid'
+    REQUEST_SECONDS.observe((handler.__name__, source, output_format, str(status)), perf_counter() - started)
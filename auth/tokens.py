@@ -0,0 +1,65 @@
+import hashlib
+import time
+
+from flask_jwt_extended import JWTManager
+
+from storage.cache import LRUCache
+
+
+class TokenCache:
+    """
+    Claims of tokens that were already verified, keyed by a hash of the
+    token and kept until the token expires.
+    """
+
+    def __init__(self, maxsize=10000):
+        self._cache = LRUCache(maxsize)
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        return self._cache.get(self._key(token))
+
+    def set(self, token, claims):
+        remaining = claims.get('exp', 0) - time.time()
+        if remaining > 0:
+            self._cache.set(self._key(token), claims, time.monotonic() + remaining)
+
+    def clear(self):
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+
+class CachingJWTManager(JWTManager):
+    """
+    A JWTManager that verifies each token once, then serves its claims from
+    a TokenCache until it expires. Tokens without an expiry, and decodes
+    with a CSRF value or that allow expired tokens, are never cached.
+    """
+
+    def __init__(self, app=None, cache_size=10000, **kwargs):
+        self.token_cache = TokenCache(cache_size)
+        super().__init__(app, **kwargs)
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        if csrf_value is not None or allow_expired:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        claims = self.token_cache.get(encoded_token)
+        if claims is None:
+            claims = super()._decode_jwt_from_config(encoded_token)
+            self.token_cache.set(encoded_token, claims)
+        # Callers get their own copy so the cached claims stay as verified
+        return dict(claims)
+
+
+def create_jwt_manager(app, config):
+    """
+    Builds the JWT manager, caching verified tokens unless JWT_CACHE_SIZE is 0.
+    """
+    if config.JWT_CACHE_SIZE <= 0:
+        return JWTManager(app)
+    return CachingJWTManager(app, config.JWT_CACHE_SIZE)
@@ -0,0 +1,125 @@
+"""
+Load-test comparison of the WSGI (gunicorn) and ASGI (uvicorn) serving modes.
+
+Both servers deliver to a local stub that answers after --downstream-delay
+seconds, so the numbers show how many slow deliveries each mode keeps moving.
+
+    python -m benchmarks.asgi_vs_wsgi --requests 2000 --concurrency 50
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks.load import drive, summarize
+from benchmarks.pipeline import load_fixtures
+from benchmarks.stub import StubDownstream
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    'wsgi': lambda port, workers: [
+        sys.executable, '-m', 'gunicorn', '--bind', f"127.0.0.1:{port}", '--workers', str(workers), 'app:app',
+    ],
+    'asgi': lambda port, workers: [
+        sys.executable, '-m', 'uvicorn', '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers),
+        '--log-level', 'warning', 'asgi:app',
+    ],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def start_server(mode, workers, env):
+    port = free_port()
+    process = subprocess.Popen(
+        SERVERS[mode](port, workers), cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    wait_for_port(port)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def run(mode, args):
+    downstream = StubDownstream(delay=args.downstream_delay).start()
+    env = dict(
+        os.environ,
+        SLACK_WEBHOOK_URL=downstream.url,
+        RATELIMIT_ENABLED='False',
+        IDEMPOTENCY_ENABLED='False',
+        DELIVERY_WORKERS=str(args.delivery_workers),
+        HTTP_DELIVERY_MAX_CONNECTIONS_PER_HOST=str(args.max_connections_per_host),
+    )
+    process, url = start_server(mode, args.workers, env)
+    try:
+        body = json.dumps(load_fixtures()[args.source]).encode()
+        headers = {'Content-Type': 'application/json'}
+        requests = [(f"/webhook?source={args.source}&format=slack", headers, body)] * args.requests
+
+        started = time.perf_counter()
+        latencies, errors, elapsed = drive(url, requests, args.concurrency)
+        delivered = downstream.wait_for(args.requests - errors, timeout=args.drain_timeout)
+        drained = time.perf_counter() - started
+
+        result = summarize(latencies, elapsed, errors)
+        result['mode'] = mode
+        result['delivered'] = downstream.received
+        result['deliveries_per_sec'] = round(downstream.received / drained, 1)
+        result['drained'] = delivered
+        return result
+    finally:
+        process.terminate()
+        process.wait(10)
+        downstream.shutdown()
+        downstream.server_close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', default=['wsgi', 'asgi'], choices=sorted(SERVERS))
+    parser.add_argument('--source', default='default', help='fixture payload to send')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=1, help='server processes')
+    parser.add_argument('--delivery-workers', type=int, default=4, help='delivery threads per WSGI process')
+    parser.add_argument('--max-connections-per-host', type=int, default=10)
+    parser.add_argument('--downstream-delay', type=float, default=0.05, help='seconds the stub takes per delivery')
+    parser.add_argument('--drain-timeout', type=float, default=120)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    results = [run(mode, args) for mode in args.modes]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<6}{'ingest rps':>12}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'deliveries/s':>14}")
+    for result in results:
+        print(
+            f"{result['mode']:<6}{result['rps']:>12}{result['p50_ms']:>10}{result['p99_ms']:>10}"
+            f"{result['errors']:>8}{result['deliveries_per_sec']:>14}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmarks for the transformer pipelines and the in-process ingest path.
+"""
+import json
+import os
+import statistics
+import time
+import timeit
+import tracemalloc
+
+from benchmarks.load import summarize
+from observability.metrics import Registry
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixtures():
+    """
+    Returns the fixture payload of every source, keyed by source name.
+    """
+    fixtures = {}
+    for name in sorted(os.listdir(FIXTURES)):
+        if name.endswith('.json'):
+            with open(os.path.join(FIXTURES, name)) as f:
+                fixtures[name[:-5]] = json.load(f)
+    return fixtures
+
+
+def inflate(payload, size):
+    """
+    Returns a copy of the payload whose top-level lists are repeated until the
+    encoded payload is at least `size` bytes, like a push with many commits.
+    Payloads without a list are returned as they are.
+    """
+    payload = dict(payload)
+    lists = [key for key, value in payload.items() if isinstance(value, list) and value]
+    if not lists:
+        return payload
+    encoded = len(json.dumps(payload))
+    per_copy = sum(len(json.dumps(payload[key])) for key in lists)
+    copies = max(1, -(-(size - encoded) // per_copy) + 1)
+    for key in lists:
+        payload[key] = payload[key] * copies
+    return payload
+
+
+def peak_allocation(func):
+    """
+    Returns the peak bytes allocated by Python while running a callable once.
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(func, repeat=5):
+    """
+    Times a callable with timeit and returns per-call figures from the best run.
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    per_call = [elapsed / number for elapsed in timer.repeat(repeat, number)]
+    return {
+        'calls': number * repeat,
+        'ops_per_sec': round(1 / min(per_call), 1),
+        'best_us': round(min(per_call) * 1e6, 3),
+        'median_us': round(statistics.median(per_call) * 1e6, 3),
+    }
+
+
+def bench_pipelines(registry, fixtures, repeat=5):
+    """
+    Times parse-then-format for every source fixture and output format.
+    """
+    results = []
+    for source, payload in fixtures.items():
+        for output_format in sorted(registry.formats):
+            pipeline = registry.pipeline(source, output_format)
+            if pipeline is None:
+                continue
+            result = {'suite': 'pipeline', 'name': f"{source}->{output_format}"}
+            try:
+                pipeline(payload)
+            except Exception as e:
+                # A pair that cannot transform its fixture is reported, not timed
+                result['error'] = f"{type(e).__name__}: {e}"
+            else:
+                result.update(measure(lambda: pipeline(payload), repeat))
+            results.append(result)
+    return results
+
+
+def bench_metrics(repeat=5):
+    """
+    Times one histogram observation and the full set of metrics /webhook
+    records per request: three stage timings, the request timing and their
+    clock reads.
+    """
+    registry = Registry()
+    request_seconds = registry.histogram('request_seconds', 'Request time', ('endpoint', 'source', 'format', 'status'))
+    stage_seconds = registry.histogram('stage_seconds', 'Stage time', ('stage', 'transformer'))
+
+    def per_request():
+        started = time.perf_counter()
+        decoded = time.perf_counter()
+        parsed = time.perf_counter()
+        stage_seconds.observe(('decode', 'github'), decoded - started)
+        stage_seconds.observe(('parse', 'github'), parsed - decoded)
+        stage_seconds.observe(('format', 'slack'), time.perf_counter() - parsed)
+        request_seconds.observe(('webhook', 'github', 'slack', '202'), time.perf_counter() - started)
+
+    return [
+        dict({'suite': 'metrics', 'name': 'observe'}, **measure(lambda: stage_seconds.observe(('parse', 'github'), 0.00004), repeat)),
+        dict({'suite': 'metrics', 'name': 'per-request'}, **measure(per_request, repeat)),
+    ]
+
+
+def bench_codecs(codecs, registry, fixtures, size=256 * 1024, repeat=5):
+    """
+    Times decoding every fixture, inflated to about `size` bytes, with each
+    codec, and again with the parser's schema where the codec supports one.
+    """
+    results = []
+    for source, payload in fixtures.items():
+        body = json.dumps(inflate(payload, size)).encode()
+        schema = registry.schema(source)
+        for codec in codecs:
+            variants = [(codec.name, None)]
+            if schema is not None and codec.name == 'msgspec':
+                variants.append((f"{codec.name}+schema", schema))
+            for name, variant_schema in variants:
+                decode = lambda: codec.loads(body, variant_schema)  # noqa: E731
+                result = {'suite': 'codec', 'name': f"{source}/{name}", 'bytes': len(body)}
+                result.update(measure(decode, repeat))
+                result['peak_kb'] = round(peak_allocation(decode) / 1024, 1)
+                results.append(result)
+    return results
+
+
+def bench_ingest(client, fixtures, requests=2000, output_format='slack'):
+    """
+    Posts every source fixture to /webhook through the Flask test client.
+    """
+    results = []
+    for source, payload in fixtures.items():
+        body = json.dumps(payload)
+        path = f"/webhook?source={source}&format={output_format}"
+        latencies = []
+        errors = 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            request_started = time.perf_counter()
+            response = client.post(path, data=body, content_type='application/json')
+            latencies.append(time.perf_counter() - request_started)
+            if response.status_code >= 400:
+                errors += 1
+        result = summarize(latencies, time.perf_counter() - started, errors)
+        result.update(suite='ingest', name=f"{source}->{output_format}")
+        results.append(result)
+    return results
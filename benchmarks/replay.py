@@ -0,0 +1,176 @@
+"""
+Replays captured webhook traffic (see CAPTURE_DIR) against a server and
+reports throughput and latency.
+
+    python -m benchmarks.replay capture/ --speed 2
+    python -m benchmarks.replay capture/ --concurrency 50 --workers 4
+    python -m benchmarks.replay capture/ --url http://127.0.0.1:5000
+
+With --speed, requests keep the spacing they were captured with, divided by
+the speed. Without it they are sent back to back. Either way at most
+--concurrency requests are in flight.
+
+Without --url, a gunicorn server is started with every chat destination
+pointed at a local stub, routing and rate limiting off, and an in-memory
+user store, so nothing leaves the machine.
+"""
+import argparse
+import http.client
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+from benchmarks.asgi_vs_wsgi import start_server
+from benchmarks.load import percentile, summarize
+from benchmarks.stub import StubDownstream
+from ingest.capture import read_capture
+
+
+def load_requests(path, paths=None, limit=None):
+    """
+    Reads a capture and returns (offset, method, target, headers, body) tuples,
+    with offsets in seconds from the first request.
+    """
+    requests = []
+    first = None
+    for captured in read_capture(path):
+        if paths and captured['path'] not in paths:
+            continue
+        if first is None:
+            first = captured['time']
+        target = captured['path'] + (f"?{captured['query']}" if captured['query'] else '')
+        headers = dict(captured['headers'])
+        requests.append((captured['time'] - first, captured['method'], target, headers, captured['body']))
+        if limit and len(requests) >= limit:
+            break
+    return requests
+
+
+def replay(url, requests, concurrency, speed=None):
+    """
+    Sends captured requests to a running server over keep-alive connections
+    from `concurrency` threads, on the captured schedule when `speed` is set.
+    Returns latencies by path, response status counts, how late each request
+    was sent and the elapsed seconds.
+    """
+    server = urlsplit(url)
+    latencies = defaultdict(list)
+    statuses = Counter()
+    lags = []
+    lock = threading.Lock()
+    pending = list(reversed(requests))
+    started = time.perf_counter()
+
+    def worker():
+        conn = http.client.HTTPConnection(server.hostname, server.port, timeout=60)
+        while True:
+            with lock:
+                if not pending:
+                    break
+                offset, method, target, headers, body = pending.pop()
+            if speed:
+                due = started + offset / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sent = time.perf_counter()
+            try:
+                conn.request(method, target, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = str(response.status)
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(server.hostname, server.port, timeout=60)
+                status = 'error'
+            elapsed = time.perf_counter() - sent
+            with lock:
+                latencies[urlsplit(target).path].append(elapsed)
+                statuses[status] += 1
+                if speed:
+                    lags.append(max(0.0, sent - due))
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, lags, time.perf_counter() - started
+
+
+def report(latencies, statuses, lags, elapsed):
+    """
+    Summarizes a replay overall and per path.
+    """
+    errors = sum(count for status, count in statuses.items() if status == 'error' or int(status) >= 400)
+    result = summarize([latency for path in latencies.values() for latency in path], elapsed, errors)
+    result['statuses'] = dict(sorted(statuses.items()))
+    if lags:
+        result['lag_p99_ms'] = round(percentile(lags, 99) * 1000, 3)
+    result['paths'] = {path: summarize(values, elapsed) for path, values in sorted(latencies.items())}
+    return result
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('capture', help='a capture file, or a CAPTURE_DIR holding one per worker')
+    parser.add_argument('--url', help='server to replay against (default: start gunicorn with stubbed destinations)')
+    parser.add_argument('--speed', type=float, help='replay at this multiple of the captured rate')
+    parser.add_argument('--concurrency', type=int, default=20, help='requests in flight at most')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn workers of the started server')
+    parser.add_argument('--paths', nargs='+', help='only replay requests to these paths')
+    parser.add_argument('--limit', type=int, help='replay at most this many requests')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    requests = load_requests(args.capture, args.paths, args.limit)
+    if not requests:
+        raise SystemExit(f"No captured requests in {args.capture}")
+
+    process = downstream = None
+    url = args.url
+    if url is None:
+        downstream = StubDownstream().start()
+        env = dict(
+            os.environ,
+            SLACK_WEBHOOK_URL=downstream.url,
+            DISCORD_WEBHOOK_URL=downstream.url,
+            MSTEAMS_WEBHOOK_URL=downstream.url,
+            ROUTES_FILE='',
+            RATELIMIT_ENABLED='False',
+            USER_STORE_BACKEND='memory',
+            CAPTURE_DIR='',
+        )
+        process, url = start_server('wsgi', args.workers, env)
+    try:
+        result = report(*replay(url, requests, args.concurrency, args.speed))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(10)
+            downstream.shutdown()
+            downstream.server_close()
+    if downstream is not None:
+        result['delivered'] = downstream.received
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{'path':<20}{'requests':>10}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for path, row in result['paths'].items():
+        print(f"{path:<20}{row['requests']:>10}{row['rps']:>10}{row['p50_ms']:>10}{row['p99_ms']:>10}")
+    print(f"{'total':<20}{result['requests']:>10}{result['rps']:>10}{result['p50_ms']:>10}{result['p99_ms']:>10}")
+    print(f"statuses: {', '.join(f'{status}={count}' for status, count in result['statuses'].items())}")
+    if 'lag_p99_ms' in result:
+        print(f"p99 send lag: {result['lag_p99_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Runs the benchmark suites and writes machine-readable results.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare results.json --tolerance 0.1
+
+Suites:
+    pipeline  parse-then-format for every fixture and output format
+    codec     decoding large fixture payloads with each installed JSON codec
+    metrics   recording the metrics of one /webhook request
+    ingest    POST /webhook through the Flask test client
+    server    POST /webhook to a real gunicorn process delivering to a stub
+
+With --compare, exits with status 1 if any result is slower than the
+baseline by more than the tolerance.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+from benchmarks import asgi_vs_wsgi
+from benchmarks.pipeline import bench_codecs, bench_ingest, bench_metrics, bench_pipelines, load_fixtures
+from benchmarks.stub import StubDownstream
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SUITES = ('pipeline', 'codec', 'metrics', 'ingest', 'server')
+
+# The figure compared between runs for each suite; higher is better
+SCORES = {'pipeline': 'ops_per_sec', 'codec': 'ops_per_sec', 'metrics': 'ops_per_sec', 'ingest': 'rps', 'server': 'rps'}
+
+
+def metadata():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run_pipeline(args, fixtures):
+    from transformers.registry import load_registry
+
+    return bench_pipelines(load_registry(), fixtures, args.repeat)
+
+
+def run_codec(args, fixtures):
+    from codec import CODECS
+    from transformers.registry import load_registry
+
+    codecs = []
+    for codec_class in CODECS.values():
+        try:
+            codecs.append(codec_class())
+        except ImportError:
+            continue
+    return bench_codecs(codecs, load_registry(), fixtures, args.payload_size, args.repeat)
+
+
+def run_metrics(args, fixtures):
+    return bench_metrics(args.repeat)
+
+
+def run_ingest(args, fixtures):
+    downstream = StubDownstream().start()
+    # The app reads its configuration on import
+    os.environ.update(
+        SLACK_WEBHOOK_URL=downstream.url,
+        RATELIMIT_ENABLED='False',
+        IDEMPOTENCY_ENABLED='False',
+        USER_STORE_BACKEND='memory',
+        # Deliveries log a line each, which would bury the results
+        LOG_LEVEL='WARNING',
+    )
+    from app import app, delivery_queue
+
+    try:
+        results = bench_ingest(app.test_client(), fixtures, args.requests)
+        delivery_queue.join(timeout=args.drain_timeout)
+        return results
+    finally:
+        delivery_queue.stop()
+        downstream.shutdown()
+        downstream.server_close()
+
+
+def run_server(args, fixtures):
+    server_args = asgi_vs_wsgi.build_parser().parse_args([
+        '--requests', str(args.requests), '--concurrency', str(args.concurrency), '--downstream-delay', '0',
+    ])
+    results = []
+    for source in fixtures:
+        server_args.source = source
+        result = asgi_vs_wsgi.run('wsgi', server_args)
+        result.update(suite='server', name=f"{source}->slack")
+        results.append(result)
+    return results
+
+
+RUNNERS = {
+    'pipeline': run_pipeline, 'codec': run_codec, 'metrics': run_metrics, 'ingest': run_ingest, 'server': run_server,
+}
+
+
+def compare(baseline, current, tolerance):
+    """
+    Returns (suite, name, baseline score, current score) for every result that
+    regressed by more than `tolerance` (a fraction) against the baseline.
+    """
+    previous = {(result['suite'], result['name']): result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        score = SCORES[result['suite']]
+        before = previous.get((result['suite'], result['name']), {}).get(score)
+        after = result.get(score)
+        if before and after is not None and after < before * (1 - tolerance):
+            regressions.append((result['suite'], result['name'], before, after))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--suites', nargs='+', default=list(SUITES), choices=SUITES)
+    parser.add_argument('--sources', nargs='+', help='fixtures to use (default: all)')
+    parser.add_argument('--requests', type=int, default=1000, help='requests per fixture for ingest and server')
+    parser.add_argument('--concurrency', type=int, default=20, help='client threads for the server suite')
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs per pipeline and codec')
+    parser.add_argument('--payload-size', type=int, default=256 * 1024, help='bytes to inflate codec fixtures to')
+    parser.add_argument('--drain-timeout', type=float, default=60)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='baseline JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed slowdown before failing, as a fraction')
+    args = parser.parse_args(argv)
+
+    fixtures = load_fixtures()
+    if args.sources:
+        fixtures = {source: fixtures[source] for source in args.sources}
+
+    report = {'meta': metadata(), 'results': []}
+    for suite in args.suites:
+        report['results'].extend(RUNNERS[suite](args, fixtures))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+
+    print(f"{'suite':<10}{'name':<28}{'score':>14}")
+    for result in report['results']:
+        score = result.get(SCORES[result['suite']], result.get('error'))
+        print(f"{result['suite']:<10}{result['name']:<28}{score!s:>14}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for suite, name, before, after in regressions:
+            print(f"REGRESSION {suite} {name}: {before} -> {after} ({after / before - 1:+.1%})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import json
+
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+
+# Tried in this order when JSON_CODEC is "auto". msgspec comes first because
+# it can also decode straight into a parser's schema.
+PREFERRED = ('msgspec', 'orjson', 'json')
+
+
+class StdlibCodec:
+    """
+    The standard library json module, always available.
+    """
+
+    name = 'json'
+
+    def loads(self, data, schema=None):
+        if isinstance(data, memoryview):
+            # json only reads str and bytes, so spooled bodies are copied
+            data = bytes(data)
+        return json.loads(data)
+
+    def dumps(self, obj, default=None, sort_keys=False):
+        return json.dumps(obj, default=default, sort_keys=sort_keys, separators=(',', ':')).encode()
+
+
+class OrjsonCodec:
+    """
+    orjson, a C-backed drop-in for json.
+    """
+
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+
+        self._orjson = orjson
+
+    def loads(self, data, schema=None):
+        return self._orjson.loads(data)
+
+    def dumps(self, obj, default=None, sort_keys=False):
+        option = self._orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= self._orjson.OPT_SORT_KEYS
+        return self._orjson.dumps(obj, default=default, option=option)
+
+
+class MsgspecCodec:
+    """
+    msgspec, which can also decode only the fields a parser's schema declares.
+    """
+
+    name = 'msgspec'
+
+    def __init__(self):
+        import msgspec
+
+        self._msgspec = msgspec
+        self._decoders = {None: msgspec.json.Decoder()}
+
+    def _decoder(self, schema):
+        decoder = self._decoders.get(schema)
+        if decoder is None:
+            decoder = self._decoders[schema] = self._msgspec.json.Decoder(schema)
+        return decoder
+
+    def loads(self, data, schema=None):
+        if isinstance(data, str):
+            data = data.encode()
+        try:
+            decoded = self._decoder(schema).decode(data)
+        except self._msgspec.DecodeError as e:
+            # Callers only need to handle ValueError, whichever codec is in use
+            raise ValueError(str(e)) from e
+        if schema is None:
+            return decoded
+        # Parsers work on plain dicts; omitted fields stay absent and lists
+        # declared as counted keep their undecoded Raw elements
+        return self._msgspec.to_builtins(decoded, builtin_types=(self._msgspec.Raw,))
+
+    def dumps(self, obj, default=None, sort_keys=False):
+        return self._msgspec.json.encode(obj, enc_hook=default, order='sorted' if sort_keys else None)
+
+
+CODECS = {codec.name: codec for codec in (MsgspecCodec, OrjsonCodec, StdlibCodec)}
+
+
+def create_codec(name='auto'):
+    """
+    Returns the named codec, or with "auto" the fastest one installed.
+
+    `loads()` accepts bytes or str, takes an optional schema (used by msgspec,
+    ignored by the others) and raises ValueError on invalid JSON. `dumps()`
+    returns bytes.
+    """
+    if name != 'auto':
+        if name not in CODECS:
+            raise ValueError(f"Unknown JSON codec: {name}")
+        return CODECS[name]()
+    for candidate in PREFERRED:
+        try:
+            return CODECS[candidate]()
+        except ImportError:
+            continue
+
+
+class CodecJSONProvider(JSONProvider):
+    """
+    Flask JSON provider backed by a codec, so request.get_json() and jsonify()
+    use it too. Values the codec cannot encode go through Flask's usual
+    conversions for dates, UUIDs and dataclasses.
+    """
+
+    sort_keys = True
+    mimetype = 'application/json'
+
+    def __init__(self, app, codec=None):
+        super().__init__(app)
+        self.codec = codec or create_codec()
+
+    def dumps(self, obj, **kwargs):
+        return self.codec.dumps(obj, default=DefaultJSONProvider.default, sort_keys=self.sort_keys).decode()
+
+    def loads(self, s, **kwargs):
+        return self.codec.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = self.codec.dumps(obj, default=DefaultJSONProvider.default, sort_keys=self.sort_keys)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
@@ -1,14 +1,19 @@
 import os
-from dotenv import load_dotenv
 from datetime import timedelta
 
-load_dotenv()
+# python-dotenv is only imported when there is a .env file to load
+ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+if os.path.exists(ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)
 
 class Config:
     # JWT Settings
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "super-secret-jwt-key")
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(os.getenv("JWT_ACCESS_TOKEN_EXPIRES_MINUTES", 5)))
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=int(os.getenv("JWT_REFRESH_TOKEN_EXPIRES_DAYS", 30)))
+    JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", 10000))
+    JWT_PREMIUM_CLAIM = os.getenv("JWT_PREMIUM_CLAIM", "True").lower() == "true"
 
     # Discord OAuth2 Settings
     DISCORD_CLIENT_ID = os.getenv("DISCORD_CLIENT_ID")
@@ -16,6 +21,8 @@ class Config:
     DISCORD_REDIRECT_URI = os.getenv("DISCORD_REDIRECT_URI", "http://127.0.0.1:5000/callback")
     DISCORD_BOT_TOKEN = os.getenv("DISCORD_BOT_TOKEN")
     DISCORD_GUILD_ID = os.getenv("DISCORD_GUILD_ID")
+    DISCORD_API_TIMEOUT = float(os.getenv("DISCORD_API_TIMEOUT", 10))
+    DISCORD_GUILD_JOIN_WORKERS = int(os.getenv("DISCORD_GUILD_JOIN_WORKERS", 2))
 
     # Discord API URLs
     DISCORD_API_BASE_URL = 'https://discord.com/api'
@@ -34,13 +41,122 @@ class Config:
     EMAIL_RECEIVER = os.getenv("EMAIL_RECEIVER")
     SMTP_HOST = os.getenv("SMTP_HOST")
     SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+    SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "True").lower() == "true"
+    SMTP_TIMEOUT = int(os.getenv("SMTP_TIMEOUT", 10))
+    SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 4))
+    SMTP_KEEPALIVE_SECONDS = int(os.getenv("SMTP_KEEPALIVE_SECONDS", 30))
+    SMTP_BATCH_WINDOW_MS = int(os.getenv("SMTP_BATCH_WINDOW_MS", 0))
+    SMTP_BATCH_MAX_SIZE = int(os.getenv("SMTP_BATCH_MAX_SIZE", 50))
+    SMTP_BATCH_COALESCE = os.getenv("SMTP_BATCH_COALESCE", "False").lower() == "true"
+
+    # Logging Settings
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+    LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "delivery.sent=0.1,delivery.no_destination=0.01")
+    LOG_MAX_FIELD_LENGTH = int(os.getenv("LOG_MAX_FIELD_LENGTH", 1024))
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+    # Metrics Settings
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+    METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+    METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+
+    # Fan-out Routing Settings
+    ROUTES_FILE = os.getenv("ROUTES_FILE", "routes.json")
+
+    # JSON Settings
+    JSON_CODEC = os.getenv("JSON_CODEC", "auto")
+
+    # Signature Verification Settings
+    WEBHOOK_SECRETS = os.getenv("WEBHOOK_SECRETS", "")
+    WEBHOOK_SIGNATURES_REQUIRED = os.getenv("WEBHOOK_SIGNATURES_REQUIRED", "False").lower() == "true"
+    WEBHOOK_SIGNATURE_TOLERANCE = float(os.getenv("WEBHOOK_SIGNATURE_TOLERANCE", 300))
+
+    # Digest Settings
+    DIGEST_SOURCES = os.getenv("DIGEST_SOURCES", "")
+    DIGEST_WINDOW = float(os.getenv("DIGEST_WINDOW", 60))
+    DIGEST_MAX_KEYS = int(os.getenv("DIGEST_MAX_KEYS", 10000))
+    DIGEST_TOP_N = int(os.getenv("DIGEST_TOP_N", 5))
+    DIGEST_SHUTDOWN_TIMEOUT = float(os.getenv("DIGEST_SHUTDOWN_TIMEOUT", 10))
+
+    # Batch Ingestion Settings
+    BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 10000))
+
+    # Request Body Settings
+    BODY_MAX_BYTES = int(os.getenv("BODY_MAX_BYTES", 25 * 1024 * 1024))
+    BODY_SOURCE_LIMITS = os.getenv("BODY_SOURCE_LIMITS", "")
+    BODY_SPOOL_THRESHOLD = int(os.getenv("BODY_SPOOL_THRESHOLD", 1024 * 1024))
+    BODY_SPOOL_DIR = os.getenv("BODY_SPOOL_DIR", "")
+
+    # Traffic Capture Settings
+    CAPTURE_DIR = os.getenv("CAPTURE_DIR", "")
+    CAPTURE_PATHS = os.getenv("CAPTURE_PATHS", "/webhook,/webhook/route,/webhook/batch,/webhook/stripe")
+    CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", 1.0))
+    CAPTURE_MAX_BYTES = int(os.getenv("CAPTURE_MAX_BYTES", 1024 ** 3))
+
+    # Idempotency Settings
+    IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "True").lower() == "true"
+    IDEMPOTENCY_WINDOW = float(os.getenv("IDEMPOTENCY_WINDOW", 86400))
+    IDEMPOTENCY_CAPACITY = int(os.getenv("IDEMPOTENCY_CAPACITY", 100000))
+    IDEMPOTENCY_CONTENT_HASH = os.getenv("IDEMPOTENCY_CONTENT_HASH", "False").lower() == "true"
+
+    # ASGI Settings
+    ASGI_MAX_IN_FLIGHT = int(os.getenv("ASGI_MAX_IN_FLIGHT", 10000))
+    ASGI_MAX_PENDING = int(os.getenv("ASGI_MAX_PENDING", 100000))
+
+    # HTTP Delivery Settings
+    SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL")
+    DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
+    MSTEAMS_WEBHOOK_URL = os.getenv("MSTEAMS_WEBHOOK_URL")
+    HTTP_DELIVERY_TIMEOUT = float(os.getenv("HTTP_DELIVERY_TIMEOUT", 10))
+    HTTP_DELIVERY_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_DELIVERY_MAX_CONNECTIONS_PER_HOST", 10))
+    HTTP_DELIVERY_MAX_RETRIES = int(os.getenv("HTTP_DELIVERY_MAX_RETRIES", 5))
+    HTTP_DELIVERY_BACKOFF_BASE = float(os.getenv("HTTP_DELIVERY_BACKOFF_BASE", 0.5))
+    HTTP_DELIVERY_MAX_BACKOFF = float(os.getenv("HTTP_DELIVERY_MAX_BACKOFF", 30))
+    HTTP_DELIVERY_HTTP2 = os.getenv("HTTP_DELIVERY_HTTP2", "False").lower() == "true"
 
     # Stripe Settings
     STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
     STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
     STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 
+    # Delivery Queue Settings
+    DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", 4))
+    DELIVERY_QUEUE_BACKEND = os.getenv("DELIVERY_QUEUE_BACKEND", "fair")
+    DELIVERY_QUEUE_PATH = os.getenv("DELIVERY_QUEUE_PATH", "deliveries.db")
+    DELIVERY_LOG_DIR = os.getenv("DELIVERY_LOG_DIR", "delivery-log")
+    DELIVERY_LOG_SEGMENT_SIZE = int(os.getenv("DELIVERY_LOG_SEGMENT_SIZE", 64 * 1024 * 1024))
+    DELIVERY_DESTINATION_QUEUE_SIZE = int(os.getenv("DELIVERY_DESTINATION_QUEUE_SIZE", 10000))
+    DELIVERY_DESTINATION_CONCURRENCY = int(os.getenv("DELIVERY_DESTINATION_CONCURRENCY", 2))
+    DELIVERY_DESTINATION_WEIGHTS = os.getenv("DELIVERY_DESTINATION_WEIGHTS", "")
+
+    # Circuit Breaker Settings
+    CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "True").lower() == "true"
+    CIRCUIT_BREAKER_WINDOW = int(os.getenv("CIRCUIT_BREAKER_WINDOW", 20))
+    CIRCUIT_BREAKER_MIN_CALLS = int(os.getenv("CIRCUIT_BREAKER_MIN_CALLS", 5))
+    CIRCUIT_BREAKER_ERROR_RATE = float(os.getenv("CIRCUIT_BREAKER_ERROR_RATE", 0.5))
+    CIRCUIT_BREAKER_SLOW_SECONDS = float(os.getenv("CIRCUIT_BREAKER_SLOW_SECONDS", 5))
+    CIRCUIT_BREAKER_SLOW_RATE = float(os.getenv("CIRCUIT_BREAKER_SLOW_RATE", 0.8))
+    CIRCUIT_BREAKER_OPEN_SECONDS = float(os.getenv("CIRCUIT_BREAKER_OPEN_SECONDS", 30))
+    CIRCUIT_BREAKER_HALF_OPEN_CALLS = int(os.getenv("CIRCUIT_BREAKER_HALF_OPEN_CALLS", 1))
+
+    # Storage Settings
+    DATABASE_PATH = os.getenv("DATABASE_PATH", "webhookmaster.db")
+    USER_STORE_BACKEND = os.getenv("USER_STORE_BACKEND", "sqlite")
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+    USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 60))
+
+    # Rate Limiting Settings
+    RATELIMIT_ENABLED = os.getenv("RATELIMIT_ENABLED", "True").lower() == "true"
+    RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "memory://")
+    RATELIMIT_STRATEGY = os.getenv("RATELIMIT_STRATEGY", "gcra")
+    RATELIMIT_KEY = os.getenv("RATELIMIT_KEY", "ip")
+    WEBHOOK_RATE_LIMIT = os.getenv("WEBHOOK_RATE_LIMIT", "10 per minute")
+    RATELIMIT_SOURCE_LIMITS = os.getenv("RATELIMIT_SOURCE_LIMITS", "")
+
     # Application Settings
     TESTING = os.getenv("TESTING", "False").lower() == "true"
+    PREWARM = os.getenv("PREWARM", "False").lower() == "true"
+    GUNICORN_PRELOAD = os.getenv("GUNICORN_PRELOAD", "False").lower() == "true"
 
 config = Config()
\ No newline at end of file
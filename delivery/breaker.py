@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of delivering to a destination whose circuit is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops sending to a destination that keeps failing or answering slowly.
+
+    The outcomes of the last `window` calls are kept. Once at least
+    `min_calls` of them are in and the share of errors reaches `error_rate`,
+    or the share of calls slower than `slow_seconds` reaches `slow_rate`, the
+    circuit opens and calls are refused for `open_seconds`. Then up to
+    `half_open_calls` trial calls are let through: if they all succeed the
+    circuit closes, and if one fails it opens again.
+    """
+
+    def __init__(self, name, window=20, min_calls=5, error_rate=0.5, slow_seconds=5.0, slow_rate=0.8,
+                 open_seconds=30.0, half_open_calls=1):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self._calls = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._trials = 0
+        self._succeeded = 0
+        self._lock = threading.Lock()
+
+    def _half_open_due(self):
+        return self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds
+
+    def ready(self):
+        """
+        Returns True if a call would be allowed, without claiming it.
+        """
+        with self._lock:
+            if self.state == CLOSED or self._half_open_due():
+                return True
+            return self.state == HALF_OPEN and self._trials < self.half_open_calls
+
+    def allow(self):
+        """
+        Claims a call. Returns False while the circuit is open.
+        """
+        with self._lock:
+            if self._half_open_due():
+                self.state = HALF_OPEN
+                self._trials = self._succeeded = 0
+                logger.info("Circuit for %s is half-open", self.name, extra={'event': 'circuit.half_open'})
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._trials < self.half_open_calls:
+                self._trials += 1
+                return True
+            return False
+
+    def record(self, success, duration):
+        """
+        Records the outcome of an allowed call.
+        """
+        slow = duration >= self.slow_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if not success or slow:
+                    self._open()
+                    return
+                self._succeeded += 1
+                if self._succeeded >= self.half_open_calls:
+                    self.state = CLOSED
+                    self._calls.clear()
+                    logger.info("Circuit for %s closed", self.name, extra={'event': 'circuit.closed'})
+                return
+            if self.state != CLOSED:
+                return
+            self._calls.append((success, slow))
+            if len(self._calls) < self.min_calls:
+                return
+            errors = sum(1 for ok, _ in self._calls if not ok) / len(self._calls)
+            slows = sum(1 for _, was_slow in self._calls if was_slow) / len(self._calls)
+            if errors >= self.error_rate or slows >= self.slow_rate:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        logger.warning("Circuit for %s opened", self.name, extra={'event': 'circuit.opened'})
+
+
+class CircuitBreakers:
+    """
+    One CircuitBreaker per destination, created on first use with the same settings.
+    """
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, destination):
+        breaker = self._breakers.get(destination)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(destination, CircuitBreaker(destination, **self.settings))
+        return breaker
+
+    def states(self):
+        with self._lock:
+            return {destination: breaker.state for destination, breaker in self._breakers.items()}
+
+
+def create_breakers(config):
+    """
+    Builds the per-destination circuit breakers, or None if they are disabled.
+    """
+    if not config.CIRCUIT_BREAKER_ENABLED:
+        return None
+    return CircuitBreakers(
+        window=config.CIRCUIT_BREAKER_WINDOW,
+        min_calls=config.CIRCUIT_BREAKER_MIN_CALLS,
+        error_rate=config.CIRCUIT_BREAKER_ERROR_RATE,
+        slow_seconds=config.CIRCUIT_BREAKER_SLOW_SECONDS,
+        slow_rate=config.CIRCUIT_BREAKER_SLOW_RATE,
+        open_seconds=config.CIRCUIT_BREAKER_OPEN_SECONDS,
+        half_open_calls=config.CIRCUIT_BREAKER_HALF_OPEN_CALLS,
+    )
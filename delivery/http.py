@@ -0,0 +1,448 @@
+import asyncio
+import email.utils
+import json
+import logging
+import math
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlsplit
+
+from codec import create_codec
+from observability import metrics
+
+# Responses worth retrying; anything else outside 2xx is final
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+logger = logging.getLogger(__name__)
+
+RETRIES = metrics.counter(
+    'webhookmaster_http_retries_total', 'HTTP delivery attempts that were retried, by status or "transport"', ('reason',),
+)
+
+
+class TransportError(Exception):
+    """
+    Raised when a request fails before a response is received.
+    """
+
+
+class DeliveryError(Exception):
+    """
+    Raised when a payload could not be delivered.
+    """
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class RequestsClient:
+    """
+    HTTP/1.1 client with a keep-alive connection pool per host.
+
+    requests is imported and the session built on the first request, so
+    processes that never deliver over HTTP start without them.
+    """
+
+    def __init__(self, max_connections_per_host=10, timeout=10):
+        self.timeout = timeout
+        self.max_connections_per_host = max_connections_per_host
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=self.max_connections_per_host, pool_block=True)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._errors = requests.RequestException
+                    self._session = session
+        return self._session
+
+    def post(self, url, body, headers):
+        return self.request('POST', url, body, headers)
+
+    def request(self, method, url, body, headers):
+        session = self.session
+        try:
+            response = session.request(method, url, data=body, headers=headers, timeout=self.timeout)
+        except self._errors as e:
+            raise TransportError(str(e)) from e
+        return response.status_code, response.headers, response.content
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+
+class HTTPXClient:
+    """
+    HTTP/2-capable client, used when httpx is installed and HTTP/2 is enabled.
+    """
+
+    def __init__(self, max_connections_per_host=10, timeout=10):
+        import httpx
+
+        self._errors = httpx.TransportError
+        self.client = httpx.Client(
+            http2=True,
+            timeout=timeout,
+            limits=httpx.Limits(max_keepalive_connections=max_connections_per_host),
+        )
+
+    def post(self, url, body, headers):
+        return self.request('POST', url, body, headers)
+
+    def request(self, method, url, body, headers):
+        try:
+            response = self.client.request(method, url, content=body, headers=headers)
+        except self._errors as e:
+            raise TransportError(str(e)) from e
+        return response.status_code, response.headers, response.content
+
+    def close(self):
+        self.client.close()
+
+
+class RateLimitBuckets:
+    """
+    Tracks Discord-style rate limit buckets from X-RateLimit-* response headers.
+
+    Several routes can share one bucket; once a bucket is exhausted, requests on
+    any of its routes wait for the reset instead of earning a 429.
+    """
+
+    GLOBAL = '*'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._resets = {}
+
+    def wait_time(self, route):
+        with self._lock:
+            reset = max(
+                self._resets.get(self._routes.get(route, route), 0.0),
+                self._resets.get(self.GLOBAL, 0.0),
+            )
+        return max(0.0, reset - time.monotonic())
+
+    def update(self, route, headers):
+        now = time.monotonic()
+        with self._lock:
+            bucket = headers.get('X-RateLimit-Bucket')
+            if bucket:
+                self._routes[route] = bucket
+            # Headers that do not parse are ignored; they arrive on responses
+            # that may have succeeded, which must not turn into failures
+            global_delay = parse_seconds(headers.get('Retry-After'))
+            if headers.get('X-RateLimit-Global') and global_delay is not None:
+                # A global limit pauses every route, not just this bucket
+                self._resets[self.GLOBAL] = now + global_delay
+            key = self._routes.get(route, route)
+            remaining = parse_seconds(headers.get('X-RateLimit-Remaining'))
+            reset_after = parse_seconds(headers.get('X-RateLimit-Reset-After'))
+            if remaining is None or reset_after is None:
+                return
+            if remaining <= 0:
+                self._resets[key] = now + reset_after
+            else:
+                self._resets.pop(key, None)
+
+
+def parse_seconds(value):
+    """
+    Parses a non-negative number from a header, or returns None if it is
+    missing, malformed or not finite.
+    """
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(number):
+        return None
+    return max(0.0, number)
+
+
+def retry_after(headers, content):
+    """
+    Returns how long the server asked us to wait, in seconds, if it said so.
+    """
+    value = headers.get('Retry-After')
+    if value:
+        seconds = parse_seconds(value)
+        if seconds is not None:
+            return seconds
+        try:
+            parsed = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            parsed = None
+        if parsed is not None:
+            return max(0.0, parsed.timestamp() - time.time())
+    # Discord also reports the delay in the body of a 429
+    try:
+        body = json.loads(content)
+    except ValueError:
+        return None
+    if isinstance(body, dict) and isinstance(body.get('retry_after'), (int, float)):
+        return max(0.0, float(body['retry_after']))
+    return None
+
+
+def prepare(url, payload, codec):
+    """
+    Encodes a payload and returns the body, headers and destination host.
+    """
+    # Webhook URLs carry credentials, so errors only name the host
+    return codec.dumps(payload), {'Content-Type': 'application/json'}, urlsplit(url).netloc
+
+
+class HTTPDelivery:
+    """
+    Posts JSON payloads to webhook URLs over a shared connection pool.
+
+    At most `max_connections_per_host` deliveries run against one host at a
+    time. Failed attempts are retried with exponential backoff and full jitter,
+    honoring Retry-After and rate limit buckets.
+    """
+
+    def __init__(self, client, max_connections_per_host=10, max_retries=5, backoff_base=0.5, max_backoff=30, codec=None):
+        self.client = client
+        self.codec = codec or create_codec()
+        self.max_connections_per_host = max_connections_per_host
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.buckets = RateLimitBuckets()
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+        self._in_flight = {}
+
+    def _track(self, host, change):
+        with self._hosts_lock:
+            self._in_flight[host] = self._in_flight.get(host, 0) + change
+
+    @contextmanager
+    def _slot(self, host):
+        with self._hosts_lock:
+            slots = self._hosts.get(host)
+            if slots is None:
+                slots = self._hosts[host] = threading.BoundedSemaphore(self.max_connections_per_host)
+        with slots:
+            self._track(host, 1)
+            try:
+                yield
+            finally:
+                self._track(host, -1)
+
+    def stats(self):
+        """
+        Returns the number of deliveries holding a connection slot, per host.
+        """
+        with self._hosts_lock:
+            return dict(self._in_flight)
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff_base * 2 ** attempt))
+
+    def deliver(self, url, payload, headers=None, method='POST', route=None):
+        """
+        Sends the payload as JSON and returns the response status.
+
+        `route` names the rate limit route when URLs differ only by an ID,
+        like Discord's /guilds/{guild}/members/{user}; it defaults to the URL.
+        """
+        body, request_headers, host = prepare(url, payload, self.codec)
+        if headers:
+            request_headers.update(headers)
+        route = route or url
+        with self._slot(host):
+            for attempt in range(self.max_retries + 1):
+                wait = self.buckets.wait_time(route)
+                if wait:
+                    time.sleep(min(wait, self.max_backoff))
+                try:
+                    response = self.client.request(method, url, body, request_headers)
+                except TransportError as e:
+                    response = e
+                status, delay = self.outcome(route, host, attempt, response)
+                if delay is None:
+                    return status
+                time.sleep(delay)
+
+    def outcome(self, url, host, attempt, response):
+        """
+        Decides what an attempt means: returns (status, None) once delivered,
+        or (None, delay) when the next attempt should follow after `delay`.
+        Raises DeliveryError when the delivery should be given up.
+        """
+        if isinstance(response, TransportError):
+            error = DeliveryError(f"Request to {host} failed: {response}")
+            reason = 'transport'
+            delay = None
+        else:
+            status, response_headers, content = response
+            self.buckets.update(url, response_headers)
+            if status < 300:
+                return status, None
+            error = DeliveryError(f"{host} responded with {status}", status)
+            if status not in RETRY_STATUSES:
+                raise error
+            reason = str(status)
+            delay = retry_after(response_headers, content)
+        if attempt == self.max_retries:
+            raise error
+        RETRIES.inc((reason,))
+        if delay is None:
+            delay = self.backoff(attempt)
+        return None, min(delay, self.max_backoff)
+
+    def close(self):
+        self.client.close()
+
+
+class AsyncHTTPXClient:
+    """
+    Non-blocking client for the ASGI app, backed by httpx.
+    """
+
+    def __init__(self, max_connections_per_host=10, timeout=10, http2=False):
+        import httpx
+
+        self._errors = httpx.TransportError
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=max_connections_per_host),
+        )
+
+    async def post(self, url, body, headers):
+        try:
+            response = await self.client.post(url, content=body, headers=headers)
+        except self._errors as e:
+            raise TransportError(str(e)) from e
+        return response.status_code, response.headers, response.content
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class ThreadedClient:
+    """
+    Runs a blocking client on worker threads when httpx is not installed.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    async def post(self, url, body, headers):
+        return await asyncio.to_thread(self.client.post, url, body, headers)
+
+    async def close(self):
+        self.client.close()
+
+
+class AsyncHTTPDelivery(HTTPDelivery):
+    """
+    asyncio version of HTTPDelivery, with the same retry and rate limit rules.
+    """
+
+    @asynccontextmanager
+    async def _async_slot(self, host):
+        slots = self._hosts.get(host)
+        if slots is None:
+            slots = self._hosts[host] = asyncio.Semaphore(self.max_connections_per_host)
+        async with slots:
+            self._track(host, 1)
+            try:
+                yield
+            finally:
+                self._track(host, -1)
+
+    async def deliver(self, url, payload):
+        body, headers, host = prepare(url, payload, self.codec)
+        async with self._async_slot(host):
+            for attempt in range(self.max_retries + 1):
+                wait = self.buckets.wait_time(url)
+                if wait:
+                    await asyncio.sleep(min(wait, self.max_backoff))
+                try:
+                    response = await self.client.post(url, body, headers)
+                except TransportError as e:
+                    response = e
+                status, delay = self.outcome(url, host, attempt, response)
+                if delay is None:
+                    return status
+                await asyncio.sleep(delay)
+
+    async def close(self):
+        await self.client.close()
+
+
+def http2_available():
+    try:
+        import h2  # noqa: F401
+        import httpx  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_delivery(config):
+    """
+    Builds the HTTP delivery described by the configuration.
+    """
+    client_class = RequestsClient
+    if config.HTTP_DELIVERY_HTTP2:
+        if http2_available():
+            client_class = HTTPXClient
+        else:
+            logger.warning("HTTP/2 requested but httpx[http2] is not installed. Falling back to HTTP/1.1.")
+
+    client = client_class(
+        max_connections_per_host=config.HTTP_DELIVERY_MAX_CONNECTIONS_PER_HOST,
+        timeout=config.HTTP_DELIVERY_TIMEOUT,
+    )
+    return HTTPDelivery(
+        client,
+        max_connections_per_host=config.HTTP_DELIVERY_MAX_CONNECTIONS_PER_HOST,
+        max_retries=config.HTTP_DELIVERY_MAX_RETRIES,
+        backoff_base=config.HTTP_DELIVERY_BACKOFF_BASE,
+        max_backoff=config.HTTP_DELIVERY_MAX_BACKOFF,
+        codec=create_codec(config.JSON_CODEC),
+    )
+
+
+def create_async_delivery(config):
+    """
+    Builds the non-blocking HTTP delivery used by the ASGI app.
+    """
+    try:
+        client = AsyncHTTPXClient(
+            max_connections_per_host=config.HTTP_DELIVERY_MAX_CONNECTIONS_PER_HOST,
+            timeout=config.HTTP_DELIVERY_TIMEOUT,
+            http2=config.HTTP_DELIVERY_HTTP2 and http2_available(),
+        )
+    except ImportError:
+        logger.warning("httpx is not installed. ASGI deliveries will run on worker threads.")
+        client = ThreadedClient(RequestsClient(
+            max_connections_per_host=config.HTTP_DELIVERY_MAX_CONNECTIONS_PER_HOST,
+            timeout=config.HTTP_DELIVERY_TIMEOUT,
+        ))
+    return AsyncHTTPDelivery(
+        client,
+        max_connections_per_host=config.HTTP_DELIVERY_MAX_CONNECTIONS_PER_HOST,
+        max_retries=config.HTTP_DELIVERY_MAX_RETRIES,
+        backoff_base=config.HTTP_DELIVERY_BACKOFF_BASE,
+        max_backoff=config.HTTP_DELIVERY_MAX_BACKOFF,
+        codec=create_codec(config.JSON_CODEC),
+    )
@@ -0,0 +1,326 @@
+import fcntl
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+import uuid
+import zlib
+
+from codec import create_codec
+
+# Every record is framed as <length><crc32><payload>
+HEADER = struct.Struct('<II')
+
+LOCK_FILE = 'lock'
+SEGMENT_SUFFIX = '.log'
+DEAD_LETTER_FILE = 'dead-letter.log'
+
+
+def encode(record, codec):
+    payload = codec.dumps(record)
+    return HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def scan(path, codec):
+    """
+    Reads a log file through a memory map and returns its records and the
+    offset where the valid data ends. A torn or corrupt frame, as left by a
+    crash mid-write, ends the scan.
+    """
+    records = []
+    end = 0
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return records, end
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            while end + HEADER.size <= size:
+                length, checksum = HEADER.unpack_from(data, end)
+                start = end + HEADER.size
+                payload = data[start:start + length]
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    break
+                records.append(codec.loads(payload))
+                end = start + length
+    return records, end
+
+
+class SegmentLog:
+    """
+    One process's append-only log, split into numbered segment files.
+
+    Appends are written straight away and made durable by a flusher thread
+    that fsyncs everything written since its last fsync. Writers that need
+    durability wait for it, so concurrent requests share one fsync.
+    """
+
+    def __init__(self, directory, codec, segment_bytes):
+        self.directory = directory
+        self.codec = codec
+        self.segment_bytes = segment_bytes
+        self.segment = 0
+        self._fd = None
+        self._size = 0
+        self._written = 0
+        self._synced = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._fsync_lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+        os.makedirs(directory)
+        self._lock_fd = os.open(os.path.join(directory, LOCK_FILE), os.O_CREAT | os.O_RDWR, 0o600)
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._open_segment(1)
+        threading.Thread(target=self._flush, name='delivery-log-flusher', daemon=True).start()
+
+    def segment_path(self, number):
+        return os.path.join(self.directory, f"{number:08d}{SEGMENT_SUFFIX}")
+
+    def _open_segment(self, number):
+        self._fd = os.open(self.segment_path(number), os.O_CREAT | os.O_WRONLY | os.O_APPEND, 0o600)
+        self.segment = number
+        self._size = 0
+
+    def append(self, record, durable=True):
+        """
+        Appends a record and returns the segment it was written to. With
+        `durable`, returns only once the record has been fsynced.
+        """
+        frame = encode(record, self.codec)
+        with self._lock:
+            if self._size and self._size + len(frame) > self.segment_bytes:
+                with self._fsync_lock:
+                    os.fsync(self._fd)
+                    os.close(self._fd)
+                    self._open_segment(self.segment + 1)
+                self._synced = self._written
+            os.write(self._fd, frame)
+            self._size += len(frame)
+            self._written += 1
+            position = self._written
+            segment = self.segment
+            self._changed.notify_all()
+            if durable:
+                self._changed.wait_for(lambda: self._synced >= position or self._closed)
+        return segment
+
+    def _flush(self):
+        while True:
+            with self._lock:
+                self._changed.wait_for(lambda: self._written > self._synced or self._closed)
+                if self._closed:
+                    return
+                fd, target = self._fd, self._written
+            with self._fsync_lock:
+                # A segment rotated meanwhile was fsynced when it was closed
+                if fd == self._fd:
+                    os.fsync(fd)
+            with self._lock:
+                self._synced = max(self._synced, target)
+                self._changed.notify_all()
+
+    def remove_segment(self, number):
+        try:
+            os.remove(self.segment_path(number))
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._changed.notify_all()
+            with self._fsync_lock:
+                os.fsync(self._fd)
+                os.close(self._fd)
+        os.close(self._lock_fd)
+
+    def abandon(self):
+        """
+        Drops file descriptors inherited across a fork without touching the
+        parent's log.
+        """
+        os.close(self._fd)
+        os.close(self._lock_fd)
+
+
+class DeadLetters:
+    """
+    Deliveries that failed for good, in one file shared by every process.
+    """
+
+    def __init__(self, path, codec):
+        self.path = path
+        self.codec = codec
+
+    def _append(self, record):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd = os.open(self.path, os.O_CREAT | os.O_RDWR | os.O_APPEND, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # Cut off a record torn by a crash so later ones stay readable
+            _, end = scan(self.path, self.codec)
+            if end != os.fstat(fd).st_size:
+                os.ftruncate(fd, end)
+            os.write(fd, encode(record, self.codec))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def add(self, delivery_id, job, error):
+        self._append({'type': 'dead', 'id': delivery_id, 'job': job, 'error': error, 'at': time.time()})
+
+    def resolve(self, delivery_id):
+        self._append({'type': 'redriven', 'id': delivery_id, 'at': time.time()})
+
+    def entries(self):
+        """
+        Returns the dead letters that have not been re-driven, oldest first.
+        """
+        if not os.path.exists(self.path):
+            return []
+        entries = {}
+        for record in scan(self.path, self.codec)[0]:
+            if record['type'] == 'dead':
+                entries[record['id']] = record
+            else:
+                entries.pop(record['id'], None)
+        return list(entries.values())
+
+
+class DeliveryLog:
+    """
+    Write-ahead log of accepted deliveries and their outcomes.
+
+    Each process appends to its own directory under `directory`. When a
+    process starts, it takes over the directories of processes that died and
+    returns their unfinished deliveries for replay. Segments whose deliveries
+    have all finished are deleted. Deliveries that fail are moved to the
+    shared dead-letter file.
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, codec=None):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.codec = codec or create_codec()
+        self.dead_letters = DeadLetters(os.path.join(directory, DEAD_LETTER_FILE), self.codec)
+        self._log = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._live = {}
+
+    def open(self):
+        """
+        Starts this process's log and returns the (delivery_id, job) pairs
+        left unfinished by dead processes.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return []
+            if self._log is not None:
+                self._log.abandon()
+            os.makedirs(self.directory, exist_ok=True)
+            self._log = SegmentLog(
+                os.path.join(self.directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}"), self.codec, self.segment_bytes,
+            )
+            self._pid = os.getpid()
+            self._pending = {}
+            self._live = {}
+        return self._recover()
+
+    def _recover(self):
+        recovered = []
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not os.path.isdir(path) or path == self._log.directory:
+                continue
+            try:
+                lock_fd = os.open(os.path.join(path, LOCK_FILE), os.O_CREAT | os.O_RDWR, 0o600)
+            except FileNotFoundError:
+                # Already recovered and removed by another process
+                continue
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                segments = sorted(f for f in os.listdir(path) if f.endswith(SEGMENT_SUFFIX))
+            except (BlockingIOError, FileNotFoundError):
+                # Still owned by a live process, or removed while we waited
+                os.close(lock_fd)
+                continue
+            pending = {}
+            for segment in segments:
+                for record in scan(os.path.join(path, segment), self.codec)[0]:
+                    if record['type'] == 'accepted':
+                        pending[record['id']] = record['job']
+                    else:
+                        pending.pop(record['id'], None)
+            # Adopt them into our own log before the old one is removed
+            for delivery_id, job in pending.items():
+                self.accepted(delivery_id, job)
+                recovered.append((delivery_id, job))
+            shutil.rmtree(path, ignore_errors=True)
+            os.close(lock_fd)
+        return recovered
+
+    def accepted(self, delivery_id, job):
+        """
+        Records a delivery durably before it is queued.
+        """
+        segment = self._log.append({'type': 'accepted', 'id': delivery_id, 'job': job})
+        with self._lock:
+            self._pending[delivery_id] = segment
+            self._live[segment] = self._live.get(segment, 0) + 1
+
+    def delivered(self, delivery_id):
+        self._finish(delivery_id, {'type': 'delivered', 'id': delivery_id})
+
+    def failed(self, delivery_id, job, error):
+        """
+        Moves a delivery that failed for good to the dead-letter file.
+        """
+        self.dead_letters.add(delivery_id, job, error)
+        self._finish(delivery_id, {'type': 'dead', 'id': delivery_id})
+
+    def _finish(self, delivery_id, record):
+        # Losing an outcome in a crash only means delivering again on replay
+        written = self._log.append(record, durable=False)
+        with self._lock:
+            # Segments holding only outcomes are tracked so they are removed too
+            self._live.setdefault(written, 0)
+            segment = self._pending.pop(delivery_id, None)
+            if segment is None:
+                return
+            self._live[segment] -= 1
+            # Outcomes can sit in later segments, so only the oldest go first
+            while self._live:
+                oldest = min(self._live)
+                if self._live[oldest] or oldest == self._log.segment:
+                    break
+                del self._live[oldest]
+                self._log.remove_segment(oldest)
+
+    def close(self):
+        """
+        Closes this process's log, removing it if nothing is left unfinished.
+        """
+        if self._log is not None and self._pid == os.getpid():
+            self._log.close()
+            if not self._pending:
+                shutil.rmtree(self._log.directory, ignore_errors=True)
+        self._log = None
+        self._pid = None
+
+
+def create_delivery_log(config):
+    """
+    Builds the delivery log from config, or returns None when it is disabled.
+    """
+    if not config.DELIVERY_LOG_DIR:
+        return None
+    return DeliveryLog(
+        config.DELIVERY_LOG_DIR,
+        segment_bytes=config.DELIVERY_LOG_SEGMENT_SIZE,
+        codec=create_codec(config.JSON_CODEC),
+    )
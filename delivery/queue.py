@@ -0,0 +1,437 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from functools import partial
+from urllib.parse import urlsplit
+
+from delivery.breaker import CircuitOpenError
+from observability.logs import delivery_id as current_delivery
+from storage.sqlite import Database
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """
+    Raised when a destination's queue has no room for another job.
+    """
+
+
+def job_destination(job):
+    """
+    Names where a job goes: the host of its URL, or else its format.
+    """
+    if job.get('url'):
+        return urlsplit(job['url']).netloc
+    return job.get('format')
+
+
+class MemoryBackend:
+    """
+    Keeps pending deliveries in process memory. Fast, but lost on restart
+    unless the queue has a delivery log.
+    """
+
+    durable = False
+    checks_circuits = False
+
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def full(self, job):
+        return False
+
+    def put(self, delivery_id, job):
+        self._queue.put((delivery_id, job))
+
+    def get(self, timeout=None):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def ack(self, delivery_id):
+        pass
+
+    def depth(self):
+        return self._queue.qsize()
+
+
+class SQLiteBackend:
+    """
+    Keeps pending deliveries in a SQLite table so they survive a restart.
+
+    A delivery is claimed by moving it to 'in_flight'; claims older than the
+    lease are handed out again, which recovers jobs from crashed workers.
+    """
+
+    durable = True
+    checks_circuits = False
+
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, path, lease=300):
+        self.db = Database(path)
+        self.lease = lease
+        self._ready = threading.Condition()
+        conn = self.db.connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS deliveries ('
+            ' id TEXT PRIMARY KEY,'
+            ' job TEXT NOT NULL,'
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            ' claimed_at REAL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS deliveries_status ON deliveries (status, claimed_at)')
+
+    def full(self, job):
+        return False
+
+    def put(self, delivery_id, job):
+        self.db.connect().execute(
+            'INSERT INTO deliveries (id, job) VALUES (?, ?)', (delivery_id, json.dumps(job))
+        )
+        with self._ready:
+            self._ready.notify()
+
+    def get(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            row = self._claim()
+            if row is not None:
+                return row[0], json.loads(row[1])
+            wait = self.POLL_INTERVAL
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                wait = min(wait, remaining)
+            # Other processes may enqueue too, so fall back to polling.
+            with self._ready:
+                self._ready.wait(wait)
+
+    def _claim(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so no other worker can
+        # claim the row between the SELECT and the UPDATE. This avoids
+        # UPDATE ... RETURNING, which needs SQLite 3.35.
+        now = time.time()
+        conn = self.db.connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT id, job FROM deliveries '
+                "WHERE status = 'pending' OR (status = 'in_flight' AND claimed_at < ?) "
+                'ORDER BY rowid LIMIT 1',
+                (now - self.lease,),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE deliveries SET status = 'in_flight', claimed_at = ? WHERE id = ?", (now, row[0])
+                )
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return row
+
+    def ack(self, delivery_id):
+        self.db.connect().execute('DELETE FROM deliveries WHERE id = ?', (delivery_id,))
+
+    def depth(self):
+        return self.db.connect().execute('SELECT COUNT(*) FROM deliveries').fetchone()[0]
+
+
+class FairBackend:
+    """
+    Keeps pending deliveries in memory, in a bounded queue per destination,
+    so a slow or dead destination cannot hold up the others.
+
+    Workers take jobs from destinations in weighted round robin: a destination
+    of weight 3 gets up to three jobs in a row before the next one's turn. No
+    destination holds more than `concurrency` workers at once, and
+    destinations whose circuit is open are skipped, leaving their jobs queued
+    until the circuit lets a trial call through.
+    """
+
+    durable = False
+
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, destination=job_destination, breakers=None, capacity=10000, concurrency=2, weights=None):
+        self.destination = destination
+        self.breakers = breakers
+        self.capacity = capacity
+        self.concurrency = concurrency
+        self.weights = dict(weights or {})
+        # Calls are claimed from the circuit breakers here rather than by the workers
+        self.checks_circuits = breakers is not None
+        self._queues = {}
+        self._ring = []
+        self._cursor = 0
+        self._served = 0
+        self._in_flight = {}
+        self._claimed = {}
+        self._ready = threading.Condition()
+
+    def full(self, job):
+        with self._ready:
+            jobs = self._queues.get(self.destination(job))
+            return jobs is not None and len(jobs) >= self.capacity
+
+    def put(self, delivery_id, job):
+        destination = self.destination(job)
+        with self._ready:
+            jobs = self._queues.get(destination)
+            if jobs is None:
+                jobs = self._queues[destination] = deque()
+                self._in_flight[destination] = 0
+                self._ring.append(destination)
+            jobs.append((delivery_id, job))
+            self._ready.notify()
+
+    def get(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._ready:
+            while True:
+                item = self._next()
+                if item is not None:
+                    return item
+                # Open circuits let calls through again with time, so waits are capped
+                wait = self.POLL_INTERVAL
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    wait = min(wait, remaining)
+                self._ready.wait(wait)
+
+    def _next(self):
+        if not self._ring:
+            return None
+        # One step more than there are destinations, so the current one gets a new turn last
+        for _ in range(len(self._ring) + 1):
+            destination = self._ring[self._cursor]
+            if self._served < self.weights.get(destination, 1) and self._eligible(destination):
+                self._served += 1
+                delivery_id, job = self._queues[destination].popleft()
+                self._in_flight[destination] += 1
+                self._claimed[delivery_id] = destination
+                return delivery_id, job
+            self._cursor = (self._cursor + 1) % len(self._ring)
+            self._served = 0
+        return None
+
+    def _eligible(self, destination):
+        if not self._queues[destination] or self._in_flight[destination] >= self.concurrency:
+            return False
+        # Checked last, since allowing a call claims it
+        return self.breakers is None or self.breakers.get(destination).allow()
+
+    def ack(self, delivery_id):
+        with self._ready:
+            destination = self._claimed.pop(delivery_id, None)
+            if destination is not None:
+                self._in_flight[destination] -= 1
+                self._ready.notify()
+
+    def depth(self):
+        with self._ready:
+            return sum(len(jobs) for jobs in self._queues.values())
+
+    def depths(self):
+        """
+        Returns the number of queued jobs per destination.
+        """
+        with self._ready:
+            return {destination: len(jobs) for destination, jobs in self._queues.items()}
+
+
+def parse_weights(value):
+    """
+    Parses "slack=3;email=1" into a dict of destination weights.
+    """
+    weights = {}
+    for entry in value.split(';'):
+        if not entry.strip():
+            continue
+        destination, _, weight = entry.partition('=')
+        try:
+            weights[destination.strip()] = max(1, int(weight))
+        except ValueError:
+            raise ValueError(f"Invalid destination weight: {entry!r}") from None
+    return weights
+
+
+def create_backend(name, path=None, **fair):
+    """
+    Builds a queue backend from its configured name. Keyword arguments
+    configure the fair backend.
+    """
+    if name == 'fair':
+        return FairBackend(**fair)
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'sqlite':
+        return SQLiteBackend(path)
+    raise ValueError(f"Unknown delivery queue backend: {name}")
+
+
+class DeliveryQueue:
+    """
+    Accepts delivery jobs and drains them with a pool of worker threads.
+
+    Workers start on the first enqueue in each process, so the queue is safe to
+    create before gunicorn forks.
+
+    With a delivery log, jobs on a backend that is not durable are written
+    ahead to the log and replayed if their process dies, and jobs whose
+    handler raises go to the log's dead-letter queue.
+
+    With circuit breakers, the outcome and duration of every job is recorded
+    against its destination. Jobs for a destination whose circuit is open
+    fail at once, unless the backend skips them until the circuit allows.
+
+    A handler that sends later, like the SMTP batcher, returns a Future. Its
+    worker moves on to the next job, and the job is logged, dead-lettered and
+    recorded against its breaker once the Future resolves.
+    """
+
+    def __init__(self, handler, backend=None, workers=4, log=None, breakers=None, destination=job_destination):
+        self.handler = handler
+        self.backend = backend or MemoryBackend()
+        self.workers = workers
+        self.log = log
+        self.breakers = breakers
+        self.destination = destination
+        self._journal = log is not None and not self.backend.durable
+        self._threads = []
+        self._pid = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._outstanding = set()
+        self._idle = threading.Condition(self._lock)
+
+    def enqueue(self, job):
+        """
+        Queues a job for delivery and returns its delivery ID. Raises
+        QueueFull when the job's destination has too many jobs waiting.
+        """
+        if self.backend.full(job):
+            raise QueueFull(f"Too many deliveries waiting for {self.destination(job)}")
+        delivery_id = uuid.uuid4().hex
+        self.start()
+        with self._lock:
+            self._outstanding.add(delivery_id)
+        if self._journal:
+            self.log.accepted(delivery_id, job)
+        self.backend.put(delivery_id, job)
+        return delivery_id
+
+    def start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._work, name=f"delivery-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+            if self._journal:
+                for delivery_id, job in self.log.open():
+                    logger.warning("Replaying delivery", extra={'event': 'delivery.replayed', 'delivery_id': delivery_id})
+                    self._outstanding.add(delivery_id)
+                    self.backend.put(delivery_id, job)
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._pid = None
+        if self._journal:
+            self.log.close()
+
+    def join(self, timeout=None):
+        """
+        Waits until every job enqueued by this process has been handled.
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._outstanding, timeout)
+
+    def depth(self):
+        return self.backend.depth()
+
+    def _work(self):
+        while not self._stopping.is_set():
+            item = self.backend.get(timeout=0.5)
+            if item is None:
+                continue
+            delivery_id, job = item
+            # Records logged while delivering carry the delivery ID
+            token = current_delivery.set(delivery_id)
+            try:
+                sent = self._handle(job)
+            except Exception as e:
+                self._finish(delivery_id, job, e)
+            else:
+                if not isinstance(sent, Future):
+                    self._finish(delivery_id, job)
+                else:
+                    # A durable backend keeps the job until it is sent; the
+                    # others hold only the worker's slot, which is freed now
+                    if not self.backend.durable:
+                        self.backend.ack(delivery_id)
+                    sent.add_done_callback(partial(self._settle, delivery_id, job))
+            finally:
+                current_delivery.reset(token)
+
+    def _settle(self, delivery_id, job, sent):
+        token = current_delivery.set(delivery_id)
+        try:
+            self._finish(delivery_id, job, sent.exception(), ack=self.backend.durable)
+        finally:
+            current_delivery.reset(token)
+
+    def _finish(self, delivery_id, job, error=None, ack=True):
+        if error is not None:
+            logger.error("Error delivering: %s", error, extra={'event': 'delivery.failed', 'format': job.get('format')})
+            if self._journal:
+                self.log.failed(delivery_id, job, str(error))
+            elif self.log is not None:
+                self.log.dead_letters.add(delivery_id, job, str(error))
+        elif self._journal:
+            self.log.delivered(delivery_id)
+        if ack:
+            self.backend.ack(delivery_id)
+        with self._idle:
+            self._outstanding.discard(delivery_id)
+            self._idle.notify_all()
+
+    def _handle(self, job):
+        if self.breakers is None:
+            return self.handler(job)
+        breaker = self.breakers.get(self.destination(job))
+        if not self.backend.checks_circuits and not breaker.allow():
+            raise CircuitOpenError(f"Circuit for {breaker.name} is open")
+        started = time.monotonic()
+        try:
+            sent = self.handler(job)
+        except Exception:
+            breaker.record(False, time.monotonic() - started)
+            raise
+        if isinstance(sent, Future):
+            sent.add_done_callback(lambda done: breaker.record(done.exception() is None, time.monotonic() - started))
+            return sent
+        breaker.record(True, time.monotonic() - started)
+        return sent
@@ -0,0 +1,101 @@
+import json
+import os
+from collections import namedtuple
+
+from transformers.rules import compile_condition, compile_template
+
+# One destination of a route. A url of None means the format's configured URL
+# and a template of None means the format's formatter builds the payload.
+Target = namedtuple('Target', 'format url template', defaults=(None, None))
+
+
+class Route:
+    """
+    Sends a source's events that match every filter to each of its targets.
+
+    Filters map a dotted path in the parsed payload to the value it must
+    equal, or to a list of accepted values. `when` is a compiled condition
+    that must also hold.
+    """
+
+    def __init__(self, name, source, targets, match=None, when=None):
+        self.name = name
+        self.source = source
+        self.targets = tuple(targets)
+        self.match = dict(match or {})
+        self.when = when
+
+    def matches(self, data):
+        if self.when is not None and not self.when(data):
+            return False
+        for path, expected in self.match.items():
+            value = data
+            for key in path.split('.'):
+                value = value.get(key) if isinstance(value, dict) else None
+            if value not in (expected if isinstance(expected, list) else [expected]):
+                return False
+        return True
+
+
+class RoutingTable:
+    """
+    Maps a source to the routes that fan its events out.
+    """
+
+    def __init__(self, routes=()):
+        self.routes = tuple(routes)
+        self._by_source = {}
+        for route in self.routes:
+            self._by_source.setdefault(route.source, []).append(route)
+
+    def targets(self, source, data):
+        """
+        Returns the distinct targets of every route matching a parsed payload.
+        """
+        targets = []
+        for route in self._by_source.get(source, ()):
+            if route.matches(data):
+                targets.extend(target for target in route.targets if target not in targets)
+        return targets
+
+    def __len__(self):
+        return len(self.routes)
+
+
+def parse_routes(spec, registry):
+    """
+    Builds a routing table from its JSON form, checking every source and
+    format against the registry and compiling conditions and templates.
+    Raises ValueError on an invalid table.
+    """
+    routes = []
+    for index, entry in enumerate(spec.get('routes', [])):
+        name = entry.get('name', f"route-{index}")
+        source = entry.get('source')
+        if source not in registry.sources:
+            raise ValueError(f"Route {name!r} has unknown source {source!r}")
+        targets = []
+        for target in entry.get('targets', []):
+            if target.get('format') not in registry.formats:
+                raise ValueError(f"Route {name!r} has unknown format {target.get('format')!r}")
+            template = target.get('template')
+            if template is not None:
+                template = compile_template(template)
+            targets.append(Target(target['format'], target.get('url'), template))
+        if not targets:
+            raise ValueError(f"Route {name!r} has no targets")
+        when = entry.get('when')
+        if when is not None:
+            when = compile_condition(when)
+        routes.append(Route(name, source, targets, entry.get('match'), when))
+    return RoutingTable(routes)
+
+
+def load_routes(path, registry):
+    """
+    Loads the routing table from a JSON file. A missing file means no routes.
+    """
+    if not path or not os.path.exists(path):
+        return RoutingTable()
+    with open(path) as f:
+        return parse_routes(json.load(f), registry)
@@ -0,0 +1,264 @@
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from email.message import EmailMessage
+
+from observability import metrics
+
+logger = logging.getLogger(__name__)
+
+# Errors after which a connection can no longer be trusted
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+CONNECTIONS_OPENED = metrics.counter('webhookmaster_smtp_connections_opened_total', 'SMTP connections opened by the pool')
+RETRIES = metrics.counter('webhookmaster_smtp_retries_total', 'SMTP sends retried on a new connection after one broke')
+
+
+class SMTPPool:
+    """
+    Keeps up to `size` logged-in SMTP connections open and shares them between threads.
+
+    Connections idle for longer than `keepalive` seconds are checked with NOOP
+    before reuse, and a connection that fails mid-send is replaced and the send
+    retried once.
+    """
+
+    def __init__(self, host, port, username=None, password=None, starttls=True, size=4, keepalive=30, timeout=10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """
+        Returns how many pooled connections are idle and in use.
+        """
+        return {'idle': self._idle.qsize(), 'in_use': self._in_use}
+
+    def _connect(self):
+        CONNECTIONS_OPENED.inc()
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            smtp.starttls()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        return smtp
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    smtp, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if time.monotonic() - last_used < self.keepalive or self._is_alive(smtp):
+                    return smtp
+                self._discard(smtp)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, smtp, broken=False):
+        if broken:
+            self._discard(smtp)
+        else:
+            self._idle.put((smtp, time.monotonic()))
+        self._slots.release()
+
+    @staticmethod
+    def _is_alive(smtp):
+        try:
+            return smtp.noop()[0] == 250
+        except CONNECTION_ERRORS:
+            return False
+
+    @staticmethod
+    def _discard(smtp):
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+    @contextmanager
+    def connection(self):
+        smtp = self._acquire()
+        with self._lock:
+            self._in_use += 1
+        try:
+            yield smtp
+        except CONNECTION_ERRORS:
+            self._release(smtp, broken=True)
+            raise
+        except Exception:
+            # The SMTP session may be mid-transaction, so reset it before reuse
+            try:
+                smtp.rset()
+            except Exception:
+                # A session that cannot be reset is not reused
+                self._release(smtp, broken=True)
+                raise
+            self._release(smtp)
+            raise
+        else:
+            self._release(smtp)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+
+    def send(self, messages):
+        """
+        Sends one message or a list of messages over a single pooled session.
+        """
+        if isinstance(messages, EmailMessage):
+            messages = [messages]
+        remaining = list(messages)
+        for attempt in range(2):
+            try:
+                with self.connection() as smtp:
+                    while remaining:
+                        smtp.send_message(remaining[0])
+                        remaining.pop(0)
+                return
+            except CONNECTION_ERRORS:
+                if attempt:
+                    raise
+                RETRIES.inc()
+
+    def close(self):
+        while True:
+            try:
+                smtp, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(smtp)
+
+
+class SMTPBatcher:
+    """
+    Collects messages for up to `window` seconds (or `max_size` messages) and
+    sends each batch through the pool in one go.
+
+    With `coalesce` set, a batch is merged into a single digest message instead
+    of being sent as separate messages over one session. `send()` returns a
+    Future that resolves once the batch holding the message has been sent.
+    """
+
+    def __init__(self, pool, window=0.2, max_size=50, coalesce=False):
+        self.pool = pool
+        self.window = window
+        self.max_size = max_size
+        self.coalesce = coalesce
+        self._pending = []
+        self._lock = threading.Condition()
+        self._pid = None
+
+    def send(self, message):
+        future = Future()
+        with self._lock:
+            self._start()
+            self._pending.append((message, future))
+            # Wakes the flusher to open a window, or to send a full batch early
+            if len(self._pending) == 1 or len(self._pending) >= self.max_size:
+                self._lock.notify()
+        return future
+
+    def _start(self):
+        # Called with the lock held; one flusher thread per process
+        if self._pid != os.getpid():
+            threading.Thread(target=self._run, name='smtp-batcher', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._lock.wait_for(lambda: self._pending)
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._lock.wait(remaining)
+                batch = self._pending[:self.max_size]
+                del self._pending[:self.max_size]
+            self._flush(batch)
+
+    def flush(self):
+        """
+        Sends whatever is pending right away.
+        """
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch):
+        messages = [message for message, _ in batch]
+        if self.coalesce and len(messages) > 1:
+            messages = [coalesce_messages(messages)]
+        try:
+            self.pool.send(messages)
+        except Exception as e:
+            logger.error("Error sending email batch: %s", e, extra={'event': 'delivery.failed', 'format': 'email'})
+            for _, future in batch:
+                future.set_exception(e)
+        else:
+            for _, future in batch:
+                future.set_result(None)
+
+    def close(self):
+        self.flush()
+        self.pool.close()
+
+
+def coalesce_messages(messages):
+    """
+    Merges several notifications into one digest email.
+    """
+    first = messages[0]
+    digest = EmailMessage()
+    digest['From'] = first['From']
+    digest['To'] = first['To']
+    digest['Subject'] = f"{len(messages)} webhook notifications"
+    digest.set_content('\n\n'.join(
+        f"{message['Subject']}\n{'-' * len(message['Subject'])}\n{message.get_content().strip()}"
+        for message in messages
+    ))
+    return digest
+
+
+def create_transport(config):
+    """
+    Builds the email transport described by the configuration.
+    """
+    pool = SMTPPool(
+        config.SMTP_HOST,
+        config.SMTP_PORT,
+        username=config.EMAIL_SENDER,
+        password=config.EMAIL_PASSWORD,
+        starttls=config.SMTP_STARTTLS,
+        size=config.SMTP_POOL_SIZE,
+        keepalive=config.SMTP_KEEPALIVE_SECONDS,
+        timeout=config.SMTP_TIMEOUT,
+    )
+    if config.SMTP_BATCH_WINDOW_MS > 0:
+        return SMTPBatcher(
+            pool,
+            window=config.SMTP_BATCH_WINDOW_MS / 1000,
+            max_size=config.SMTP_BATCH_MAX_SIZE,
+            coalesce=config.SMTP_BATCH_COALESCE,
+        )
+    return pool
@@ -0,0 +1,36 @@
+# Read by gunicorn from the working directory.
+#
+# With GUNICORN_PRELOAD, the app is imported once in the master and workers
+# fork from it. With PREWARM, the subsystems otherwise loaded on first use
+# (payments, OAuth) are imported before the first request: in the master when
+# preloading, or else in each worker as it starts.
+#
+# Either way, importing the app starts no delivery workers and replays no
+# deliveries, so the master holds no delivery jobs, log segments or locks for
+# the workers to inherit. Each worker starts its own in post_worker_init, and
+# takes over deliveries left by dead workers. The only thread started on
+# import is the log listener, which each worker restarts with a fresh queue
+# right after the fork.
+#
+# Every top-level name here is read as a gunicorn setting, and "config" is one.
+from config import config as app_config
+
+preload_app = app_config.GUNICORN_PRELOAD
+
+
+def when_ready(server):
+    if server.cfg.workers > 1 and app_config.RATELIMIT_ENABLED and app_config.RATELIMIT_STORAGE_URI.startswith('memory://'):
+        server.log.warning(
+            "RATELIMIT_STORAGE_URI is memory://, so each of the %s workers keeps its own counters "
+            "and admits the full limit. Use sqlite:// or redis:// to share them.", server.cfg.workers,
+        )
+    if preload_app and app_config.PREWARM:
+        from app import prewarm
+        prewarm()
+
+
+def post_worker_init(worker):
+    from app import prewarm, start_workers
+    if not preload_app and app_config.PREWARM:
+        prewarm()
+    start_workers()
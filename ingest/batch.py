@@ -0,0 +1,181 @@
+import codecs
+import json
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\r\n'
+
+# The character that ends an array element, by the one it starts with
+CLOSERS = {'{': '}', '[': ']', '"': '"'}
+
+_decoder = json.JSONDecoder()
+
+
+class BatchFormatError(ValueError):
+    """
+    Raised when a batch body is not a JSON array or NDJSON stream.
+    """
+
+
+def _chunks(stream, chunk_size):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                yield tail
+            return
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+
+
+def iter_ndjson(stream, chunk_size=CHUNK_SIZE):
+    """
+    Yields one decoded value per non-blank line of a newline-delimited JSON stream.
+    """
+    # Chunks of an unfinished line are joined once it ends, so a long line is
+    # copied and searched for newlines only once
+    pending = []
+    line_number = 0
+    for chunk in _chunks(stream, chunk_size):
+        if '\n' not in chunk:
+            pending.append(chunk)
+            continue
+        pending.append(chunk)
+        *lines, tail = ''.join(pending).split('\n')
+        pending = [tail]
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield _decode_line(line, line_number)
+    buffer = ''.join(pending)
+    if buffer.strip():
+        yield _decode_line(buffer, line_number + 1)
+
+
+def _decode_line(line, line_number):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        raise BatchFormatError(f"Invalid JSON on line {line_number}: {e}") from e
+
+
+def iter_json_array(stream, chunk_size=CHUNK_SIZE):
+    """
+    Yields the elements of a top-level JSON array without reading the whole body.
+
+    Only the element being decoded is kept in memory; consumed text is dropped
+    as soon as each element has been yielded.
+    """
+    chunks = _chunks(stream, chunk_size)
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill(size=0, closer=None):
+        """
+        Reads chunks until at least `size` characters are unconsumed and, given
+        a `closer`, one of the new chunks contains it. Returns False if the
+        stream had ended and nothing was read.
+        """
+        nonlocal buffer, pos, eof
+        pieces = [buffer[pos:]]
+        length = len(pieces[0])
+        seen = closer is None
+        while not eof:
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+                break
+            pieces.append(chunk)
+            length += len(chunk)
+            seen = seen or closer in chunk
+            if length >= size and seen:
+                break
+        if len(pieces) == 1:
+            return False
+        buffer = ''.join(pieces)
+        pos = 0
+        return True
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or not fill():
+                return
+
+    skip(WHITESPACE)
+    if pos >= len(buffer) or buffer[pos] != '[':
+        raise BatchFormatError('Expected a JSON array')
+    pos += 1
+
+    expect_value = True
+    while True:
+        skip(WHITESPACE)
+        if pos >= len(buffer):
+            raise BatchFormatError('Unterminated JSON array')
+        if buffer[pos] == ']':
+            pos += 1
+            skip(WHITESPACE)
+            if pos < len(buffer):
+                raise BatchFormatError(f"Unexpected {buffer[pos]!r} after JSON array")
+            return
+        if not expect_value:
+            if buffer[pos] != ',':
+                raise BatchFormatError(f"Expected ',' or ']' in JSON array, found {buffer[pos]!r}")
+            pos += 1
+            expect_value = True
+            continue
+
+        closer = CLOSERS.get(buffer[pos])
+        while True:
+            try:
+                value, end = _decoder.raw_decode(buffer, pos)
+            except ValueError as e:
+                # Most likely the element continues in later chunks. Decoding
+                # it again after every chunk would take time quadratic in its
+                # size, so wait until it has doubled and could have ended.
+                if not fill(2 * (len(buffer) - pos), closer):
+                    raise BatchFormatError(f"Invalid JSON in array: {e}") from e
+                continue
+            # A number or literal touching the end of the buffer may be cut short
+            if end == len(buffer) and not eof and fill():
+                continue
+            break
+        pos = end
+        expect_value = False
+        yield value
+
+
+def iter_batch(stream, chunk_size=CHUNK_SIZE):
+    """
+    Yields the events of a batch body, which is either a JSON array or NDJSON.
+    """
+    first = stream.read(1)
+    while first and first.isspace():
+        first = stream.read(1)
+    if not first:
+        return iter(())
+    rest = _Prefixed(first, stream)
+    if first == b'[':
+        return iter_json_array(rest, chunk_size)
+    return iter_ndjson(rest, chunk_size)
+
+
+class _Prefixed:
+    """
+    Puts already-read bytes back in front of a stream.
+    """
+
+    def __init__(self, prefix, stream):
+        self.prefix = prefix
+        self.stream = stream
+
+    def read(self, size=-1):
+        if self.prefix:
+            prefix, self.prefix = self.prefix, b''
+            return prefix + self.stream.read(max(size - len(prefix), 0) if size > 0 else -1)
+        return self.stream.read(size)
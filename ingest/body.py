@@ -0,0 +1,140 @@
+import io
+import mmap
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BodyTooLarge(ValueError):
+    """
+    Raised when a request body grows past its source's limit.
+    """
+
+    def __init__(self, limit):
+        super().__init__(f"Payload exceeds the {limit} byte limit")
+        self.limit = limit
+
+
+class BodyLimits:
+    """
+    The largest body accepted from each source, with a default for the rest.
+    """
+
+    def __init__(self, default, limits=None):
+        self.default = default
+        self.limits = dict(limits or {})
+
+    def limit(self, source):
+        return self.limits.get(source, self.default)
+
+    @property
+    def largest(self):
+        return max([self.default, *self.limits.values()])
+
+
+def parse_limits(value):
+    """
+    Parses "webflow=104857600;wix=1048576" into byte limits per source.
+    """
+    limits = {}
+    for entry in value.split(';'):
+        if not entry.strip():
+            continue
+        source, _, size = entry.partition('=')
+        if not size.strip().isdigit():
+            raise ValueError(f"Invalid body size limit: {entry!r}")
+        limits[source.strip()] = int(size)
+    return limits
+
+
+class BodySpool:
+    """
+    Collects a request body, in memory until it grows past `threshold` bytes
+    and in an anonymous temp file after that, so a large body never sits in
+    the worker's heap. Raises BodyTooLarge once it passes `limit`.
+
+    `view()` returns the body as bytes, or as a read-only memory map of the
+    temp file that codecs, HMACs and hashes read without copying.
+    """
+
+    def __init__(self, threshold, limit=None, directory=None):
+        self.threshold = threshold
+        self.limit = limit
+        self.directory = directory or None
+        self.size = 0
+        self._buffer = io.BytesIO()
+        self._file = None
+        self._map = None
+        self._view = None
+
+    @property
+    def spooled(self):
+        return self._file is not None
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.limit is not None and self.size > self.limit:
+            raise BodyTooLarge(self.limit)
+        if self._file is None and self.size > self.threshold:
+            self._file = tempfile.TemporaryFile(dir=self.directory)
+            self._file.write(self._buffer.getbuffer())
+            self._buffer = None
+        (self._file or self._buffer).write(chunk)
+
+    def view(self):
+        if self._file is None:
+            if self._view is None:
+                self._view = self._buffer.getvalue()
+            return self._view
+        if self._map is None:
+            self._file.flush()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+        return self._view
+
+    def open(self):
+        """
+        Returns a file-like object that reads the body from the start.
+        """
+        if self._file is None:
+            return io.BytesIO(self.view())
+        self._file.seek(0)
+        return self._file
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._view.release()
+                self._map.close()
+            except BufferError:
+                # Still referenced, e.g. by undecoded msgspec Raw values; the
+                # mapping is released with the last of them
+                pass
+            self._map = self._view = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._view = None
+
+
+def spool(stream, threshold, limit=None, directory=None, chunk_size=CHUNK_SIZE):
+    """
+    Reads a stream into a BodySpool, one chunk at a time.
+    """
+    body = BodySpool(threshold, limit, directory)
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return body
+            body.write(chunk)
+    except BaseException:
+        body.close()
+        raise
+
+
+def create_limits(config):
+    """
+    Builds the per-source body size limits from config.
+    """
+    return BodyLimits(config.BODY_MAX_BYTES, parse_limits(config.BODY_SOURCE_LIMITS))
@@ -0,0 +1,161 @@
+import gzip
+import heapq
+import os
+import random
+import struct
+import threading
+import time
+import uuid
+import zlib
+
+from codec import create_codec
+
+# Every request is framed as <meta length><body length><crc32><meta><body>
+HEADER = struct.Struct('<III')
+
+SUFFIX = '.capture.gz'
+
+# Recomputed when a request is replayed, describe the original connection
+# rather than the request (hop-by-hop), or are too sensitive to write to disk
+DROPPED_HEADERS = frozenset({
+    'host', 'content-length', 'connection', 'transfer-encoding', 'te', 'trailer', 'upgrade', 'keep-alive',
+    'proxy-authorization', 'proxy-authenticate', 'proxy-connection', 'expect', 'authorization', 'cookie',
+})
+
+# Written requests are flushed to the file at most this often
+FLUSH_SECONDS = 1.0
+
+
+class TrafficCapture:
+    """
+    Records raw inbound requests to a gzip-compressed file per process, so
+    production traffic can be replayed later with `benchmarks.replay`.
+
+    Only requests to `paths` are kept, a `sample_rate` share of them, until a
+    process has written `max_bytes` of uncompressed records.
+    """
+
+    def __init__(self, directory, paths, sample_rate=1.0, max_bytes=1024 ** 3, codec=None):
+        self.directory = directory
+        self.paths = frozenset(paths)
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.codec = codec or create_codec()
+        self._file = None
+        self._pid = None
+        self._written = 0
+        self._flushed = 0.0
+        # Handles inherited across a fork; closing one would write into the parent's file
+        self._inherited = []
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    def wants(self, path):
+        return self.enabled and path in self.paths
+
+    def _open(self):
+        if self._file is not None:
+            self._inherited.append(self._file)
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{int(time.time())}-{os.getpid()}-{uuid.uuid4().hex[:8]}{SUFFIX}"
+        self._file = gzip.open(os.path.join(self.directory, name), 'wb')
+        self._pid = os.getpid()
+        self._written = 0
+
+    def record(self, method, path, query, headers, body, status=None, now=None):
+        """
+        Writes one request. Returns False if it was sampled out or the
+        process has reached its byte limit.
+        """
+        if random.random() >= self.sample_rate:
+            return False
+        now = now or time.time()
+        meta = self.codec.dumps({
+            'time': now,
+            'method': method,
+            'path': path,
+            'query': query,
+            'headers': [[name, value] for name, value in headers if name.lower() not in DROPPED_HEADERS],
+            'status': status,
+        })
+        frame = HEADER.pack(len(meta), len(body), zlib.crc32(body, zlib.crc32(meta))) + meta + body
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            if self._written + len(frame) > self.max_bytes:
+                return False
+            self._file.write(frame)
+            self._written += len(frame)
+            if now - self._flushed >= FLUSH_SECONDS:
+                self._file.flush()
+                self._flushed = now
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._file is not None and self._pid == os.getpid():
+                self._file.close()
+            self._file = None
+            self._pid = None
+
+
+def capture_files(path):
+    """
+    Returns the capture files at a path: the file itself, or every capture
+    file in a directory.
+    """
+    if not os.path.isdir(path):
+        return [path]
+    return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(SUFFIX))
+
+
+def read_file(path, codec):
+    """
+    Yields the requests of one capture file. A file cut short, as left by a
+    process that was killed, ends at its last complete request.
+    """
+    with gzip.open(path, 'rb') as f:
+        try:
+            while True:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    return
+                meta_length, body_length, checksum = HEADER.unpack(header)
+                meta = f.read(meta_length)
+                body = f.read(body_length)
+                if len(meta) < meta_length or len(body) < body_length:
+                    return
+                if zlib.crc32(body, zlib.crc32(meta)) != checksum:
+                    return
+                request = codec.loads(meta)
+                request['body'] = body
+                yield request
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            return
+
+
+def read_capture(path, codec=None):
+    """
+    Yields the captured requests at a path in the order they were answered,
+    merging the files written by every worker.
+    """
+    codec = codec or create_codec()
+    files = [read_file(name, codec) for name in capture_files(path)]
+    return heapq.merge(*files, key=lambda request: request['time'])
+
+
+def create_capture(config):
+    """
+    Builds the traffic capture from config. It records nothing unless
+    CAPTURE_DIR is set.
+    """
+    return TrafficCapture(
+        config.CAPTURE_DIR,
+        [path.strip() for path in config.CAPTURE_PATHS.split(',') if path.strip()],
+        sample_rate=config.CAPTURE_SAMPLE_RATE,
+        max_bytes=config.CAPTURE_MAX_BYTES,
+        codec=create_codec(config.JSON_CODEC),
+    )
@@ -0,0 +1,143 @@
+import hashlib
+import math
+import threading
+import time
+
+from storage.cache import LRUCache
+
+# Headers that carry a provider's unique delivery ID, checked in order. Names
+# are lower case so plain ASGI header dicts work as well as Flask's headers.
+DELIVERY_ID_HEADERS = (
+    ('github', 'x-github-delivery'),
+    ('shopify', 'x-shopify-webhook-id'),
+    ('generic', 'idempotency-key'),
+)
+
+
+class BloomFilter:
+    """
+    Fixed-size set membership test with no false negatives.
+
+    Sized for `capacity` keys at the given false positive rate.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        # Double hashing derives every position from two 64-bit halves
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RotatingBloomFilter:
+    """
+    Bloom filter that forgets keys older than `window` seconds.
+
+    Keys go into the current generation and are looked up in both; every
+    `window` seconds the older generation is dropped, so memory stays fixed
+    and a key is remembered for between one and two windows.
+    """
+
+    def __init__(self, capacity, window, error_rate=0.001):
+        self.capacity = capacity
+        self.window = window
+        self.error_rate = error_rate
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous = BloomFilter(capacity, error_rate)
+        self.rotated_at = time.monotonic()
+
+    def _rotate(self):
+        now = time.monotonic()
+        if now - self.rotated_at < self.window:
+            return
+        if now - self.rotated_at < 2 * self.window:
+            self.previous = self.current
+        else:
+            # After a long idle period both generations are stale
+            self.previous = BloomFilter(self.capacity, self.error_rate)
+        self.current = BloomFilter(self.capacity, self.error_rate)
+        self.rotated_at = now
+
+    def add(self, key):
+        self._rotate()
+        self.current.add(key)
+
+    def __contains__(self, key):
+        self._rotate()
+        return key in self.current or key in self.previous
+
+
+class IdempotencyGuard:
+    """
+    Remembers recently seen event keys so retried deliveries are dropped.
+
+    The Bloom filter answers "never seen" without touching the cache. A Bloom
+    hit is confirmed against an exact LRU of recent keys, so a false positive
+    or an evicted key is let through rather than wrongly dropped.
+    """
+
+    def __init__(self, window=86400, capacity=100000, error_rate=0.001):
+        self.bloom = RotatingBloomFilter(capacity, window, error_rate)
+        self.recent = LRUCache(capacity, window)
+        self._lock = threading.Lock()
+
+    def seen(self, key):
+        """
+        Records the key and returns True if it was already recorded.
+        """
+        with self._lock:
+            if key in self.bloom and self.recent.get(key):
+                return True
+            self.bloom.add(key)
+            self.recent.set(key, True)
+            return False
+
+    def forget(self, key):
+        """
+        Un-records a key, so an event that could not be accepted is let
+        through when it is retried. The Bloom filter keeps the key, but every
+        Bloom hit is confirmed against the exact cache.
+        """
+        with self._lock:
+            self.recent.pop(key)
+
+    def clear(self):
+        with self._lock:
+            self.bloom = RotatingBloomFilter(self.bloom.capacity, self.bloom.window, self.bloom.error_rate)
+            self.recent.clear()
+
+
+def event_key(headers, body, scope='', content_hash=True):
+    """
+    Returns the idempotency key of an inbound webhook, or None if it has none.
+
+    Provider delivery IDs are preferred. Otherwise, when `content_hash` is
+    set, identical bodies within the window count as the same event. Keys are
+    prefixed with `scope` so one event can still go to several destinations.
+    """
+    for provider, header in DELIVERY_ID_HEADERS:
+        value = headers.get(header)
+        if value:
+            return f"{scope}:{provider}:{value}"
+    if content_hash and body:
+        return f"{scope}:sha256:{hashlib.sha256(body).hexdigest()}"
+    return None
+
+
+def create_guard(config):
+    """
+    Builds the duplicate filter described by the configuration.
+    """
+    return IdempotencyGuard(config.IDEMPOTENCY_WINDOW, config.IDEMPOTENCY_CAPACITY)
@@ -0,0 +1,147 @@
+import base64
+import functools
+import hashlib
+import hmac
+import time
+
+
+@functools.lru_cache(maxsize=64)
+def keyed(secret):
+    """
+    Returns an HMAC-SHA256 object already keyed with `secret`. Copying it is
+    cheaper than keying a new one for every request.
+    """
+    return hmac.new(secret.encode(), digestmod=hashlib.sha256)
+
+
+def sign(secret, *parts):
+    mac = keyed(secret).copy()
+    for part in parts:
+        mac.update(part)
+    return mac
+
+
+def matches(received, expected):
+    # Constant-time, and on bytes so that non-ASCII headers cannot raise
+    return hmac.compare_digest(received.encode(), expected.encode())
+
+
+def fresh(timestamp, tolerance, now):
+    """
+    Returns True if a signed timestamp, in seconds, is within `tolerance` of now.
+    """
+    return tolerance is None or abs((now or time.time()) - timestamp) <= tolerance
+
+
+def verify_hex(header):
+    """
+    Builds a verifier for a hex HMAC-SHA256 of the body, prefixed by "sha256=".
+    """
+    def verify(headers, body, secret, tolerance=None, now=None):
+        signature = headers.get(header, '')
+        return signature.startswith('sha256=') and matches(signature[7:], sign(secret, body).hexdigest())
+    return verify
+
+
+def verify_shopify(headers, body, secret, tolerance=None, now=None):
+    expected = base64.b64encode(sign(secret, body).digest()).decode()
+    return matches(headers.get('x-shopify-hmac-sha256', ''), expected)
+
+
+def verify_stripe(headers, body, secret, tolerance=300, now=None):
+    """
+    Checks a Stripe-Signature header: "t=<timestamp>,v1=<signature>,...".
+    """
+    timestamp = None
+    signatures = []
+    for item in headers.get('stripe-signature', '').split(','):
+        key, _, value = item.strip().partition('=')
+        if key == 't' and value.isdigit():
+            timestamp = int(value)
+        elif key == 'v1':
+            signatures.append(value)
+    if timestamp is None or not fresh(timestamp, tolerance, now):
+        return False
+    expected = sign(secret, f"{timestamp}.".encode(), body).hexdigest()
+    return any(matches(signature, expected) for signature in signatures)
+
+
+def verify_webflow(headers, body, secret, tolerance=300, now=None):
+    """
+    Checks x-webflow-signature, an HMAC of "<timestamp>:<body>" with the
+    timestamp in milliseconds.
+    """
+    timestamp = headers.get('x-webflow-timestamp', '')
+    if not timestamp.isdigit() or not fresh(int(timestamp) / 1000, tolerance, now):
+        return False
+    expected = sign(secret, f"{timestamp}:".encode(), body).hexdigest()
+    return matches(headers.get('x-webflow-signature', ''), expected)
+
+
+def verify_token(header):
+    """
+    Builds a verifier for providers that send the shared secret itself.
+    """
+    def verify(headers, body, secret, tolerance=None, now=None):
+        return matches(headers.get(header, ''), secret)
+    return verify
+
+
+# How each source signs its webhooks. Header names are lowercase.
+VERIFIERS = {
+    'default': verify_hex('x-webhook-signature'),
+    'github': verify_hex('x-hub-signature-256'),
+    'shopify': verify_shopify,
+    'stripe': verify_stripe,
+    'webflow': verify_webflow,
+    'cloudflare': verify_token('cf-webhook-auth'),
+}
+
+
+class SignatureVerifier:
+    """
+    Checks webhook signatures on the raw body, before it is decoded.
+
+    A source with a secret must be signed. A source without one is accepted
+    unless `required` is set.
+    """
+
+    def __init__(self, secrets, required=False, tolerance=300):
+        self.secrets = {source: secret for source, secret in secrets.items() if secret}
+        unsupported = set(self.secrets) - set(VERIFIERS)
+        if unsupported:
+            raise ValueError(f"No signature scheme for sources: {', '.join(sorted(unsupported))}")
+        self.required = required
+        self.tolerance = tolerance
+
+    def verify(self, source, headers, body, now=None):
+        secret = self.secrets.get(source)
+        if secret is None:
+            return not self.required
+        return VERIFIERS[source](headers, body, secret, self.tolerance, now)
+
+
+def parse_secrets(value):
+    """
+    Parses "github=<secret>;shopify=<secret>" into a dict.
+    """
+    secrets = {}
+    for entry in value.split(';'):
+        if not entry.strip():
+            continue
+        source, _, secret = entry.partition('=')
+        if not secret.strip():
+            raise ValueError(f"Invalid webhook secret for {source.strip()!r}")
+        secrets[source.strip()] = secret.strip()
+    return secrets
+
+
+def create_verifier(config):
+    """
+    Builds the signature verifier from the per-source secrets in config.
+    """
+    return SignatureVerifier(
+        parse_secrets(config.WEBHOOK_SECRETS),
+        required=config.WEBHOOK_SIGNATURES_REQUIRED,
+        tolerance=config.WEBHOOK_SIGNATURE_TOLERANCE,
+    )
@@ -0,0 +1,186 @@
+import atexit
+import contextvars
+import datetime
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+
+from codec import create_codec
+from observability import metrics
+
+# Set while a request or a delivery is handled, and added to every record logged meanwhile
+request_id = contextvars.ContextVar('request_id', default=None)
+delivery_id = contextvars.ContextVar('delivery_id', default=None)
+
+# Incoming X-Request-ID values are only trusted if they look like an ID
+REQUEST_ID_PATTERN = re.compile(r'^[\w.:-]{1,128}$')
+
+# Attributes every LogRecord has; anything else was passed in `extra`
+STANDARD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+DROPPED = metrics.counter('webhookmaster_log_records_dropped_total', 'Log records dropped because the log queue was full')
+
+
+def new_request_id(incoming=None):
+    """
+    Returns the caller's request ID if it is usable, or a new one.
+    """
+    if incoming and REQUEST_ID_PATTERN.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def parse_sample_rates(value):
+    """
+    Parses "delivery.sent=0.1,delivery.no_destination=0.01" into a dict.
+    """
+    rates = {}
+    for entry in value.split(','):
+        if not entry.strip():
+            continue
+        event, _, rate = entry.partition('=')
+        try:
+            rates[event.strip()] = float(rate)
+        except ValueError:
+            raise ValueError(f"Invalid log sample rate: {entry!r}") from None
+    return rates
+
+
+def truncate(value, limit, codec):
+    """
+    Shortens a log field to about `limit` characters. Dicts and lists that
+    would encode longer are replaced by their truncated JSON.
+    """
+    if isinstance(value, (dict, list, tuple)):
+        encoded = codec.dumps(value, default=str).decode()
+        if len(encoded) <= limit:
+            return value
+        value = encoded
+    elif not isinstance(value, (str, int, float, bool, type(None))):
+        value = str(value)
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}...({len(value) - limit} more characters)"
+    return value
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line, with its `extra` fields,
+    request and delivery IDs.
+    """
+
+    def __init__(self, max_field_length=1024, codec=None):
+        super().__init__()
+        self.max_field_length = max_field_length
+        self.codec = codec or create_codec()
+
+    def fields(self, record):
+        fields = {}
+        for key, value in vars(record).items():
+            if key not in STANDARD_ATTRIBUTES and value is not None:
+                fields[key] = truncate(value, self.max_field_length, self.codec)
+        return fields
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': truncate(record.getMessage(), self.max_field_length, self.codec),
+        }
+        entry.update(self.fields(record))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return self.codec.dumps(entry, default=str).decode()
+
+
+class TextFormatter(JSONFormatter):
+    """
+    Formats a record as a line of text followed by its fields as key=value.
+    """
+
+    def format(self, record):
+        line = f"{self.formatTime(record)} {record.levelname} {record.name}: {record.getMessage()}"
+        fields = ' '.join(f"{key}={value}" for key, value in self.fields(record).items())
+        if fields:
+            line = f"{line} [{fields}]"
+        if record.exc_info:
+            line = f"{line}\n{self.formatException(record.exc_info)}"
+        return line
+
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a listener thread that formats and writes them.
+
+    The calling thread only samples the record, tags it with the current
+    request and delivery IDs and queues it; payloads are not even turned into
+    strings until the listener formats them. A record whose `event` has a
+    sample rate is kept with that probability. When the queue is full,
+    records are dropped and counted rather than blocking a request.
+    """
+
+    def __init__(self, log_queue, sample_rates=None):
+        super().__init__(log_queue)
+        self.sample_rates = dict(sample_rates or {})
+
+    def prepare(self, record):
+        return record
+
+    def handle(self, record):
+        # The queue is thread-safe, so emitting skips the handler lock
+        rv = self.filter(record)
+        if rv:
+            self.emit(record)
+        return rv
+
+    def emit(self, record):
+        rate = self.sample_rates.get(getattr(record, 'event', None))
+        if rate is not None:
+            if random.random() >= rate:
+                return
+            record.sample_rate = rate
+        # IDs passed in `extra` win over the current context
+        if getattr(record, 'request_id', None) is None:
+            record.request_id = request_id.get()
+        if getattr(record, 'delivery_id', None) is None:
+            record.delivery_id = delivery_id.get()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED.inc()
+
+
+def configure_logging(config):
+    """
+    Sends every log record through a BackgroundHandler to stdout and returns
+    the listener writing them.
+    """
+    formatter_class = TextFormatter if config.LOG_FORMAT == 'text' else JSONFormatter
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(formatter_class(config.LOG_MAX_FIELD_LENGTH, create_codec(config.JSON_CODEC)))
+
+    handler = BackgroundHandler(queue.Queue(config.LOG_QUEUE_SIZE), parse_sample_rates(config.LOG_SAMPLE_RATES))
+    listener = logging.handlers.QueueListener(handler.queue, output)
+
+    root = logging.getLogger()
+    for existing in [h for h in root.handlers if isinstance(h, BackgroundHandler)]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(config.LOG_LEVEL.upper())
+    listener.start()
+    atexit.register(listener.stop)
+
+    def after_fork():
+        # The listener thread is gone and the queue's lock may have been
+        # held by it, so the child starts over with a fresh queue
+        handler.queue = listener.queue = queue.Queue(config.LOG_QUEUE_SIZE)
+        listener._thread = None
+        listener.start()
+    os.register_at_fork(after_in_child=after_fork)
+    return listener
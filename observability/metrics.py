@@ -0,0 +1,377 @@
+import atexit
+import bisect
+import fcntl
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, that cover microsecond parse steps as well as slow deliveries
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+ARCHIVE_FILE = 'archive.json'
+LOCK_FILE = 'lock'
+
+
+class Counter:
+    """
+    A count that only goes up, per combination of label values. Label values
+    are passed as a tuple of strings in the order of `labels`.
+    """
+
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def describe(self):
+        return {'type': self.type, 'help': self.help, 'labels': self.labels}
+
+    def samples(self):
+        with self._lock:
+            return {labels: value for labels, value in self._values.items()}
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+
+class Histogram(Counter):
+    """
+    Counts observations into buckets and keeps their sum.
+
+    Each series is a list of per-bucket counts, the +Inf count last but one
+    and the sum last; buckets are only made cumulative when rendered.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def describe(self):
+        return dict(super().describe(), buckets=self.buckets)
+
+    def samples(self):
+        with self._lock:
+            return {labels: list(series) for labels, series in self._values.items()}
+
+
+class Gauge(Counter):
+    """
+    A value that can go up and down, either set directly or read from
+    `collect`, a function returning {label values: value}, at collection time.
+
+    Across processes, gauges are summed, or with aggregate="max" the largest
+    value is kept for values every process sees alike, like a shared queue's depth.
+    """
+
+    type = 'gauge'
+
+    def __init__(self, name, help, labels=(), collect=None, aggregate='sum'):
+        super().__init__(name, help, labels)
+        self.collect = collect
+        self.aggregate = aggregate
+
+    def set(self, labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+    def describe(self):
+        return dict(super().describe(), aggregate=self.aggregate)
+
+    def samples(self):
+        if self.collect is not None:
+            try:
+                return dict(self.collect())
+            except Exception as e:
+                logger.error("Error collecting %s: %s", self.name, e)
+                return {}
+        return super().samples()
+
+
+class Registry:
+    """
+    The metrics of one process.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """
+        Adds a metric, or returns the one already registered under its name
+        so that modules can be imported again.
+        """
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is None:
+                self._metrics[metric.name] = metric
+                return metric
+        if type(existing) is not type(metric) or existing.labels != metric.labels:
+            raise ValueError(f"Metric {metric.name} is already registered differently")
+        if isinstance(metric, Gauge):
+            existing.collect = metric.collect
+            existing.aggregate = metric.aggregate
+        return existing
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, labels=(), collect=None, aggregate='sum'):
+        return self.register(Gauge(name, help, labels, collect, aggregate))
+
+    def snapshot(self):
+        """
+        Returns every metric and its samples as plain data.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: dict(metric.describe(), samples=metric.samples())
+            for metric in metrics
+        }
+
+    def reset(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+
+def merge(snapshots):
+    """
+    Adds up snapshots from several processes: counters and histograms are
+    summed, gauges summed or maxed according to their aggregate.
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.get(name)
+            if target is None:
+                target = merged[name] = dict(metric, samples={})
+            samples = target['samples']
+            for labels, value in metric['samples'].items():
+                current = samples.get(labels)
+                if current is None:
+                    samples[labels] = list(value) if isinstance(value, list) else value
+                elif metric['type'] == 'histogram':
+                    samples[labels] = [a + b for a, b in zip(current, value)]
+                elif metric.get('aggregate') == 'max':
+                    samples[labels] = max(current, value)
+                else:
+                    samples[labels] = current + value
+    return merged
+
+
+def _labels(names, values, extra=None):
+    pairs = [(name, str(value)) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        name + '="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot):
+    """
+    Renders a snapshot in the Prometheus text exposition format.
+    """
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for labels, value in sorted(metric['samples'].items()):
+            if metric['type'] != 'histogram':
+                lines.append(f"{name}{_labels(metric['labels'], labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric['buckets']) + [float('inf')], value):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(metric['labels'], labels, ('le', _number(bound)))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(metric['labels'], labels)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(metric['labels'], labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+def _encode(snapshot):
+    return {
+        name: dict(metric, samples=[[list(labels), value] for labels, value in metric['samples'].items()])
+        for name, metric in snapshot.items()
+    }
+
+
+def _decode(data):
+    return {
+        name: dict(metric, samples={tuple(labels): value for labels, value in metric['samples']})
+        for name, metric in data.items()
+    }
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsStore:
+    """
+    Shares metrics between the processes of a gunicorn server.
+
+    Every process writes a snapshot of its registry to `directory` every
+    `interval` seconds and on exit; a scrape adds up the snapshots of all
+    processes. Counts of processes that exited are folded into an archive so
+    totals never go down, while their gauges are dropped. Without a
+    directory, only the current process is reported.
+    """
+
+    def __init__(self, registry, directory=None, interval=5):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._started = False
+
+    def start(self):
+        if not self.directory or self._started:
+            return
+        self._started = True
+        os.makedirs(self.directory, exist_ok=True)
+        # Counts inherited from the parent are the parent's to report
+        os.register_at_fork(after_in_child=self._after_fork)
+        atexit.register(self.write)
+        self._spawn()
+
+    def _spawn(self):
+        threading.Thread(target=self._run, name='metrics-writer', daemon=True).start()
+
+    def _after_fork(self):
+        self.registry.reset()
+        self._stopping = threading.Event()
+        self._spawn()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def write(self):
+        """
+        Writes this process's snapshot, replacing the previous one atomically.
+        """
+        if not self.directory:
+            return
+        path = self._path(os.getpid())
+        temporary = f"{path}.tmp"
+        try:
+            with open(temporary, 'w') as f:
+                json.dump(_encode(self.registry.snapshot()), f)
+            os.replace(temporary, path)
+        except OSError as e:
+            logger.error("Error writing metrics: %s", e)
+
+    def collect(self):
+        """
+        Returns the merged snapshot of every process.
+        """
+        own = self.registry.snapshot()
+        if not self.directory:
+            return own
+        os.makedirs(self.directory, exist_ok=True)
+        snapshots = [own]
+        lock_fd = os.open(os.path.join(self.directory, LOCK_FILE), os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            archive = self._read(ARCHIVE_FILE) or {}
+            archived = False
+            for name in os.listdir(self.directory):
+                pid, _, suffix = name.partition('.')
+                if suffix != 'json' or not pid.isdigit() or int(pid) == os.getpid():
+                    continue
+                snapshot = self._read(name)
+                if snapshot is None:
+                    continue
+                if _alive(int(pid)):
+                    snapshots.append(snapshot)
+                    continue
+                counts = {key: metric for key, metric in snapshot.items() if metric['type'] != 'gauge'}
+                archive = merge([archive, counts])
+                archived = True
+                os.remove(os.path.join(self.directory, name))
+            if archived:
+                path = os.path.join(self.directory, ARCHIVE_FILE)
+                with open(f"{path}.tmp", 'w') as f:
+                    json.dump(_encode(archive), f)
+                os.replace(f"{path}.tmp", path)
+        finally:
+            os.close(lock_fd)
+        snapshots.append(archive)
+        return merge(snapshots)
+
+    def _read(self, name):
+        try:
+            with open(os.path.join(self.directory, name)) as f:
+                return _decode(json.load(f))
+        except (OSError, ValueError):
+            return None
+
+
+# Metrics of this process, shared by every module
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+gauge = REGISTRY.gauge
+
+
+def create_store(config):
+    """
+    Builds the metrics store described by the configuration.
+    """
+    return MetricsStore(REGISTRY, config.METRICS_DIR or None, config.METRICS_FLUSH_INTERVAL)
@@ -0,0 +1,62 @@
+import time
+
+from limits.strategies import STRATEGIES, RateLimiter
+from limits.util import WindowStats
+
+
+def gcra(tat, now, interval, window, cost=1):
+    """
+    Applies the generic cell rate algorithm to one key.
+
+    `tat` is the key's theoretical arrival time (0 for a new key). A request is
+    allowed while the bucket, refilled at one cell per `interval` seconds, has
+    room for `cost` cells within `window`. Returns (allowed, new_tat).
+    """
+    new_tat = max(tat, now) + interval * cost
+    if new_tat - now > window:
+        return False, tat
+    return True, new_tat
+
+
+class GCRARateLimiter(RateLimiter):
+    """
+    Token bucket rate limiting via GCRA, storing one timestamp per key.
+
+    "10 per minute" allows a burst of 10 requests and then one every 6
+    seconds. Works with storages that provide `acquire_gcra` and `get_gcra`.
+    """
+
+    def __init__(self, storage):
+        if not hasattr(storage, 'acquire_gcra'):
+            raise NotImplementedError(
+                f"GCRARateLimiter is not implemented for storage of type {storage.__class__}"
+            )
+        super().__init__(storage)
+
+    @staticmethod
+    def _params(item):
+        window = item.get_expiry()
+        return window / item.amount, window
+
+    def hit(self, item, *identifiers, cost=1):
+        interval, window = self._params(item)
+        return self.storage.acquire_gcra(item.key_for(*identifiers), interval, window, cost)
+
+    def test(self, item, *identifiers, cost=1):
+        interval, window = self._params(item)
+        tat = self.storage.get_gcra(item.key_for(*identifiers))
+        return gcra(tat, time.time(), interval, window, cost)[0]
+
+    def get_window_stats(self, item, *identifiers):
+        interval, window = self._params(item)
+        now = time.time()
+        tat = max(self.storage.get_gcra(item.key_for(*identifiers)), now)
+        remaining = int((window - (tat - now)) // interval)
+        if remaining > 0:
+            return WindowStats(tat, remaining)
+        # Exhausted: report when the next request will be let through
+        return WindowStats(tat - window + interval, 0)
+
+
+# Lets Flask-Limiter select it with strategy="gcra"
+STRATEGIES['gcra'] = GCRARateLimiter
@@ -0,0 +1,85 @@
+import hashlib
+
+from flask import request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_limiter.util import get_remote_address
+
+
+def jwt_identity():
+    """
+    Returns the identity of a valid JWT on the request, if there is one.
+    """
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    except Exception:
+        return None
+
+
+def request_source():
+    return request.args.get('source', 'default')
+
+
+# Parts a rate limit key can be built from
+KEY_PARTS = {
+    'ip': get_remote_address,
+    'source': request_source,
+    'identity': lambda: jwt_identity() or 'anonymous',
+}
+
+
+def signing_secret(secrets):
+    """
+    Returns a key part naming the signing secret of the request's source by a
+    hash, so the secret itself never reaches the limiter's storage. Rotating
+    a secret starts a new quota.
+    """
+    fingerprints = {source: hashlib.sha256(secret.encode()).hexdigest()[:16] for source, secret in secrets.items()}
+
+    def part():
+        return fingerprints.get(request_source(), 'unsigned')
+    return part
+
+
+def make_key_func(parts, secrets=None):
+    """
+    Builds a Flask-Limiter key function from a comma-separated list of parts,
+    e.g. "source" for one quota per provider or "source,identity" per tenant.
+    The "secret" part keys on the signing secret of the source in `secrets`.
+    """
+    names = [part.strip() for part in parts.split(',') if part.strip()]
+    available = dict(KEY_PARTS, secret=signing_secret(secrets or {}))
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown rate limit key parts: {', '.join(unknown)}")
+    funcs = [(name, available[name]) for name in names]
+
+    def key_func():
+        return '|'.join(f"{name}={func()}" for name, func in funcs)
+    return key_func
+
+
+def parse_source_limits(value):
+    """
+    Parses "github=100 per minute;stripe=20 per second" into a dict.
+    """
+    limits = {}
+    for entry in value.split(';'):
+        if not entry.strip():
+            continue
+        source, _, limit = entry.partition('=')
+        if not limit.strip():
+            raise ValueError(f"Invalid source rate limit: {entry!r}")
+        limits[source.strip()] = limit.strip()
+    return limits
+
+
+def source_limit(default, source_limits):
+    """
+    Returns a dynamic limit that picks the quota for the request's source.
+    """
+    limits = parse_source_limits(source_limits)
+
+    def limit():
+        return limits.get(request_source(), default)
+    return limit
@@ -0,0 +1,195 @@
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+from limits import storage as limits_storage
+
+from ratelimit.gcra import gcra
+from storage.sqlite import Database
+
+# Importing this module registers these classes for their URI schemes, so
+# `memory://` and `redis://` gain GCRA support and `sqlite://` becomes available.
+
+
+class MemoryStorage(limits_storage.MemoryStorage):
+    """
+    Per-process storage, as before, with GCRA support.
+    """
+
+    STORAGE_SCHEME = ['memory']
+
+    # Drop spent GCRA keys every this many writes to bound memory
+    PURGE_EVERY = 10000
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self._tats = {}
+        self._tats_lock = threading.Lock()
+        self._writes = 0
+
+    def acquire_gcra(self, key, interval, window, cost=1):
+        now = time.time()
+        with self._tats_lock:
+            allowed, tat = gcra(self._tats.get(key, 0.0), now, interval, window, cost)
+            if allowed:
+                self._tats[key] = tat
+                self._writes += 1
+                if self._writes % self.PURGE_EVERY == 0:
+                    self._tats = {k: v for k, v in self._tats.items() if v > now}
+        return allowed
+
+    def get_gcra(self, key):
+        return self._tats.get(key, 0.0)
+
+    def clear(self, key):
+        with self._tats_lock:
+            self._tats.pop(key, None)
+        super().clear(key)
+
+    def reset(self):
+        with self._tats_lock:
+            self._tats.clear()
+        return super().reset()
+
+
+class SQLiteStorage(limits_storage.Storage):
+    """
+    Storage in a SQLite file shared by every worker process on the host.
+
+    Use `sqlite:///relative/path.db` or `sqlite:////absolute/path.db`. Each
+    update runs in an immediate transaction, so concurrent workers never
+    over-admit.
+    """
+
+    STORAGE_SCHEME = ['sqlite']
+
+    # Delete expired rows every this many writes to bound the table size
+    PURGE_EVERY = 1000
+
+    def __init__(self, uri, wrap_exceptions=False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        path = urlparse(uri).path[1:] or ':memory:'
+        self.db = Database(path)
+        self._writes = 0
+        self.db.connect().execute(
+            'CREATE TABLE IF NOT EXISTS ratelimit ('
+            ' key TEXT PRIMARY KEY,'
+            ' value REAL NOT NULL,'
+            ' expires_at REAL NOT NULL)'
+        )
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _transaction(self, update):
+        conn = self.db.connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = update(conn)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute('DELETE FROM ratelimit WHERE expires_at < ?', (time.time(),))
+        return result
+
+    def _row(self, conn, key, now):
+        row = conn.execute('SELECT value, expires_at FROM ratelimit WHERE key = ?', (key,)).fetchone()
+        if row is None or row[1] <= now:
+            return None
+        return row
+
+    def _store(self, conn, key, value, expires_at):
+        conn.execute(
+            'INSERT INTO ratelimit (key, value, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at',
+            (key, value, expires_at),
+        )
+
+    def incr(self, key, expiry, amount=1):
+        def update(conn):
+            now = time.time()
+            row = self._row(conn, key, now)
+            if row is None:
+                value, expires_at = amount, now + expiry
+            else:
+                value, expires_at = row[0] + amount, row[1]
+            self._store(conn, key, value, expires_at)
+            return int(value)
+        return self._transaction(update)
+
+    def get(self, key):
+        row = self._row(self.db.connect(), key, time.time())
+        return int(row[0]) if row else 0
+
+    def get_expiry(self, key):
+        now = time.time()
+        row = self._row(self.db.connect(), key, now)
+        return row[1] if row else now
+
+    def acquire_gcra(self, key, interval, window, cost=1):
+        def update(conn):
+            now = time.time()
+            row = self._row(conn, key, now)
+            allowed, tat = gcra(row[0] if row else 0.0, now, interval, window, cost)
+            if allowed:
+                self._store(conn, key, tat, tat)
+            return allowed
+        return self._transaction(update)
+
+    def get_gcra(self, key):
+        row = self._row(self.db.connect(), key, time.time())
+        return row[0] if row else 0.0
+
+    def check(self):
+        try:
+            self.db.connect().execute('SELECT 1').fetchone()
+        except sqlite3.Error:
+            return False
+        return True
+
+    def reset(self):
+        return self.db.connect().execute('DELETE FROM ratelimit').rowcount
+
+    def clear(self, key):
+        self.db.connect().execute('DELETE FROM ratelimit WHERE key = ?', (key,))
+
+
+class RedisStorage(limits_storage.RedisStorage):
+    """
+    The stock Redis storage with GCRA support, via a Lua script that uses the
+    Redis server clock so every app host agrees on time.
+    """
+
+    STORAGE_SCHEME = ['redis', 'rediss', 'redis+unix']
+
+    SCRIPT_GCRA = """
+    local interval = tonumber(ARGV[1])
+    local window = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local tat = tonumber(redis.call('GET', KEYS[1]) or 0)
+    if tat < now then tat = now end
+    local new_tat = tat + interval * cost
+    if new_tat - now > window then
+        return 0
+    end
+    redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+    return 1
+    """
+
+    def initialize_storage(self, uri):
+        super().initialize_storage(uri)
+        self.lua_gcra = self.get_connection().register_script(self.SCRIPT_GCRA)
+
+    def acquire_gcra(self, key, interval, window, cost=1):
+        return bool(self.lua_gcra([self.prefixed_key(key)], [interval, window, cost]))
+
+    def get_gcra(self, key):
+        value = self.get_connection(readonly=True).get(self.prefixed_key(key))
+        return float(value) if value else 0.0
@@ -0,0 +1,40 @@
+import os
+import sqlite3
+import threading
+
+# Connections opened before a fork. SQLite connections must not be used or
+# closed in the child, so they are only kept from being garbage collected.
+_inherited = []
+
+
+class Database:
+    """
+    Hands out one SQLite connection per thread for a database file.
+
+    Connections run in WAL mode so readers never block the writer, which lets
+    several gunicorn workers share the same file. A process forked after
+    connecting, like a gunicorn worker of a preloaded app, opens its own.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid != os.getpid():
+            _inherited.append(conn)
+            conn = None
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+            self._local.conn = None
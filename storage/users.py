@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import threading
+import time
+
+from storage.cache import LRUCache
+from storage.sqlite import Database, _inherited
+
+
+class MemoryUserStore:
+    """
+    Paid users kept in a set. Only suitable for a single process.
+    """
+
+    def __init__(self):
+        self._users = set()
+
+    def add(self, user_id):
+        self._users.add(user_id)
+
+    def discard(self, user_id):
+        self._users.discard(user_id)
+
+    def clear(self):
+        self._users.clear()
+
+    def __contains__(self, user_id):
+        return user_id in self._users
+
+
+class SQLiteUserStore:
+    """
+    Paid users in SQLite, shared by every worker, behind an in-process LRU cache.
+
+    Lookups are answered from the cache while it is fresh. Writes from this
+    process update the cache directly; writes from other processes are noticed
+    through SQLite's data_version and drop the cache, so a user who just paid is
+    never refused by another worker.
+    """
+
+    def __init__(self, path, cache_size=10000, cache_ttl=60):
+        self.db = Database(path)
+        self.cache = LRUCache(cache_size, cache_ttl)
+        conn = self.db.connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS paid_users ('
+            ' user_id TEXT PRIMARY KEY,'
+            ' paid_at REAL NOT NULL)'
+        )
+        # data_version is per connection, so one connection watches for all threads
+        self._watcher = None
+        self._watcher_pid = None
+        self._watcher_lock = threading.Lock()
+        self._version = self._data_version()
+
+    def _data_version(self):
+        with self._watcher_lock:
+            if self._watcher_pid != os.getpid():
+                if self._watcher is not None:
+                    # Opened before a fork; it belongs to the parent
+                    _inherited.append(self._watcher)
+                self._watcher = sqlite3.connect(self.db.path, check_same_thread=False)
+                self._watcher_pid = os.getpid()
+            return self._watcher.execute('PRAGMA data_version').fetchone()[0]
+
+    def _check_version(self):
+        version = self._data_version()
+        if version != self._version:
+            self._version = version
+            self.cache.clear()
+
+    def add(self, user_id):
+        self.db.connect().execute(
+            'INSERT OR IGNORE INTO paid_users (user_id, paid_at) VALUES (?, ?)', (user_id, time.time())
+        )
+        self.cache.set(user_id, True)
+
+    def discard(self, user_id):
+        self.db.connect().execute('DELETE FROM paid_users WHERE user_id = ?', (user_id,))
+        self.cache.set(user_id, False)
+
+    def clear(self):
+        self.db.connect().execute('DELETE FROM paid_users')
+        self.cache.clear()
+
+    def __contains__(self, user_id):
+        self._check_version()
+        paid = self.cache.get(user_id)
+        if paid is None:
+            paid = self.db.connect().execute('SELECT 1 FROM paid_users WHERE user_id = ?', (user_id,)).fetchone() is not None
+            self.cache.set(user_id, paid)
+        return paid
+
+
+def create_user_store(config):
+    """
+    Builds the paid user store described by the configuration.
+    """
+    if config.USER_STORE_BACKEND == 'memory':
+        return MemoryUserStore()
+    if config.USER_STORE_BACKEND == 'sqlite':
+        return SQLiteUserStore(config.DATABASE_PATH, config.USER_CACHE_SIZE, config.USER_CACHE_TTL)
+    raise ValueError(f"Unknown user store backend: {config.USER_STORE_BACKEND}")
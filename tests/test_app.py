@@ -1,14 +1,29 @@
 import unittest
+import hashlib
+import hmac
+import io
 import json
 import sys
 import os
+import smtplib
+import tempfile
+from concurrent.futures import Future
 from unittest.mock import patch, MagicMock
 from datetime import timedelta
 import jwt
+from flask_jwt_extended import create_access_token, create_refresh_token
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from app import app, paid_users
+from app import add_user_to_discord_guild, app, codec as app_codec, paid_users, delivery_queue, guild_queue, idempotency, limiter
 from config import config
+from delivery.log import DeliveryLog
+from delivery.queue import DeliveryQueue, QueueFull
+from delivery.routes import Route, RoutingTable, Target
+from ingest.body import BodyLimits
+from ingest.capture import TrafficCapture, read_capture
+from ingest.signatures import SignatureVerifier
+from transformers.digest import DigestAggregator, parse_digest_rules
+import app as app_module
 
 class TestWebhookTransformer(unittest.TestCase):
 
@@ -22,18 +37,24 @@ class TestWebhookTransformer(unittest.TestCase):
         # Clear paid_users set before each test
         paid_users.clear()
 
+        # Start every test with fresh rate limit counters
+        limiter.reset()
+
+        # Forget events accepted by earlier tests
+        idempotency.clear()
+
     def tearDown(self):
         pass
 
     def test_webhook_default(self):
         payload = {'message': 'Hello, world!'}
         response = self.app.post('/webhook', data=json.dumps(payload), content_type='application/json')
-        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.status_code, 202)
 
     def test_webhook_slack(self):
         payload = {'message': 'Hello, world!'}
         response = self.app.post('/webhook?format=slack', data=json.dumps(payload), content_type='application/json')
-        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.status_code, 202)
 
     def test_webhook_github_to_discord(self):
         payload = {
@@ -50,7 +71,208 @@ class TestWebhookTransformer(unittest.TestCase):
             ]
         }
         response = self.app.post('/webhook?source=github&format=discord', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+
+    @patch('app.send_payload')
+    def test_webhook_is_delivered_in_background(self, mock_send_payload):
+        payload = {'message': 'Hello, world!'}
+        response = self.app.post('/webhook?format=slack', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertIn('delivery_id', response.json)
+        self.assertTrue(delivery_queue.join(timeout=5))
+        mock_send_payload.assert_called_once_with({'text': 'New webhook received: Hello, world!'}, 'slack')
+
+    @patch('app.send_payload')
+    def test_webhook_retries_are_delivered_once(self, mock_send_payload):
+        payload = {'message': 'Hello, world!'}
+        headers = {'X-GitHub-Delivery': '72d3162e-cc78-11e3-81ab-4c9367dc0958'}
+        first = self.app.post('/webhook?format=slack', data=json.dumps(payload), headers=headers, content_type='application/json')
+        retry = self.app.post('/webhook?format=slack', data=json.dumps(payload), headers=headers, content_type='application/json')
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(json.loads(retry.data)['status'], 'duplicate')
+        self.assertTrue(delivery_queue.join(timeout=5))
+        mock_send_payload.assert_called_once()
+
+    def test_webhook_identical_bodies_without_delivery_id_are_delivered(self):
+        # Repeated alerts and heartbeats are not retries
+        body = json.dumps({'message': 'heartbeat'})
+        first = self.app.post('/webhook?format=slack', data=body, content_type='application/json')
+        second = self.app.post('/webhook?format=slack', data=body, content_type='application/json')
+        self.assertEqual((first.status_code, second.status_code), (202, 202))
+
+    def test_webhook_retry_after_full_queue_is_accepted(self):
+        body = json.dumps({'message': 'queued later'})
+        headers = {'Idempotency-Key': 'queued-later'}
+        with patch.object(delivery_queue, 'enqueue', side_effect=QueueFull('Too many deliveries waiting for slack')):
+            response = self.app.post('/webhook?format=slack', data=body, headers=headers, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+        with patch.object(delivery_queue, 'enqueue', return_value='d1'):
+            response = self.app.post('/webhook?format=slack', data=body, headers=headers, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json['delivery_id'], 'd1')
+
+    def test_webhook_route_retry_after_full_queue_is_accepted(self):
+        table = RoutingTable([Route('all', 'default', [Target('slack', None)])])
+        body = json.dumps({'message': 'fan out'})
+        headers = {'Idempotency-Key': 'fan-out'}
+        with patch('app.routes', table):
+            with patch.object(delivery_queue, 'enqueue', side_effect=QueueFull('Too many deliveries waiting for slack')):
+                response = self.app.post('/webhook/route', data=body, headers=headers, content_type='application/json')
+            self.assertEqual(response.status_code, 503)
+            with patch.object(delivery_queue, 'enqueue', return_value='d1'):
+                response = self.app.post('/webhook/route', data=body, headers=headers, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+
+    def test_webhook_same_event_to_another_format_is_not_duplicate(self):
+        payload = json.dumps({'message': 'Hello, world!'})
+        first = self.app.post('/webhook?format=slack', data=payload, content_type='application/json')
+        second = self.app.post('/webhook?format=discord', data=payload, content_type='application/json')
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(second.status_code, 202)
+
+    def test_webhook_invalid_json(self):
+        response = self.app.post('/webhook', data='{oops', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)['error'], 'Invalid JSON payload')
+
+    def test_webhook_requires_json_content_type(self):
+        response = self.app.post('/webhook', data='message=hi', content_type='application/x-www-form-urlencoded')
+        self.assertEqual(response.status_code, 415)
+
+    @patch('app.send_payload')
+    def test_webhook_route_fans_out_after_one_parse(self, mock_send_payload):
+        table = RoutingTable([Route('pushes', 'github', [Target('slack', None), Target('discord', 'http://example.com/hook')])])
+        payload = {'repository': {'full_name': 'test/repo'}, 'pusher': {'name': 'testuser'}, 'commits': [{}]}
+        with patch('app.routes', table):
+            response = self.app.post('/webhook/route?source=github', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual([d['format'] for d in json.loads(response.data)['deliveries']], ['slack', 'discord'])
+        self.assertTrue(delivery_queue.join(timeout=5))
+        mock_send_payload.assert_any_call({'content': 'New push to test/repo by testuser with 1 commits.'}, 'discord', 'http://example.com/hook')
+        self.assertEqual(mock_send_payload.call_count, 2)
+
+    def test_webhook_route_without_matching_route(self):
+        with patch('app.routes', RoutingTable()):
+            response = self.app.post('/webhook/route?source=github', data='{}', content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['status'], 'unrouted')
+
+    @patch('app.send_payload')
+    def test_redrive_delivers_dead_letters(self, mock_send_payload):
+        with tempfile.TemporaryDirectory() as directory:
+            log = DeliveryLog(directory)
+            log.dead_letters.add('a', {'format': 'slack', 'payload': {'text': 'hi'}}, 'timed out')
+            with patch('app.delivery_log', log):
+                result = app.test_cli_runner().invoke(args=['deliveries', 'redrive'])
+            self.assertIn('Re-drove a', result.output)
+            mock_send_payload.assert_called_once_with({'text': 'hi'}, 'slack')
+            self.assertEqual(log.dead_letters.entries(), [])
+
+    @patch('app.send_payload')
+    def test_metrics_time_each_stage(self, mock_send_payload):
+        payload = {'repository': {'full_name': 'test/repo'}, 'pusher': {'name': 'testuser'}, 'commits': []}
+        self.app.post('/webhook?source=github&format=slack', data=json.dumps(payload), content_type='application/json')
+        self.app.post('/webhook?source=nope', data='{}', content_type='application/json')
+        self.assertTrue(delivery_queue.join(timeout=5))
+
+        response = self.app.get('/metrics')
         self.assertEqual(response.status_code, 200)
+        text = response.get_data(as_text=True)
+        self.assertIn('webhookmaster_request_duration_seconds_count{endpoint="webhook",source="github",format="slack",status="202"}', text)
+        self.assertIn('source="invalid",format="default",status="400"', text)
+        for stage, transformer in (('decode', 'github'), ('parse', 'github'), ('format', 'slack'), ('deliver', 'slack')):
+            self.assertIn(f'webhookmaster_stage_duration_seconds_count{{stage="{stage}",transformer="{transformer}"}}', text)
+        self.assertIn('webhookmaster_delivery_queue_depth', text)
+
+    def test_webhook_signatures_are_checked_before_decoding(self):
+        body = b'{"repository": {"full_name": "test/repo"}, "pusher": {"name": "testuser"}, "commits": []}'
+        signature = 'sha256=' + hmac.new(b'shh', body, hashlib.sha256).hexdigest()
+        with patch('app.verifier', SignatureVerifier({'github': 'shh'})), patch('app.codec.loads', wraps=app_codec.loads) as loads:
+            for path in ('/webhook?source=github', '/webhook/route?source=github', '/webhook/batch?source=github'):
+                response = self.app.post(path, data=body, content_type='application/json', headers={'X-Hub-Signature-256': 'sha256=00'})
+                self.assertEqual(response.status_code, 401)
+            loads.assert_not_called()
+            response = self.app.post('/webhook?source=github', data=body, content_type='application/json', headers={'X-Hub-Signature-256': signature})
+        self.assertEqual(response.status_code, 202)
+
+    def test_webhook_signed_batch(self):
+        body = b'{"message": "one"}\n{"message": "two"}\n'
+        signature = 'sha256=' + hmac.new(b'shh', body, hashlib.sha256).hexdigest()
+        with patch('app.verifier', SignatureVerifier({'default': 'shh'})):
+            response = self.app.post('/webhook/batch', data=body, content_type='application/x-ndjson', headers={'X-Webhook-Signature': signature})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(json.loads(response.data)['accepted'], 2)
+
+    def test_oversized_bodies_are_rejected_before_reading(self):
+        body = json.dumps({'message': 'x' * 100})
+        with patch('app.body_limits', BodyLimits(1000, {'github': 50})), patch('app.request_body') as mock_request_body:
+            response = self.app.post('/webhook?source=github', data=body, content_type='application/json')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json, {'error': 'Payload too large', 'limit': 50})
+        self.assertIn('X-Request-ID', response.headers)
+        mock_request_body.assert_not_called()
+        with patch('app.body_limits', BodyLimits(50)):
+            response = self.app.post('/webhook/stripe', data=body, content_type='application/json')
+        self.assertEqual(response.status_code, 413)
+
+    def test_chunked_bodies_are_cut_off_at_the_limit(self):
+        body = json.dumps({'message': 'x' * 100}).encode()
+        with patch('app.body_limits', BodyLimits(50)):
+            response = self.app.post(
+                '/webhook', input_stream=io.BytesIO(body), content_type='application/json',
+                environ_overrides={'wsgi.input_terminated': True},
+            )
+        self.assertEqual(response.status_code, 413)
+
+    @patch('app.send_payload')
+    def test_large_bodies_are_spooled_and_verified(self, mock_send_payload):
+        payload = {'repository': {'full_name': 'test/repo'}, 'pusher': {'name': 'a'}, 'commits': [{'id': 'c' * 40}] * 500}
+        body = json.dumps(payload).encode()
+        signature = 'sha256=' + hmac.new(b'shh', body, hashlib.sha256).hexdigest()
+        with patch.object(config, 'BODY_SPOOL_THRESHOLD', 1024), patch('app.verifier', SignatureVerifier({'github': 'shh'})):
+            response = self.app.post('/webhook?source=github&format=discord', data=body, content_type='application/json', headers={'X-Hub-Signature-256': signature})
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(delivery_queue.join(timeout=5))
+        mock_send_payload.assert_called_once_with({'content': 'New push to test/repo by a with 500 commits.'}, 'discord')
+
+    def test_webhooks_are_captured_for_replay(self):
+        directory = tempfile.mkdtemp()
+        capture = TrafficCapture(directory, ['/webhook', '/webhook/batch'])
+        with patch('app.capture', capture):
+            self.app.post('/webhook?source=github&format=slack', data=b'{"zen": 1}', content_type='application/json')
+            response = self.app.post('/webhook/batch', data=b'{"message": "one"}\n', content_type='application/x-ndjson')
+            self.app.get('/transformers')
+        capture.close()
+        # The batch was read in full to be recorded, and still accepted
+        self.assertEqual(response.json['accepted'], 1)
+        webhook, batch = read_capture(directory)
+        self.assertEqual((webhook['query'], webhook['body'], webhook['status']), ('source=github&format=slack', b'{"zen": 1}', 202))
+        self.assertEqual((batch['path'], batch['body']), ('/webhook/batch', b'{"message": "one"}\n'))
+
+    @patch('app.send_payload')
+    def test_bursts_are_sent_as_one_digest(self, mock_send_payload):
+        digests = DigestAggregator(parse_digest_rules('github=repository:commits'), app_module.emit_digest)
+        payloads = [
+            {'repository': {'full_name': 'test/repo'}, 'pusher': {'name': name}, 'commits': [{}] * commits}
+            for name, commits in (('a', 1), ('a', 2), ('b', 3))
+        ]
+        with patch('app.digests', digests):
+            for payload in payloads:
+                response = self.app.post('/webhook?source=github&format=discord', data=json.dumps(payload), content_type='application/json')
+                self.assertEqual(json.loads(response.data)['status'], 'aggregated')
+            response = self.app.post('/webhook/batch?source=github&format=discord', data=json.dumps(payloads), content_type='application/json')
+            self.assertEqual(json.loads(response.data)['accepted'], 3)
+            digests.flush()
+        self.assertTrue(delivery_queue.join(timeout=5))
+        mock_send_payload.assert_called_once_with({'content': 'New push to test/repo by a (4), b (2) with 12 commits.'}, 'discord')
+
+    def test_request_id_is_returned(self):
+        response = self.app.post('/webhook', data='{}', content_type='application/json', headers={'X-Request-ID': 'abc-123'})
+        self.assertEqual(response.headers['X-Request-ID'], 'abc-123')
+        response = self.app.post('/webhook', data='{}', content_type='application/json', headers={'X-Request-ID': 'not valid'})
+        self.assertNotEqual(response.headers['X-Request-ID'], 'not valid')
 
     def test_webhook_invalid_source(self):
         payload = {'message': 'Hello, world!'}
@@ -70,12 +292,53 @@ class TestWebhookTransformer(unittest.TestCase):
             }
         }
         response = self.app.post('/webhook?source=stripe&format=msteams', data=json.dumps(payload), content_type='application/json')
-        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.status_code, 202)
 
     def test_webhook_email_format(self):
         payload = {'subject': 'Test Email', 'body': 'This is a test email body.'}
         response = self.app.post('/webhook?format=email', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+
+    def test_failed_email_batch_fails_the_delivery(self):
+        log = DeliveryLog(tempfile.mkdtemp())
+        failed = Future()
+        failed.set_exception(smtplib.SMTPDataError(554, b'rejected'))
+        with patch('app.build_email', return_value=MagicMock()), patch('app.email_transport') as transport:
+            transport.send.return_value = failed
+            queue = DeliveryQueue(app_module.deliver, workers=1, log=log)
+            failed_id = queue.enqueue({'format': 'email', 'payload': {'subject': 'Test'}})
+            self.assertTrue(queue.join(timeout=5))
+            queue.stop()
+        self.assertEqual([entry['id'] for entry in log.dead_letters.entries()], [failed_id])
+
+    def test_webhook_batch_json_array(self):
+        payload = [{'message': 'one'}, {'message': 'two'}, 'not an object']
+        response = self.app.post('/webhook/batch?format=slack', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json['accepted'], 2)
+        self.assertIn('delivery_id', response.json['results'][0])
+        self.assertEqual(response.json['results'][2]['error'], 'Event must be a JSON object')
+
+    def test_webhook_batch_ndjson(self):
+        payload = '\n'.join(json.dumps({'message': str(n)}) for n in range(5))
+        response = self.app.post('/webhook/batch', data=payload, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json['accepted'], 5)
+
+    def test_webhook_batch_malformed(self):
+        response = self.app.post('/webhook/batch', data='[{"message": "one"}, {oops}]', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json['results']), 1)
+
+    def test_webhook_batch_invalid_source(self):
+        response = self.app.post('/webhook/batch?source=invalid', data='[]', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_transformers_lists_registered_sources_and_formats(self):
+        response = self.app.get('/transformers')
         self.assertEqual(response.status_code, 200)
+        self.assertIn('github', response.json['sources'])
+        self.assertIn('email', response.json['formats'])
 
     def test_webhook_invalid_format(self):
         payload = {'message': 'Hello, world!'}
@@ -91,7 +354,7 @@ class TestWebhookTransformer(unittest.TestCase):
             "line_items": []
         }
         response = self.app.post('/webhook?source=shopify', data=json.dumps(payload), content_type='application/json')
-        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.status_code, 202)
 
     def test_webhook_wix(self):
         payload = {
@@ -106,7 +369,7 @@ class TestWebhookTransformer(unittest.TestCase):
             ]
         }
         response = self.app.post('/webhook?source=wix', data=json.dumps(payload), content_type='application/json')
-        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.status_code, 202)
 
     def test_webhook_cloudflare(self):
         payload = {
@@ -121,7 +384,7 @@ class TestWebhookTransformer(unittest.TestCase):
             }
         }
         response = self.app.post('/webhook?source=cloudflare', data=json.dumps(payload), content_type='application/json')
-        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.status_code, 202)
 
     def test_webhook_webflow(self):
         payload = {
@@ -136,7 +399,7 @@ class TestWebhookTransformer(unittest.TestCase):
             "triggeredAt": "2025-07-15T10:00:00.000Z"
         }
         response = self.app.post('/webhook?source=webflow', data=json.dumps(payload), content_type='application/json')
-        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.status_code, 202)
 
     @patch('requests_oauthlib.OAuth2Session')
     def test_discord_login_redirect(self, MockOAuth2Session):
@@ -160,6 +423,27 @@ class TestWebhookTransformer(unittest.TestCase):
         self.assertIn("refresh_token", data)
         mock_add_user.assert_called_once_with("test_user_id", "discord_access_token")
 
+    @patch('app.http_delivery')
+    def test_guild_join_runs_in_background(self, mock_http_delivery):
+        mock_http_delivery.deliver.return_value = 201
+        with patch.multiple(config, DISCORD_GUILD_ID='42', DISCORD_BOT_TOKEN='bot'):
+            add_user_to_discord_guild('user', 'user-token')
+            self.assertTrue(guild_queue.join(timeout=5))
+        mock_http_delivery.deliver.assert_called_once_with(
+            f"{config.DISCORD_API_BASE_URL}/guilds/42/members/user",
+            {'access_token': 'user-token'},
+            headers={'Authorization': 'Bot bot'},
+            method='PUT',
+            route=f"{config.DISCORD_API_BASE_URL}/guilds/42/members",
+        )
+
+    @patch('app.http_delivery')
+    def test_guild_join_without_configuration(self, mock_http_delivery):
+        with patch.multiple(config, DISCORD_GUILD_ID=None, DISCORD_BOT_TOKEN=None):
+            add_user_to_discord_guild('user', 'user-token')
+        self.assertTrue(guild_queue.join(timeout=5))
+        mock_http_delivery.deliver.assert_not_called()
+
     def test_protected_access_unauthenticated(self):
         response = self.app.get('/protected')
         self.assertEqual(response.status_code, 401) # Unauthorized
@@ -179,6 +463,35 @@ class TestWebhookTransformer(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn("Welcome, premium user!", response.json['message'])
 
+    def test_protected_with_premium_claim(self):
+        paid_users.add("premium_user")
+        with app.app_context():
+            refresh_token = create_refresh_token(identity="premium_user")
+        response = self.app.post('/refresh', headers={'Authorization': f'Bearer {refresh_token}'})
+        access_token = response.json['access_token']
+        # The claim is trusted without asking the user store
+        paid_users.clear()
+        response = self.app.get('/protected', headers={'Authorization': f'Bearer {access_token}'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_protected_falls_back_to_paid_users(self):
+        with app.app_context():
+            access_token = create_access_token(identity="late_payer")
+        headers = {'Authorization': f'Bearer {access_token}'}
+        self.assertEqual(self.app.get('/protected', headers=headers).status_code, 403)
+        paid_users.add("late_payer")
+        self.assertEqual(self.app.get('/protected', headers=headers).status_code, 200)
+
+    def test_verified_tokens_are_cached(self):
+        with app.app_context():
+            access_token = create_access_token(identity="cached_user")
+        headers = {'Authorization': f'Bearer {access_token}'}
+        self.app.get('/protected', headers=headers)
+        with patch('flask_jwt_extended.jwt_manager._decode_jwt') as decode:
+            response = self.app.get('/protected', headers=headers)
+        self.assertEqual(response.status_code, 403)
+        decode.assert_not_called()
+
     def test_refresh_token_success(self):
         test_user_id = "refresh_user"
         refresh_token = jwt.encode({"identity": test_user_id, "fresh": False}, app.config['JWT_SECRET_KEY'], algorithm="HS256")
@@ -221,6 +534,28 @@ class TestWebhookTransformer(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('webhook_user_id', paid_users)
 
+    @patch('app.handle_stripe_event')
+    @patch('stripe.Webhook.construct_event')
+    def test_stripe_webhook_retries_are_handled_once(self, mock_construct_event, mock_handle_stripe_event):
+        mock_construct_event.return_value = {'id': 'evt_test_retry', 'type': 'checkout.session.completed'}
+        headers = {'stripe-signature': 'test_signature'}
+        for _ in range(3):
+            response = self.app.post('/webhook/stripe', data='{}', headers=headers, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+        mock_handle_stripe_event.assert_called_once()
+
+    @patch('app.handle_stripe_event')
+    @patch('stripe.Webhook.construct_event')
+    def test_stripe_webhook_retry_after_failure_is_handled(self, mock_construct_event, mock_handle_stripe_event):
+        mock_construct_event.return_value = {'id': 'evt_test_failed', 'type': 'checkout.session.completed'}
+        mock_handle_stripe_event.side_effect = [RuntimeError('database is locked'), None]
+        headers = {'stripe-signature': 'test_signature'}
+        with self.assertRaises(RuntimeError):
+            self.app.post('/webhook/stripe', data='{}', headers=headers, content_type='application/json')
+        response = self.app.post('/webhook/stripe', data='{}', headers=headers, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_handle_stripe_event.call_count, 2)
+
     @patch('stripe.Webhook.construct_event')
     def test_stripe_webhook_invalid_signature(self, mock_construct_event):
         mock_construct_event.side_effect = stripe.error.SignatureVerificationError("Invalid signature", "header")
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+import sys
+import unittest
+from unittest.mock import AsyncMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asgi
+from app import idempotency, paid_users
+from config import config
+from ingest.body import BodyLimits
+
+
+def send_request(method, path, body=b'', query=b'', headers=()):
+    """
+    Runs one request through the ASGI app and returns the messages it sent.
+    """
+    async def run():
+        messages = []
+        request = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+        async def receive():
+            return request.pop(0)
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query, 'headers': list(headers)}
+        await asgi.app(scope, receive, send)
+        await asgi.deliveries.stop()
+        asgi.deliveries.http = None
+        return messages
+
+    return asyncio.run(run())
+
+
+def call(method, path, body=b'', query=b'', headers=()):
+    """
+    Runs one request through the ASGI app and returns (status, body).
+    """
+    messages = send_request(method, path, body, query, headers)
+    return messages[0]['status'], messages[1]['body']
+
+
+class TestASGIApp(unittest.TestCase):
+
+    def setUp(self):
+        paid_users.clear()
+        idempotency.clear()
+
+    @patch('asgi.send_payload', new_callable=AsyncMock)
+    def test_webhook_schedules_delivery(self, mock_send_payload):
+        payload = {'repository': {'full_name': 'test/repo'}, 'pusher': {'name': 'testuser'}, 'commits': [{}]}
+        status, body = call('POST', '/webhook', json.dumps(payload).encode(), b'source=github&format=discord')
+        self.assertEqual(status, 202)
+        self.assertIn('delivery_id', json.loads(body))
+        mock_send_payload.assert_awaited_once()
+        self.assertEqual(
+            mock_send_payload.await_args.args[:2],
+            ({'content': 'New push to test/repo by testuser with 1 commits.'}, 'discord'),
+        )
+
+    @patch('asgi.send_payload', new_callable=AsyncMock)
+    def test_webhook_retry_after_full_backlog_is_accepted(self, mock_send_payload):
+        body = json.dumps({'message': 'hi'}).encode()
+        headers = [(b'idempotency-key', b'backlog')]
+        with patch.object(asgi.deliveries, 'max_pending', 0):
+            start, response = send_request('POST', '/webhook', body, b'format=slack', headers)
+        self.assertEqual(start['status'], 503)
+        self.assertIn((b'retry-after', str(int(config.CIRCUIT_BREAKER_OPEN_SECONDS)).encode()), start['headers'])
+        mock_send_payload.assert_not_awaited()
+
+        status, _ = call('POST', '/webhook', body, b'format=slack', headers)
+        self.assertEqual(status, 202)
+        mock_send_payload.assert_awaited_once()
+
+    def test_webhook_invalid_source(self):
+        status, _ = call('POST', '/webhook', b'{}', b'source=invalid')
+        self.assertEqual(status, 400)
+
+    def test_webhook_invalid_json(self):
+        status, _ = call('POST', '/webhook', b'not json')
+        self.assertEqual(status, 400)
+
+    def test_oversized_bodies_are_rejected(self):
+        body = json.dumps({'message': 'x' * 100}).encode()
+        with patch('asgi.body_limits', BodyLimits(50)):
+            status, response = call('POST', '/webhook', body, headers=[(b'content-length', str(len(body)).encode())])
+            self.assertEqual(status, 413)
+            self.assertEqual(json.loads(response), {'error': 'Payload too large', 'limit': 50})
+            # Without a declared length the body is cut off as it is read
+            status, _ = call('POST', '/webhook', body)
+            self.assertEqual(status, 413)
+
+    @patch('asgi.send_payload', new_callable=AsyncMock)
+    def test_large_bodies_are_spooled(self, mock_send_payload):
+        payload = {'repository': {'full_name': 'test/repo'}, 'pusher': {'name': 'a'}, 'commits': [{'id': 'c' * 40}] * 500}
+        with patch.object(config, 'BODY_SPOOL_THRESHOLD', 1024):
+            status, _ = call('POST', '/webhook', json.dumps(payload).encode(), b'source=github&format=discord')
+        self.assertEqual(status, 202)
+        self.assertEqual(mock_send_payload.await_args.args[0], {'content': 'New push to test/repo by a with 500 commits.'})
+
+    def test_metrics(self):
+        call('POST', '/webhook', b'{}', b'source=invalid')
+        status, body = call('GET', '/metrics')
+        self.assertEqual(status, 200)
+        self.assertIn(b'endpoint="webhook",source="invalid",format="default",status="400"', body)
+
+    def test_unknown_route(self):
+        status, _ = call('GET', '/nope')
+        self.assertEqual(status, 404)
+
+    @patch('stripe.Webhook.construct_event')
+    def test_stripe_webhook_checkout_completed(self, mock_construct_event):
+        mock_construct_event.return_value = {
+            'type': 'checkout.session.completed',
+            'data': {'object': {'client_reference_id': 'asgi_user_id'}},
+        }
+        status, body = call('POST', '/webhook/stripe', b'{}', headers=[(b'stripe-signature', b'sig')])
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b'OK')
+        self.assertIn('asgi_user_id', paid_users)
+
+
+if __name__ == '__main__':
+    unittest.main()
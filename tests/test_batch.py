@@ -0,0 +1,67 @@
+import io
+import json
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ingest.batch import BatchFormatError, iter_batch, iter_json_array, iter_ndjson
+
+EVENTS = [
+    {'message': 'héllo', 'n': 1},
+    {'message': 'world', 'nested': {'list': [1, 2, {'x': '],['}]}},
+    [1, 2],
+    12345,
+    'text',
+    None,
+]
+
+
+class TestBatchParsing(unittest.TestCase):
+
+    def test_json_array_across_chunk_boundaries(self):
+        body = json.dumps(EVENTS, ensure_ascii=False).encode()
+        for chunk_size in (1, 2, 3, 7, 64):
+            self.assertEqual(list(iter_json_array(io.BytesIO(body), chunk_size)), EVENTS)
+
+    def test_empty_json_array(self):
+        self.assertEqual(list(iter_json_array(io.BytesIO(b' [ ] '))), [])
+
+    def test_malformed_json_array(self):
+        for body in (b'{"a": 1}', b'[{"a": 1}', b'[{"a": 1} {"b": 2}]', b'[{"a": }]'):
+            with self.assertRaises(BatchFormatError):
+                list(iter_json_array(io.BytesIO(body), 4))
+
+    def test_data_after_json_array_is_rejected(self):
+        self.assertEqual(list(iter_json_array(io.BytesIO(b'[1, 2] \n'), 3)), [1, 2])
+        with self.assertRaisesRegex(BatchFormatError, 'after JSON array'):
+            list(iter_json_array(io.BytesIO(b'[1, 2] [3]'), 3))
+
+    def test_large_element_is_not_decoded_after_every_chunk(self):
+        element = {'items': [{'n': n, 'text': 'x' * 20} for n in range(20000)]}
+        body = json.dumps([element, 'after']).encode()
+        decoder = json.JSONDecoder()
+        with patch('ingest.batch._decoder') as mock:
+            mock.raw_decode.side_effect = decoder.raw_decode
+            self.assertEqual(list(iter_json_array(io.BytesIO(body), 1024)), [element, 'after'])
+        # About 700 chunks, but the retries only come as the element doubles
+        self.assertLess(mock.raw_decode.call_count, 25)
+
+    def test_ndjson_across_chunk_boundaries(self):
+        body = '\n'.join(json.dumps(event, ensure_ascii=False) for event in EVENTS).encode() + b'\n\n'
+        for chunk_size in (1, 5, 64):
+            self.assertEqual(list(iter_ndjson(io.BytesIO(body), chunk_size)), EVENTS)
+
+    def test_ndjson_reports_bad_line(self):
+        with self.assertRaisesRegex(BatchFormatError, 'line 2'):
+            list(iter_ndjson(io.BytesIO(b'{"a": 1}\n{oops}\n')))
+
+    def test_iter_batch_detects_format(self):
+        self.assertEqual(list(iter_batch(io.BytesIO(b'  [{"a": 1}, {"b": 2}]'))), [{'a': 1}, {'b': 2}])
+        self.assertEqual(list(iter_batch(io.BytesIO(b'{"a": 1}\n{"b": 2}'))), [{'a': 1}, {'b': 2}])
+        self.assertEqual(list(iter_batch(io.BytesIO(b''))), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
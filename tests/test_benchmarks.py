@@ -0,0 +1,38 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks.pipeline import load_fixtures
+from benchmarks.run import compare
+from transformers.registry import load_registry
+
+
+class TestBenchmarkFixtures(unittest.TestCase):
+
+    def test_every_parser_has_a_fixture(self):
+        self.assertTrue(load_registry().sources <= set(load_fixtures()))
+
+    def test_fixtures_transform_for_every_format(self):
+        registry = load_registry()
+        for source, payload in load_fixtures().items():
+            for output_format in registry.formats:
+                with self.subTest(source=source, format=output_format):
+                    registry.pipeline(source, output_format)(payload)
+
+
+class TestCompare(unittest.TestCase):
+
+    def report(self, rps):
+        return {'results': [{'suite': 'ingest', 'name': 'github->slack', 'rps': rps}]}
+
+    def test_flags_slowdown_beyond_tolerance(self):
+        self.assertEqual(compare(self.report(100), self.report(85), 0.1), [('ingest', 'github->slack', 100, 85)])
+
+    def test_ignores_noise_and_new_results(self):
+        self.assertEqual(compare(self.report(100), self.report(95), 0.1), [])
+        self.assertEqual(compare({'results': []}, self.report(1), 0.1), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from codec import CODECS
+from ingest.body import BodyLimits, BodySpool, BodyTooLarge, parse_limits, spool
+
+
+class TestBodySpool(unittest.TestCase):
+
+    def test_small_bodies_stay_in_memory(self):
+        body = spool(io.BytesIO(b'{"a": 1}'), threshold=16)
+        self.assertFalse(body.spooled)
+        self.assertEqual(body.view(), b'{"a": 1}')
+        self.assertEqual(body.open().read(), b'{"a": 1}')
+        body.close()
+
+    def test_large_bodies_are_spooled_to_disk(self):
+        data = b'[' + b','.join(b'%d' % n for n in range(10000)) + b']'
+        body = spool(io.BytesIO(data), threshold=1024, chunk_size=100)
+        self.assertTrue(body.spooled)
+        self.assertIsInstance(body.view(), memoryview)
+        self.assertEqual(bytes(body.view()), data)
+        self.assertEqual(body.open().read(), data)
+        body.close()
+
+    def test_every_codec_decodes_a_spooled_body(self):
+        body = spool(io.BytesIO(b'{"numbers": [1, 2, 3]}'), threshold=4)
+        for codec_class in CODECS.values():
+            try:
+                codec = codec_class()
+            except ImportError:
+                continue
+            with self.subTest(codec=codec.name):
+                self.assertEqual(codec.loads(body.view()), {'numbers': [1, 2, 3]})
+        body.close()
+
+    def test_close_while_the_body_is_still_referenced(self):
+        body = spool(io.BytesIO(b'{"a": 1}'), threshold=4)
+        view = body.view()[:4]
+        body.close()
+        self.assertEqual(bytes(view), b'{"a"')
+
+    def test_limit(self):
+        body = BodySpool(threshold=4, limit=10)
+        body.write(b'x' * 10)
+        with self.assertRaises(BodyTooLarge):
+            body.write(b'x')
+        body.close()
+        with self.assertRaises(BodyTooLarge):
+            spool(io.BytesIO(b'x' * 11), threshold=4, limit=10, chunk_size=3)
+
+
+class TestBodyLimits(unittest.TestCase):
+
+    def test_per_source_limits(self):
+        limits = BodyLimits(100, parse_limits('webflow=1000; wix=10'))
+        self.assertEqual(limits.limit('webflow'), 1000)
+        self.assertEqual(limits.limit('github'), 100)
+        self.assertEqual(limits.largest, 1000)
+
+    def test_parse_limits_rejects_sizes_that_are_not_byte_counts(self):
+        with self.assertRaises(ValueError):
+            parse_limits('webflow=10MB')
+
+
+if __name__ == '__main__':
+    unittest.main()
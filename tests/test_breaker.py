@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from delivery.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def breaker(self, **kwargs):
+        return CircuitBreaker('slack', **dict({'window': 4, 'min_calls': 4, 'open_seconds': 10}, **kwargs))
+
+    def later(self, seconds):
+        return patch('time.monotonic', return_value=time.monotonic() + seconds)
+
+    def test_opens_on_error_rate(self):
+        breaker = self.breaker()
+        for success in (True, False, True):
+            breaker.record(success, 0.1)
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.record(False, 0.1)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertFalse(breaker.ready())
+
+    def test_opens_on_slow_calls(self):
+        breaker = self.breaker(slow_seconds=1, slow_rate=0.75)
+        for duration in (2, 2, 0.1, 2):
+            breaker.record(True, duration)
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_half_open_trial(self):
+        breaker = self.breaker()
+        for _ in range(4):
+            breaker.record(False, 0.1)
+        with self.later(11):
+            self.assertTrue(breaker.ready())
+            self.assertTrue(breaker.allow())
+            self.assertEqual(breaker.state, HALF_OPEN)
+            # Only one trial call at a time
+            self.assertFalse(breaker.allow())
+            breaker.record(True, 0.1)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_failed_trial_reopens(self):
+        breaker = self.breaker()
+        for _ in range(4):
+            breaker.record(False, 0.1)
+        with self.later(11):
+            breaker.allow()
+            breaker.record(False, 0.1)
+            self.assertEqual(breaker.state, OPEN)
+            self.assertFalse(breaker.allow())
+
+
+if __name__ == '__main__':
+    unittest.main()
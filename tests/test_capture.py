@@ -0,0 +1,122 @@
+import gzip
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks.replay import load_requests, replay, report
+from benchmarks.stub import StubDownstream
+from ingest.capture import TrafficCapture, capture_files, read_capture
+
+PATHS = ('/webhook', '/webhook/stripe')
+HEADERS = [('Content-Type', 'application/json'), ('X-Hub-Signature-256', 'sha256=ab'), ('Authorization', 'Bearer x')]
+
+
+class TestTrafficCapture(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.capture = TrafficCapture(self.directory, PATHS)
+
+    def test_round_trip(self):
+        self.capture.record('POST', '/webhook', 'source=github&format=slack', HEADERS, b'{"a": 1}', 202, now=10.0)
+        self.capture.record('POST', '/webhook/stripe', '', HEADERS, b'\x00\xff', 400, now=11.0)
+        self.capture.close()
+
+        first, second = read_capture(self.directory)
+        self.assertEqual(first['query'], 'source=github&format=slack')
+        self.assertEqual(first['body'], b'{"a": 1}')
+        self.assertEqual(first['status'], 202)
+        # Signatures are kept for replay, credentials are not
+        self.assertEqual(first['headers'], [['Content-Type', 'application/json'], ['X-Hub-Signature-256', 'sha256=ab']])
+        self.assertEqual(second['body'], b'\x00\xff')
+
+    def test_chunked_request_replays_with_a_plain_body(self):
+        chunked = HEADERS + [('Transfer-Encoding', 'chunked'), ('TE', 'trailers'), ('Keep-Alive', 'timeout=5'),
+                             ('Upgrade', 'h2c'), ('Proxy-Connection', 'keep-alive')]
+        self.capture.record('POST', '/webhook', '', chunked, b'{"a": 1}', 202, now=10.0)
+        self.capture.close()
+
+        (_, _, _, headers, body), = load_requests(self.directory)
+        # The body is stored de-chunked, so http.client sets Content-Length
+        self.assertEqual(headers, {'Content-Type': 'application/json', 'X-Hub-Signature-256': 'sha256=ab'})
+        self.assertEqual(body, b'{"a": 1}')
+
+    def test_wants_only_captured_paths(self):
+        self.assertTrue(self.capture.wants('/webhook'))
+        self.assertFalse(self.capture.wants('/metrics'))
+        self.assertFalse(TrafficCapture('', PATHS).wants('/webhook'))
+
+    def test_sampling_and_byte_limit(self):
+        self.assertFalse(TrafficCapture(self.directory, PATHS, sample_rate=0).record('POST', '/webhook', '', [], b'{}'))
+        limited = TrafficCapture(self.directory, PATHS, max_bytes=200)
+        self.assertTrue(limited.record('POST', '/webhook', '', [], b'{}'))
+        self.assertFalse(limited.record('POST', '/webhook', '', [], b'x' * 100))
+
+    def test_truncated_file_keeps_complete_requests(self):
+        for i in range(3):
+            self.capture.record('POST', '/webhook', '', [], b'{"n": %d}' % i, 202, now=float(i))
+        self.capture.close()
+        path, = capture_files(self.directory)
+        with gzip.open(path, 'rb') as f:
+            data = f.read()
+        with gzip.open(path, 'wb') as f:
+            f.write(data[:-3])
+        self.assertEqual([request['body'] for request in read_capture(path)], [b'{"n": 0}', b'{"n": 1}'])
+
+    def test_files_of_every_worker_are_merged_in_time_order(self):
+        other = TrafficCapture(self.directory, PATHS)
+        self.capture.record('POST', '/webhook', '', [], b'1', now=1.0)
+        other.record('POST', '/webhook', '', [], b'0', now=0.5)
+        other.record('POST', '/webhook', '', [], b'2', now=2.0)
+        self.capture.record('POST', '/webhook', '', [], b'3', now=3.0)
+        self.capture.close()
+        other.close()
+        self.assertEqual(len(capture_files(self.directory)), 2)
+        self.assertEqual([request['body'] for request in read_capture(self.directory)], [b'0', b'1', b'2', b'3'])
+
+    def test_forked_process_writes_its_own_file(self):
+        self.capture.record('POST', '/webhook', '', [], b'parent', now=1.0)
+        with patch('os.getpid', return_value=-1):
+            self.capture.record('POST', '/webhook', '', [], b'child', now=2.0)
+            self.capture.close()
+        self.assertEqual(len(capture_files(self.directory)), 2)
+        self.assertEqual([request['body'] for request in read_capture(self.directory)], [b'parent', b'child'])
+
+
+class TestReplay(unittest.TestCase):
+
+    def test_replays_captured_requests(self):
+        directory = tempfile.mkdtemp()
+        capture = TrafficCapture(directory, PATHS)
+        for i in range(5):
+            capture.record('POST', '/webhook', 'source=github', HEADERS, b'{}', 202, now=100.0 + i / 100)
+        capture.record('GET', '/metrics', '', [], b'', 200, now=101.0)
+        capture.record('POST', '/webhook/stripe', '', [], b'{}', 200, now=101.0)
+        capture.close()
+
+        requests = load_requests(directory, paths=['/webhook'])
+        self.assertEqual(len(requests), 5)
+        offset, method, target, headers, body = requests[-1]
+        self.assertAlmostEqual(offset, 0.04)
+        self.assertEqual((method, target, body), ('POST', '/webhook?source=github', b'{}'))
+
+        server = StubDownstream().start()
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}"
+            result = report(*replay(url, requests, concurrency=2, speed=2.0))
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(server.received, 5)
+        self.assertEqual(result['requests'], 5)
+        self.assertEqual(result['statuses'], {'204': 5})
+        self.assertEqual(result['errors'], 0)
+        self.assertIn('lag_p99_ms', result)
+        self.assertEqual(result['paths']['/webhook']['requests'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
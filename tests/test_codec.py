@@ -0,0 +1,62 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from codec import CODECS, create_codec
+
+
+def installed_codecs():
+    codecs = []
+    for codec_class in CODECS.values():
+        try:
+            codecs.append(codec_class())
+        except ImportError:
+            continue
+    return codecs
+
+
+class TestCodecs(unittest.TestCase):
+
+    def test_round_trip(self):
+        payload = {'b': [1, 2.5, None, True], 'a': {'text': 'café'}}
+        for codec in installed_codecs():
+            with self.subTest(codec=codec.name):
+                encoded = codec.dumps(payload, sort_keys=True)
+                self.assertIsInstance(encoded, bytes)
+                self.assertTrue(encoded.startswith(b'{"a":'))
+                self.assertEqual(codec.loads(encoded), payload)
+                self.assertEqual(codec.loads(encoded.decode()), payload)
+
+    def test_invalid_json_raises_value_error(self):
+        for codec in installed_codecs():
+            with self.subTest(codec=codec.name):
+                with self.assertRaises(ValueError):
+                    codec.loads(b'{oops')
+
+    def test_auto_picks_an_installed_codec(self):
+        self.assertIn(create_codec('auto').name, CODECS)
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            create_codec('yaml')
+
+
+@unittest.skipUnless('msgspec' in {codec.name for codec in installed_codecs()}, 'msgspec is not installed')
+class TestSchemaDecoding(unittest.TestCase):
+
+    def test_only_declared_fields_are_decoded(self):
+        import msgspec
+
+        class Push(msgspec.Struct, omit_defaults=True):
+            ref: str = ''
+            commits: list = []
+
+        codec = create_codec('msgspec')
+        data = codec.loads(b'{"ref": "main", "commits": [1, 2], "repository": {"huge": true}}', Push)
+        self.assertEqual(data, {'ref': 'main', 'commits': [1, 2]})
+        self.assertEqual(codec.loads(b'{}', Push), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
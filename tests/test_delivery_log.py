@@ -0,0 +1,203 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from codec import create_codec
+from delivery.log import DeliveryLog, scan
+from delivery.queue import DeliveryQueue, FairBackend, MemoryBackend
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+class TestDeliveryLog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmpdir.name, 'log')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def crash_after(self, statements):
+        """Runs statements against a log in another process that then dies."""
+        script = textwrap.dedent(f"""
+            import os, sys
+            sys.path.insert(0, {ROOT!r})
+            from delivery.log import DeliveryLog
+            log = DeliveryLog({self.directory!r})
+            log.open()
+        """) + textwrap.dedent(statements) + "\nos._exit(1)\n"
+        subprocess.run([sys.executable, '-c', script], check=False)
+
+    def test_unfinished_deliveries_of_a_dead_process_are_replayed(self):
+        self.crash_after("""
+            log.accepted('a', {'format': 'slack', 'payload': {'text': 'lost'}})
+            log.accepted('b', {'format': 'slack', 'payload': {'text': 'sent'}})
+            log.delivered('b')
+        """)
+        log = DeliveryLog(self.directory)
+        self.assertEqual(log.open(), [('a', {'format': 'slack', 'payload': {'text': 'lost'}})])
+        # The dead process's log was adopted into this one
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name != 'dead-letter.log']), 1)
+        # Closing with 'a' unfinished leaves it for the next start
+        log.close()
+
+        again = DeliveryLog(self.directory)
+        self.assertEqual(again.open(), [('a', {'format': 'slack', 'payload': {'text': 'lost'}})])
+        again.delivered('a')
+        again.close()
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_live_process_log_is_left_alone(self):
+        first = DeliveryLog(self.directory)
+        first.open()
+        first.accepted('a', {'n': 1})
+
+        second = DeliveryLog(self.directory)
+        self.assertEqual(second.open(), [])
+        first.close()
+        second.close()
+
+    def test_log_recovered_by_another_process_meanwhile_is_skipped(self):
+        self.crash_after("log.accepted('a', {'n': 1})")
+        dead, = os.listdir(self.directory)
+        real_open = os.open
+
+        def open_after_removal(path, *args, **kwargs):
+            # Another worker takes the log over and removes it first
+            if path == os.path.join(self.directory, dead, 'lock'):
+                shutil.rmtree(os.path.join(self.directory, dead))
+            return real_open(path, *args, **kwargs)
+
+        log = DeliveryLog(self.directory)
+        with patch('delivery.log.os.open', side_effect=open_after_removal):
+            self.assertEqual(log.open(), [])
+        log.close()
+
+    def test_finished_segments_are_deleted(self):
+        log = DeliveryLog(self.directory, segment_bytes=200)
+        log.open()
+        for n in range(10):
+            log.accepted(str(n), {'n': n})
+        segments = sorted(os.listdir(log._log.directory))
+        self.assertGreater(len(segments), 3)
+
+        for n in range(10):
+            log.delivered(str(n))
+        # Only the segment being written remains
+        self.assertEqual(sorted(os.listdir(log._log.directory)), [os.path.basename(log._log.segment_path(log._log.segment)), 'lock'])
+        log.close()
+
+    def test_concurrent_appends_share_fsyncs(self):
+        log = DeliveryLog(self.directory)
+        log.open()
+        real_fsync = os.fsync
+        calls = []
+
+        def slow_fsync(fd):
+            calls.append(fd)
+            time.sleep(0.01)
+            real_fsync(fd)
+
+        with patch('delivery.log.os.fsync', side_effect=slow_fsync):
+            threads = [threading.Thread(target=log.accepted, args=(str(n), {'n': n})) for n in range(40)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertLess(len(calls), 20)
+        log.close()
+
+    def test_scan_stops_at_torn_record(self):
+        log = DeliveryLog(self.directory)
+        log.open()
+        log.accepted('a', {'n': 1})
+        path = log._log.segment_path(1)
+        size = os.path.getsize(path)
+        with open(path, 'ab') as f:
+            f.write(b'\x40\x00\x00\x00\x00\x00')
+
+        records, end = scan(path, create_codec())
+        self.assertEqual([record['id'] for record in records], ['a'])
+        self.assertEqual(end, size)
+        log.close()
+
+
+class TestDeadLetters(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.log = DeliveryLog(os.path.join(self.tmpdir.name, 'log'))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_failed_jobs_are_dead_lettered(self):
+        def handler(job):
+            if job['fail']:
+                raise RuntimeError('SMTP server is down')
+
+        delivery_queue = DeliveryQueue(handler, backend=MemoryBackend(), workers=1, log=self.log)
+        failed = delivery_queue.enqueue({'fail': True})
+        delivery_queue.enqueue({'fail': False})
+        self.assertTrue(delivery_queue.join(timeout=5))
+        delivery_queue.stop()
+
+        entries = self.log.dead_letters.entries()
+        self.assertEqual([(entry['id'], entry['error']) for entry in entries], [(failed, 'SMTP server is down')])
+        # Failed jobs are not replayed; they wait in the dead-letter queue
+        self.assertEqual(DeliveryLog(self.log.directory).open(), [])
+
+    def test_jobs_sent_later_are_settled_when_sent(self):
+        # As the SMTP batcher does, the handler returns a Future per job
+        futures = []
+
+        def handler(job):
+            futures.append(Future())
+            return futures[-1]
+
+        backend = FairBackend(concurrency=1)
+        delivery_queue = DeliveryQueue(handler, backend=backend, workers=1, log=self.log)
+        ids = [delivery_queue.enqueue({'format': 'email', 'n': n}) for n in range(3)]
+        # The worker did not wait for one job before taking the next
+        deadline = time.monotonic() + 5
+        while len(futures) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(futures), 3)
+        self.assertFalse(delivery_queue.join(timeout=0.1))
+        # Unsent jobs would still be replayed after a crash
+        self.assertEqual(len(self.log._pending), 3)
+
+        futures[0].set_result(None)
+        futures[1].set_exception(RuntimeError('batch rejected'))
+        futures[2].set_result(None)
+        self.assertTrue(delivery_queue.join(timeout=5))
+        delivery_queue.stop()
+        self.assertEqual([entry['id'] for entry in self.log.dead_letters.entries()], [ids[1]])
+        self.assertEqual(DeliveryLog(self.log.directory).open(), [])
+
+    def test_redriven_entries_are_removed(self):
+        self.log.dead_letters.add('a', {'n': 1}, 'boom')
+        self.log.dead_letters.add('b', {'n': 2}, 'boom')
+        self.log.dead_letters.resolve('a')
+        self.assertEqual([entry['id'] for entry in self.log.dead_letters.entries()], ['b'])
+
+    def test_torn_tail_is_cut_before_appending(self):
+        self.log.dead_letters.add('a', {'n': 1}, 'boom')
+        with open(self.log.dead_letters.path, 'ab') as f:
+            f.write(b'\x10\x00')
+        self.log.dead_letters.add('b', {'n': 2}, 'boom')
+        self.assertEqual([entry['id'] for entry in self.log.dead_letters.entries()], ['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from delivery.breaker import CircuitBreakers
+from delivery.queue import DeliveryQueue, FairBackend, MemoryBackend, QueueFull, SQLiteBackend, parse_weights
+
+
+class TestDeliveryQueue(unittest.TestCase):
+
+    def test_workers_drain_queue(self):
+        delivered = []
+        lock = threading.Lock()
+
+        def handler(job):
+            with lock:
+                delivered.append(job['n'])
+
+        delivery_queue = DeliveryQueue(handler, backend=MemoryBackend(), workers=4)
+        ids = [delivery_queue.enqueue({'n': n}) for n in range(50)]
+        self.assertTrue(delivery_queue.join(timeout=5))
+        delivery_queue.stop()
+
+        self.assertEqual(len(set(ids)), 50)
+        self.assertEqual(sorted(delivered), list(range(50)))
+
+    def test_handler_errors_do_not_stop_workers(self):
+        delivered = []
+
+        def handler(job):
+            if job['fail']:
+                raise RuntimeError('boom')
+            delivered.append(job)
+
+        delivery_queue = DeliveryQueue(handler, workers=1)
+        delivery_queue.enqueue({'fail': True})
+        delivery_queue.enqueue({'fail': False})
+        self.assertTrue(delivery_queue.join(timeout=5))
+        delivery_queue.stop()
+
+        self.assertEqual(delivered, [{'fail': False}])
+
+    def test_dead_destination_does_not_block_others(self):
+        delivered = []
+        release = threading.Event()
+
+        def handler(job):
+            if job['format'] == 'msteams':
+                release.wait(5)
+                raise RuntimeError('timed out')
+            delivered.append(job['n'])
+
+        breakers = CircuitBreakers(min_calls=2, open_seconds=60)
+        backend = FairBackend(breakers=breakers, concurrency=2)
+        delivery_queue = DeliveryQueue(handler, backend=backend, workers=3, breakers=breakers)
+        for n in range(6):
+            delivery_queue.enqueue({'format': 'msteams', 'n': n})
+        for n in range(20):
+            delivery_queue.enqueue({'format': 'slack', 'n': n})
+        # Two workers are stuck on msteams, and the third drains slack meanwhile
+        deadline = time.monotonic() + 5
+        while len(delivered) < 20 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(sorted(delivered), list(range(20)))
+
+        release.set()
+        deadline = time.monotonic() + 5
+        while breakers.get('msteams').state != 'open' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Once the circuit opens, the remaining msteams jobs wait in their queue
+        waiting = backend.depths()['msteams']
+        time.sleep(0.2)
+        self.assertGreaterEqual(waiting, 2)
+        self.assertEqual(backend.depths()['msteams'], waiting)
+        delivery_queue.stop()
+
+    def test_full_destination_rejects_jobs(self):
+        delivery_queue = DeliveryQueue(lambda job: None, backend=FairBackend(capacity=1), workers=1)
+        delivery_queue.backend.put('queued', {'format': 'email'})
+        with self.assertRaises(QueueFull):
+            delivery_queue.enqueue({'format': 'email'})
+
+
+class TestFairBackend(unittest.TestCase):
+
+    def test_weighted_round_robin(self):
+        backend = FairBackend(concurrency=100, weights={'slack': 2})
+        for n in range(4):
+            backend.put(f"s{n}", {'format': 'slack'})
+            backend.put(f"e{n}", {'format': 'email'})
+        order = [backend.get(timeout=0)[0] for _ in range(8)]
+        self.assertEqual(order, ['s0', 's1', 'e0', 's2', 's3', 'e1', 'e2', 'e3'])
+
+    def test_concurrency_budget(self):
+        backend = FairBackend(concurrency=1)
+        backend.put('a', {'url': 'https://hooks.example.com/1', 'format': 'slack'})
+        backend.put('b', {'url': 'https://hooks.example.com/2', 'format': 'slack'})
+        self.assertEqual(backend.get(timeout=0)[0], 'a')
+        # The host already has its one worker
+        self.assertIsNone(backend.get(timeout=0.05))
+        backend.ack('a')
+        self.assertEqual(backend.get(timeout=0)[0], 'b')
+
+    def test_parse_weights(self):
+        self.assertEqual(parse_weights('slack=3; email=1'), {'slack': 3, 'email': 1})
+        with self.assertRaises(ValueError):
+            parse_weights('slack=fast')
+
+
+class TestSQLiteBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'deliveries.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_pending_deliveries_survive_reopen(self):
+        backend = SQLiteBackend(self.path)
+        backend.put('abc', {'format': 'slack', 'payload': {'text': 'hi'}})
+        backend.db.close()
+
+        reopened = SQLiteBackend(self.path)
+        self.assertEqual(reopened.depth(), 1)
+        self.assertEqual(reopened.get(timeout=1), ('abc', {'format': 'slack', 'payload': {'text': 'hi'}}))
+        reopened.ack('abc')
+        self.assertEqual(reopened.depth(), 0)
+
+    def test_expired_claims_are_redelivered(self):
+        backend = SQLiteBackend(self.path, lease=0)
+        backend.put('abc', {'n': 1})
+        self.assertEqual(backend.get(timeout=1)[0], 'abc')
+        # The claim was never acked, so with no lease it is handed out again
+        self.assertEqual(backend.get(timeout=1)[0], 'abc')
+
+    def test_each_delivery_is_claimed_once(self):
+        # Two instances stand in for two gunicorn workers sharing the file
+        backends = [SQLiteBackend(self.path), SQLiteBackend(self.path)]
+        for n in range(100):
+            backends[0].put(str(n), {'n': n})
+        claimed = []
+        lock = threading.Lock()
+
+        def claim(backend):
+            while True:
+                item = backend.get(timeout=0.1)
+                if item is None:
+                    return
+                with lock:
+                    claimed.append(item[0])
+
+        threads = [threading.Thread(target=claim, args=(backends[i % 2],)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(claimed, key=int), [str(n) for n in range(100)])
+
+    def test_get_times_out_when_empty(self):
+        backend = SQLiteBackend(self.path)
+        self.assertIsNone(backend.get(timeout=0.1))
+
+
+if __name__ == '__main__':
+    unittest.main()
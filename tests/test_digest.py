@@ -0,0 +1,78 @@
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from transformers.digest import DigestAggregator, MAX_VALUES, parse_digest_rules
+
+
+class TestDigestAggregator(unittest.TestCase):
+
+    def setUp(self):
+        self.emitted = []
+        self.flushed = threading.Event()
+
+    def emit(self, source, output_format, summary):
+        self.emitted.append((source, output_format, summary))
+        self.flushed.set()
+
+    def aggregator(self, **kwargs):
+        rules = parse_digest_rules('github=repository:commits;shopify=currency:total_price')
+        return DigestAggregator(rules, self.emit, **dict({'window': 60}, **kwargs))
+
+    def test_burst_becomes_one_digest(self):
+        digests = self.aggregator()
+        for pusher in ['alice'] * 30 + ['bob'] * 9 + ['carol']:
+            digests.add('github', 'discord', {'repository': 'test/repo', 'pusher': pusher, 'commits': 2})
+        digests.add('github', 'discord', {'repository': 'other/repo', 'pusher': 'dave', 'commits': 1})
+        digests.flush()
+
+        (_, output_format, summary), (_, _, single) = self.emitted
+        self.assertEqual(output_format, 'discord')
+        self.assertEqual(summary, {
+            'repository': 'test/repo', 'pusher': 'alice (30), bob (9), carol', 'commits': 80,
+            'events': 40, 'digest': True,
+        })
+        # A window of one event is sent as the event itself
+        self.assertEqual(single, {'repository': 'other/repo', 'pusher': 'dave', 'commits': 1})
+
+    def test_numeric_strings_are_summed(self):
+        digests = self.aggregator(top_n=1)
+        for order_id, price in ((1, '10.50'), (2, '4.25'), (3, None)):
+            digests.add('shopify', 'default', {'order_id': order_id, 'total_price': price, 'currency': 'USD'})
+        digests.flush()
+        summary = self.emitted[0][2]
+        self.assertEqual(summary['total_price'], 14.75)
+        self.assertEqual(summary['order_id'], '1, +2 more')
+
+    def test_windows_close_after_their_time(self):
+        digests = self.aggregator(window=0.05)
+        digests.add('github', 'slack', {'repository': 'test/repo'})
+        self.assertTrue(self.flushed.wait(2))
+        self.assertEqual(len(digests), 0)
+
+    def test_memory_is_bounded(self):
+        digests = self.aggregator(max_keys=2)
+        for repository in ('a', 'b', 'c'):
+            digests.add('github', 'slack', {'repository': repository, 'pusher': repository})
+        self.assertEqual(len(digests), 2)
+        # The oldest window was flushed early to make room
+        self.assertEqual(self.emitted[0][2]['repository'], 'a')
+
+        for index in range(MAX_VALUES + 10):
+            digests.add('github', 'slack', {'repository': 'b', 'pusher': index})
+        digests.close()
+        summary = [summary for _, _, summary in self.emitted if summary['repository'] == 'b'][0]
+        self.assertTrue(summary['pusher'].endswith(f"+{MAX_VALUES + 11 - 5} more"))
+
+    def test_parse_rules(self):
+        rules = parse_digest_rules('github=repository:commits, additions;stripe=currency')
+        self.assertEqual(rules['github'].sums, {'commits', 'additions'})
+        self.assertEqual(rules['stripe'].path, ('currency',))
+        with self.assertRaises(ValueError):
+            parse_digest_rules('github=')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import json
+import os
+import sys
+import unittest
+from typing import Any
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks.pipeline import inflate, load_fixtures
+from codec import create_codec
+from transformers.fields import COUNTED, field_tree
+from transformers.registry import load_registry
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+class TestFieldTree(unittest.TestCase):
+
+    def test_nests_dotted_paths(self):
+        tree = field_tree(['repository.full_name', 'pusher.name', 'commits[]'])
+        self.assertEqual(tree, {'repository': {'full_name': Any}, 'pusher': {'name': Any}, 'commits': COUNTED})
+
+    def test_parent_path_is_decoded_whole(self):
+        self.assertEqual(field_tree(['data', 'data.email']), {'data': Any})
+        self.assertEqual(field_tree(['data.email', 'data']), {'data': Any})
+
+
+@unittest.skipUnless(msgspec, 'msgspec is not installed')
+class TestSelectiveDecoding(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = load_registry()
+        self.codec = create_codec('msgspec')
+
+    def test_sources_with_fields_get_a_schema(self):
+        for source in ('github', 'shopify', 'stripe'):
+            self.assertIsNotNone(self.registry.schema(source))
+        self.assertIsNone(self.registry.schema('default'))
+
+    def test_pipelines_see_the_same_result(self):
+        for source, payload in load_fixtures().items():
+            body = json.dumps(inflate(payload, 64 * 1024)).encode()
+            full = json.loads(body)
+            selective = self.codec.loads(body, self.registry.schema(source))
+            for output_format in self.registry.formats:
+                with self.subTest(source=source, format=output_format):
+                    pipeline = self.registry.pipeline(source, output_format)
+                    self.assertEqual(pipeline(selective), pipeline(full))
+
+    def test_missing_and_null_fields_are_left_out(self):
+        data = self.codec.loads(b'{"repository": null, "commits": []}', self.registry.schema('github'))
+        self.assertEqual(data, {'commits': []})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from delivery.http import DeliveryError, HTTPDelivery, RequestsClient, retry_after
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers each POST or PUT with the next scripted (status, headers) response.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        with server.lock:
+            server.requests.append((time.monotonic(), json.loads(body)))
+            server.clients.add(self.client_address)
+            server.calls.append((self.command, self.path, self.headers.get('Authorization')))
+            status, headers = server.responses.pop(0) if server.responses else (204, {})
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_PUT = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.clients = set()
+        self.calls = []
+        self.responses = []
+
+
+class TestHTTPDelivery(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+        self.delivery = HTTPDelivery(RequestsClient(timeout=5), max_retries=3, backoff_base=0.01)
+
+    def tearDown(self):
+        self.delivery.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused(self):
+        for n in range(20):
+            self.assertEqual(self.delivery.deliver(self.url, {'n': n}), 204)
+        self.assertEqual(len(self.server.requests), 20)
+        self.assertEqual(len(self.server.clients), 1)
+
+    def test_retries_server_errors(self):
+        self.server.responses = [(503, {}), (502, {})]
+        self.assertEqual(self.delivery.deliver(self.url, {'text': 'hi'}), 204)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_client_errors_are_not_retried(self):
+        self.server.responses = [(400, {})]
+        with self.assertRaises(DeliveryError) as raised:
+            self.delivery.deliver(self.url, {'text': 'hi'})
+        self.assertEqual(raised.exception.status, 400)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.responses = [(500, {})] * 10
+        with self.assertRaises(DeliveryError):
+            self.delivery.deliver(self.url, {'text': 'hi'})
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_honors_retry_after(self):
+        self.server.responses = [(429, {'Retry-After': '0.2'})]
+        self.delivery.deliver(self.url, {'text': 'hi'})
+        (first, _), (second, _) = self.server.requests
+        self.assertGreaterEqual(second - first, 0.2)
+
+    def test_waits_for_exhausted_rate_limit_bucket(self):
+        self.server.responses = [
+            (204, {'X-RateLimit-Bucket': 'abc', 'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-After': '0.2'}),
+        ]
+        self.delivery.deliver(self.url, {'n': 1})
+        self.delivery.deliver(self.url, {'n': 2})
+        (first, _), (second, _) = self.server.requests
+        self.assertGreaterEqual(second - first, 0.2)
+
+    def test_urls_of_one_route_share_a_bucket(self):
+        self.server.responses = [
+            (201, {'X-RateLimit-Bucket': 'abc', 'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-After': '0.2'}),
+        ]
+        base = self.url.rsplit('/', 1)[0]
+        for member in ('1', '2'):
+            status = self.delivery.deliver(
+                f"{base}/members/{member}", {'n': member}, {'Authorization': 'Bot token'}, method='PUT', route='members',
+            )
+        self.assertEqual(status, 204)
+        (first, _), (second, _) = self.server.requests
+        self.assertGreaterEqual(second - first, 0.2)
+        self.assertEqual(self.server.calls[0], ('PUT', '/members/1', 'Bot token'))
+
+
+    def test_malformed_rate_limit_headers_do_not_fail_a_delivery(self):
+        self.server.responses = [
+            (204, {'X-RateLimit-Global': 'true', 'Retry-After': 'soon',
+                   'X-RateLimit-Remaining': '', 'X-RateLimit-Reset-After': 'nan'}),
+        ]
+        self.assertEqual(self.delivery.deliver(self.url, {'n': 1}), 204)
+        self.assertEqual(len(self.server.requests), 1)
+
+
+class TestRetryAfter(unittest.TestCase):
+
+    def test_reads_seconds_header(self):
+        self.assertEqual(retry_after({'Retry-After': '3'}, b''), 3.0)
+
+    def test_reads_discord_body(self):
+        self.assertEqual(retry_after({}, b'{"retry_after": 1.5, "global": false}'), 1.5)
+
+    def test_malformed_header_is_ignored(self):
+        self.assertIsNone(retry_after({'Retry-After': 'soon'}, b''))
+        self.assertIsNone(retry_after({'Retry-After': 'inf'}, b''))
+
+    def test_missing(self):
+        self.assertIsNone(retry_after({}, b''))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ingest.idempotency import BloomFilter, IdempotencyGuard, RotatingBloomFilter, event_key
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        keys = [f"key-{n}" for n in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for n in range(1000):
+            bloom.add(f"key-{n}")
+        false_positives = sum(f"other-{n}" in bloom for n in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_rotation_forgets_old_keys(self):
+        bloom = RotatingBloomFilter(100, window=0.05)
+        bloom.add('old')
+        time.sleep(0.06)
+        self.assertIn('old', bloom)
+        time.sleep(0.06)
+        self.assertNotIn('old', bloom)
+
+
+class TestIdempotencyGuard(unittest.TestCase):
+
+    def test_second_sighting_is_duplicate(self):
+        guard = IdempotencyGuard(window=60, capacity=100)
+        self.assertFalse(guard.seen('evt_1'))
+        self.assertTrue(guard.seen('evt_1'))
+        self.assertFalse(guard.seen('evt_2'))
+
+    def test_forgotten_keys_are_let_through(self):
+        guard = IdempotencyGuard(window=60, capacity=100)
+        guard.seen('evt_1')
+        guard.forget('evt_1')
+        self.assertFalse(guard.seen('evt_1'))
+        self.assertTrue(guard.seen('evt_1'))
+
+    def test_evicted_keys_are_let_through(self):
+        guard = IdempotencyGuard(window=60, capacity=2)
+        for key in ('a', 'b', 'c'):
+            guard.seen(key)
+        self.assertFalse(guard.seen('a'))
+
+
+class TestEventKey(unittest.TestCase):
+
+    def test_prefers_provider_delivery_id(self):
+        headers = {'x-shopify-webhook-id': 'b54557e4'}
+        self.assertEqual(event_key(headers, b'{}', 'shopify:slack'), 'shopify:slack:shopify:b54557e4')
+
+    def test_falls_back_to_content_hash(self):
+        self.assertEqual(event_key({}, b'{"a": 1}'), event_key({}, b'{"a": 1}'))
+        self.assertNotEqual(event_key({}, b'{"a": 1}'), event_key({}, b'{"a": 2}'))
+
+    def test_content_hash_can_be_disabled(self):
+        self.assertIsNone(event_key({}, b'{"a": 1}', content_hash=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+# Loaded on first use, so a process serving only /webhook never imports them
+LAZY_MODULES = ('stripe', 'requests_oauthlib', 'requests', 'dotenv')
+
+# Cumulative import time of app.py, generous enough for slow CI machines
+BUDGET_SECONDS = 1.5
+
+
+def import_times(module):
+    """
+    Imports a module in a fresh interpreter and returns the cumulative
+    import time of every module it loaded, in seconds.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            PYTHONPATH=ROOT,
+            DELIVERY_LOG_DIR='',
+            METRICS_DIR='',
+            DATABASE_PATH=os.path.join(directory, 'users.db'),
+            DELIVERY_QUEUE_PATH=os.path.join(directory, 'deliveries.db'),
+        )
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+            cwd=directory, env=env, capture_output=True, text=True, timeout=60,
+        )
+    if result.returncode != 0:
+        raise AssertionError(result.stderr)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_app_cold_start(self):
+        times = import_times('app')
+        for module in LAZY_MODULES:
+            self.assertNotIn(module, times, f"{module} is imported at startup")
+        self.assertLess(times['app'], BUDGET_SECONDS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from codec import create_codec
+from observability.logs import (
+    DROPPED, BackgroundHandler, JSONFormatter, delivery_id, new_request_id, parse_sample_rates, request_id, truncate,
+)
+
+
+class TestBackgroundHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = queue.Queue()
+        self.logger = logging.getLogger('tests.logs')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+
+    def tearDown(self):
+        self.logger.handlers.clear()
+
+    def attach(self, handler):
+        self.logger.handlers.clear()
+        self.logger.addHandler(handler)
+
+    def test_records_are_tagged_but_not_formatted(self):
+        self.attach(BackgroundHandler(self.queue))
+        payload = {'text': 'hi'}
+        request_token = request_id.set('req-1')
+        delivery_token = delivery_id.set('del-1')
+        try:
+            self.logger.info("Sending %s", 'slack', extra={'payload': payload})
+        finally:
+            request_id.reset(request_token)
+            delivery_id.reset(delivery_token)
+
+        record = self.queue.get_nowait()
+        # Arguments are left for the listener thread to merge
+        self.assertEqual(record.msg, "Sending %s")
+        self.assertIs(record.payload, payload)
+        self.assertEqual((record.request_id, record.delivery_id), ('req-1', 'del-1'))
+
+    def test_sampled_events(self):
+        self.attach(BackgroundHandler(self.queue, {'delivery.sent': 0.0, 'delivery.failed': 1.0}))
+        self.logger.info("sent", extra={'event': 'delivery.sent'})
+        self.logger.info("failed", extra={'event': 'delivery.failed'})
+        self.logger.info("other")
+        records = [self.queue.get_nowait() for _ in range(self.queue.qsize())]
+        self.assertEqual([record.msg for record in records], ['failed', 'other'])
+        self.assertEqual(records[0].sample_rate, 1.0)
+
+    def test_full_queue_drops_records(self):
+        self.attach(BackgroundHandler(queue.Queue(1)))
+        before = DROPPED.samples().get((), 0)
+        self.logger.info("one")
+        self.logger.info("two")
+        self.assertEqual(DROPPED.samples()[()], before + 1)
+
+    def test_listener_writes_json_lines(self):
+        handler = BackgroundHandler(self.queue)
+        self.attach(handler)
+        lines = []
+
+        class Collect(logging.Handler):
+            def emit(self, record):
+                lines.append(self.format(record))
+
+        output = Collect()
+        output.setFormatter(JSONFormatter(max_field_length=40))
+        listener = logging.handlers.QueueListener(self.queue, output)
+        listener.start()
+        self.logger.warning("No destination for %s payload", 'slack', extra={'payload': {'text': 'x' * 100}})
+        listener.stop()
+
+        entry = json.loads(lines[0])
+        self.assertEqual(entry['message'], 'No destination for slack payload')
+        self.assertEqual(entry['level'], 'WARNING')
+        self.assertTrue(entry['payload'].endswith('more characters)'))
+        self.assertNotIn('request_id', entry)
+
+
+class TestHelpers(unittest.TestCase):
+
+    def test_truncate(self):
+        codec = create_codec()
+        self.assertEqual(truncate('short', 10, codec), 'short')
+        self.assertEqual(truncate('x' * 15, 10, codec), 'x' * 10 + '...(5 more characters)')
+        self.assertEqual(truncate({'a': 1}, 10, codec), {'a': 1})
+        self.assertEqual(truncate({'a': 'x' * 20}, 10, codec), '{"a":"xxxx...(18 more characters)')
+
+    def test_request_ids_from_clients_are_validated(self):
+        self.assertEqual(new_request_id('abc-123'), 'abc-123')
+        self.assertNotEqual(new_request_id('bad id\n'), 'bad id\n')
+        self.assertEqual(len(new_request_id()), 32)
+
+    def test_parse_sample_rates(self):
+        self.assertEqual(parse_sample_rates('a=0.1, b=1'), {'a': 0.1, 'b': 1.0})
+        with self.assertRaises(ValueError):
+            parse_sample_rates('a=often')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from observability.metrics import MetricsStore, Registry, merge, render
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = self.registry.histogram('stage_seconds', 'Stage time', ('stage',), buckets=(0.001, 0.01))
+        for value in (0.0005, 0.001, 0.005, 2):
+            histogram.observe(('parse',), value)
+        text = render(self.registry.snapshot())
+        self.assertIn('# TYPE stage_seconds histogram', text)
+        self.assertIn('stage_seconds_bucket{stage="parse",le="0.001"} 2', text)
+        self.assertIn('stage_seconds_bucket{stage="parse",le="0.01"} 3', text)
+        self.assertIn('stage_seconds_bucket{stage="parse",le="+Inf"} 4', text)
+        self.assertIn('stage_seconds_count{stage="parse"} 4', text)
+        self.assertIn('stage_seconds_sum{stage="parse"} 2.0065', text)
+
+    def test_label_values_are_escaped(self):
+        self.registry.counter('events_total', 'Events', ('type',)).inc(('say "hi"\n',))
+        self.assertIn('events_total{type="say \\"hi\\"\\n"} 1', render(self.registry.snapshot()))
+
+    def test_gauges_are_read_at_collection(self):
+        depth = [3]
+        self.registry.gauge('queue_depth', 'Depth', collect=lambda: {(): depth[0]})
+        depth[0] = 5
+        self.assertIn('queue_depth 5', render(self.registry.snapshot()))
+
+    def test_registering_twice_returns_the_same_metric(self):
+        first = self.registry.counter('events_total', 'Events', ('type',))
+        self.assertIs(self.registry.counter('events_total', 'Events', ('type',)), first)
+        with self.assertRaises(ValueError):
+            self.registry.histogram('events_total', 'Events', ('type',))
+
+    def test_merge_sums_counts_and_respects_gauge_aggregate(self):
+        def snapshot(count, depth, in_flight):
+            registry = Registry()
+            registry.counter('requests_total', 'Requests').inc((), count)
+            registry.gauge('queue_depth', 'Depth', aggregate='max').set((), depth)
+            registry.gauge('in_flight', 'In flight').set((), in_flight)
+            return registry.snapshot()
+
+        merged = merge([snapshot(2, 7, 1), snapshot(3, 7, 2)])
+        self.assertEqual(merged['requests_total']['samples'], {(): 5})
+        self.assertEqual(merged['queue_depth']['samples'], {(): 7})
+        self.assertEqual(merged['in_flight']['samples'], {(): 3})
+
+
+class TestMetricsStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.directory = self.tmpdir.name
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_worker(self, count):
+        """Records requests in another process, which writes them on exit."""
+        script = textwrap.dedent(f"""
+            import sys
+            sys.path.insert(0, {ROOT!r})
+            from observability.metrics import MetricsStore, Registry
+            registry = Registry()
+            registry.counter('requests_total', 'Requests').inc((), {count})
+            registry.gauge('in_flight', 'In flight').set((), 4)
+            MetricsStore(registry, {self.directory!r}, interval=60).start()
+        """)
+        subprocess.run([sys.executable, '-c', script], check=True)
+
+    def test_counts_of_exited_workers_are_kept(self):
+        self.run_worker(2)
+        self.run_worker(3)
+        registry = Registry()
+        registry.counter('requests_total', 'Requests').inc((), 1)
+        store = MetricsStore(registry, self.directory)
+
+        merged = store.collect()
+        self.assertEqual(merged['requests_total']['samples'], {(): 6})
+        # Gauges of exited workers no longer describe anything
+        self.assertNotIn('in_flight', merged)
+        # Their counts now live in the archive, and are still reported once
+        self.assertEqual(sorted(os.listdir(self.directory)), ['archive.json', 'lock'])
+        self.assertEqual(store.collect()['requests_total']['samples'], {(): 6})
+
+    def test_without_directory_reports_this_process(self):
+        registry = Registry()
+        registry.counter('requests_total', 'Requests').inc()
+        self.assertEqual(MetricsStore(registry).collect()['requests_total']['samples'], {(): 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
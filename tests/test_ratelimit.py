@@ -0,0 +1,135 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+from flask import Flask
+from limits import parse
+from limits.storage import storage_from_string
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ratelimit.gcra import GCRARateLimiter, gcra
+import ratelimit.storage  # noqa: F401
+from ratelimit.keys import make_key_func, parse_source_limits, source_limit
+
+
+class TestGCRA(unittest.TestCase):
+
+    def test_allows_burst_then_one_per_interval(self):
+        tat = 0.0
+        results = []
+        for _ in range(4):
+            allowed, tat = gcra(tat, 100.0, interval=1.0, window=3.0)
+            results.append(allowed)
+        self.assertEqual(results, [True, True, True, False])
+        self.assertTrue(gcra(tat, 101.0, interval=1.0, window=3.0)[0])
+
+
+class StorageTests:
+    """
+    Shared checks for every storage that supports GCRA.
+    """
+
+    def test_gcra_limits_each_key(self):
+        limiter = GCRARateLimiter(self.storage)
+        item = parse('3 per second')
+        self.assertEqual([limiter.hit(item, 'a') for _ in range(4)], [True, True, True, False])
+        self.assertTrue(limiter.hit(item, 'b'))
+        self.assertFalse(limiter.test(item, 'a'))
+        self.assertEqual(limiter.get_window_stats(item, 'a').remaining, 0)
+
+        time.sleep(0.4)
+        self.assertTrue(limiter.hit(item, 'a'))
+
+    def test_clear(self):
+        limiter = GCRARateLimiter(self.storage)
+        item = parse('1 per minute')
+        self.assertTrue(limiter.hit(item, 'a'))
+        self.assertFalse(limiter.hit(item, 'a'))
+        limiter.clear(item, 'a')
+        self.assertTrue(limiter.hit(item, 'a'))
+
+
+class TestMemoryStorage(StorageTests, unittest.TestCase):
+
+    def setUp(self):
+        self.storage = storage_from_string('memory://')
+
+
+class TestSQLiteStorage(StorageTests, unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.uri = f"sqlite:///{self.tmpdir.name}/ratelimit.db"
+        self.storage = storage_from_string(self.uri)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_counters_are_shared_between_instances(self):
+        # Two storages on one file stand in for two gunicorn workers
+        other = storage_from_string(self.uri)
+        item = parse('2 per minute')
+        self.assertTrue(GCRARateLimiter(self.storage).hit(item, 'a'))
+        self.assertTrue(GCRARateLimiter(other).hit(item, 'a'))
+        self.assertFalse(GCRARateLimiter(self.storage).hit(item, 'a'))
+
+    def test_fixed_window_counters(self):
+        self.assertEqual(self.storage.incr('k', 60), 1)
+        self.assertEqual(self.storage.incr('k', 60, amount=2), 3)
+        self.assertEqual(self.storage.get('k'), 3)
+        self.assertGreater(self.storage.get_expiry('k'), time.time())
+        self.assertEqual(self.storage.reset(), 1)
+        self.assertEqual(self.storage.get('k'), 0)
+
+
+@unittest.skipUnless(os.getenv('RATELIMIT_TEST_REDIS_URL'), 'set RATELIMIT_TEST_REDIS_URL to a local Redis to run')
+class TestRedisStorage(StorageTests, unittest.TestCase):
+
+    def setUp(self):
+        self.storage = storage_from_string(os.environ['RATELIMIT_TEST_REDIS_URL'])
+        self.storage.reset()
+
+
+class TestKeys(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['JWT_SECRET_KEY'] = 'test-secret'
+
+    def test_key_from_source_and_ip(self):
+        key_func = make_key_func('source,ip')
+        with self.app.test_request_context('/webhook?source=github', environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+            self.assertEqual(key_func(), 'source=github|ip=10.0.0.1')
+
+    def test_key_from_signing_secret(self):
+        key_func = make_key_func('secret', {'github': 'tenant-a'})
+        with self.app.test_request_context('/webhook?source=github'):
+            key = key_func()
+        self.assertTrue(key.startswith('secret='))
+        self.assertNotIn('tenant-a', key)
+        rotated = make_key_func('secret', {'github': 'tenant-b'})
+        with self.app.test_request_context('/webhook?source=github'):
+            self.assertNotEqual(rotated(), key)
+        with self.app.test_request_context('/webhook?source=wix'):
+            self.assertEqual(key_func(), 'secret=unsigned')
+
+    def test_unknown_key_part(self):
+        with self.assertRaises(ValueError):
+            make_key_func('source,nope')
+
+    def test_source_limits(self):
+        self.assertEqual(
+            parse_source_limits('github=100 per minute; stripe=5 per second;'),
+            {'github': '100 per minute', 'stripe': '5 per second'},
+        )
+        limit = source_limit('10 per minute', 'github=100 per minute')
+        with self.app.test_request_context('/webhook?source=github'):
+            self.assertEqual(limit(), '100 per minute')
+        with self.app.test_request_context('/webhook?source=wix'):
+            self.assertEqual(limit(), '10 per minute')
+
+
+if __name__ == '__main__':
+    unittest.main()
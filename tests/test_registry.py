@@ -0,0 +1,33 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from transformers.registry import Registry, load_registry
+
+
+class TestRegistry(unittest.TestCase):
+
+    def test_discovers_bundled_transformers(self):
+        registry = load_registry()
+        self.assertEqual(
+            registry.sources,
+            {'default', 'github', 'stripe', 'shopify', 'wix', 'cloudflare', 'webflow'},
+        )
+        self.assertEqual(registry.formats, {'default', 'slack', 'discord', 'msteams', 'email'})
+
+    def test_pipeline_parses_then_formats(self):
+        registry = load_registry()
+        pipeline = registry.pipeline('github', 'discord')
+        payload = {'repository': {'full_name': 'test/repo'}, 'pusher': {'name': 'testuser'}, 'commits': [{}, {}]}
+        self.assertEqual(pipeline(payload), {'content': 'New push to test/repo by testuser with 2 commits.'})
+
+    def test_unknown_pairs_have_no_pipeline(self):
+        registry = Registry({'a': lambda data: data}, {'b': lambda data: data})
+        self.assertIsNotNone(registry.pipeline('a', 'b'))
+        self.assertIsNone(registry.pipeline('a', 'missing'))
+        self.assertIsNone(registry.pipeline('os', 'b'))
+
+
+if __name__ == '__main__':
+    unittest.main()
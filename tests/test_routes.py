@@ -0,0 +1,75 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from delivery.routes import Route, RoutingTable, Target, load_routes, parse_routes
+from transformers.registry import load_registry
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+class TestRoutingTable(unittest.TestCase):
+
+    def test_matching_routes_fan_out_without_duplicates(self):
+        table = RoutingTable([
+            Route('all', 'github', [Target('slack', None), Target('email', None)]),
+            Route('main', 'github', [Target('slack', None), Target('discord', None)], {'repository': 'octo/main'}),
+            Route('other', 'stripe', [Target('msteams', None)]),
+        ])
+        self.assertEqual(
+            table.targets('github', {'repository': 'octo/main'}),
+            [Target('slack', None), Target('email', None), Target('discord', None)],
+        )
+        self.assertEqual(table.targets('github', {'repository': 'octo/fork'}), [Target('slack', None), Target('email', None)])
+        self.assertEqual(table.targets('shopify', {}), [])
+
+    def test_filters_follow_dotted_paths_and_lists(self):
+        route = Route('eu', 'default', [Target('slack', None)], {'order.currency': ['EUR', 'GBP']})
+        self.assertTrue(route.matches({'order': {'currency': 'GBP'}}))
+        self.assertFalse(route.matches({'order': {'currency': 'USD'}}))
+        self.assertFalse(route.matches({'order': 'EUR'}))
+
+
+class TestLoadRoutes(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = load_registry()
+
+    def test_example_file_is_valid(self):
+        table = load_routes(os.path.join(ROOT, 'routes.example.json'), self.registry)
+        self.assertEqual(len(table), 3)
+
+    def test_missing_file_means_no_routes(self):
+        self.assertEqual(len(load_routes(os.path.join(tempfile.gettempdir(), 'no-such-routes.json'), self.registry)), 0)
+
+    def test_conditions_and_templates(self):
+        spec = {'routes': [{
+            'source': 'stripe',
+            'when': 'amount > 100 and currency == "usd"',
+            'targets': [{'format': 'slack', 'template': {'text': 'Big charge: {amount} {upper(currency)}'}}],
+        }]}
+        table = parse_routes(spec, self.registry)
+        [target] = table.targets('stripe', {'amount': 250.0, 'currency': 'usd'})
+        self.assertEqual(target.template({'amount': 250.0, 'currency': 'usd'}), {'text': 'Big charge: 250.0 USD'})
+        self.assertEqual(table.targets('stripe', {'amount': 20.0, 'currency': 'usd'}), [])
+
+    def test_invalid_condition_is_rejected(self):
+        spec = {'routes': [{'source': 'stripe', 'when': 'open("x")', 'targets': [{'format': 'slack'}]}]}
+        with self.assertRaises(ValueError):
+            parse_routes(spec, self.registry)
+
+    def test_unknown_format_is_rejected(self):
+        spec = {'routes': [{'source': 'github', 'targets': [{'format': 'pager'}]}]}
+        with self.assertRaises(ValueError):
+            parse_routes(spec, self.registry)
+
+    def test_route_without_targets_is_rejected(self):
+        with self.assertRaises(ValueError):
+            parse_routes(json.loads('{"routes": [{"source": "github", "targets": []}]}'), self.registry)
+
+
+if __name__ == '__main__':
+    unittest.main()
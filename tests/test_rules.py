@@ -0,0 +1,69 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from transformers.rules import RuleError, compile_condition, compile_template
+
+CHARGE = {
+    'event_type': 'charge.succeeded',
+    'amount': 4999,
+    'currency': 'usd',
+    'customer': {'email': 'jenny@example.com'},
+    'items': [{'sku': 'PREMIUM'}],
+}
+
+
+class TestConditions(unittest.TestCase):
+
+    def test_compares_fields(self):
+        condition = compile_condition('event_type == "charge.succeeded" and amount > 100')
+        self.assertTrue(condition(CHARGE))
+        self.assertFalse(condition(dict(CHARGE, amount=50)))
+
+    def test_dotted_paths_indexes_and_functions(self):
+        self.assertTrue(compile_condition('items[0].sku in ["PREMIUM", "PRO"] and len(items) == 1')(CHARGE))
+        self.assertTrue(compile_condition('upper(currency) == "USD"')(CHARGE))
+
+    def test_missing_fields_are_false_not_errors(self):
+        condition = compile_condition('amount > 100')
+        self.assertFalse(condition({}))
+        self.assertFalse(condition({'amount': 'lots'}))
+
+    def test_rejects_unsafe_expressions(self):
+        for text in ('__import__("os").system("id")', 'open("/etc/passwd")', 'data.get("x")', '[x for x in items]', 'amount ='):
+            with self.subTest(text=text):
+                with self.assertRaises(RuleError):
+                    compile_condition(text)
+
+    def test_compiled_once_per_definition(self):
+        self.assertIs(compile_condition('amount > 1'), compile_condition('amount > 1'))
+
+
+class TestTemplates(unittest.TestCase):
+
+    def test_renders_nested_structures(self):
+        template = compile_template({
+            'text': 'Charge of {amount / 100:.2f} {upper(currency)} from {customer.email}',
+            'amount': '{amount}',
+            'tags': ['{items[0].sku}', 'stripe'],
+            'literal': 'use {{braces}}',
+            'count': 1,
+        })
+        self.assertEqual(template(CHARGE), {
+            'text': 'Charge of 49.99 USD from jenny@example.com',
+            'amount': 4999,
+            'tags': ['PREMIUM', 'stripe'],
+            'literal': 'use {braces}',
+            'count': 1,
+        })
+
+    def test_defaults_for_missing_fields(self):
+        self.assertEqual(compile_template('{pusher or "someone"}')({}), 'someone')
+
+    def test_compiled_once_per_definition(self):
+        self.assertIs(compile_template({'text': '{a}'}), compile_template({'text': '{a}'}))
+
+
+if __name__ == '__main__':
+    unittest.main()
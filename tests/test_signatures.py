@@ -0,0 +1,81 @@
+import base64
+import hashlib
+import hmac
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ingest.signatures import SignatureVerifier, keyed, parse_secrets
+
+BODY = b'{"action": "opened"}'
+NOW = 1700000000
+
+
+def hexdigest(secret, message):
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+class TestSignatureVerifier(unittest.TestCase):
+
+    def setUp(self):
+        self.verifier = SignatureVerifier({
+            'default': 'generic', 'github': 'gh', 'shopify': 'shop', 'stripe': 'whsec',
+            'webflow': 'wf', 'cloudflare': 'cf-token',
+        })
+
+    def verify(self, source, headers, body=BODY):
+        return self.verifier.verify(source, headers, body, now=NOW)
+
+    def test_github(self):
+        self.assertTrue(self.verify('github', {'x-hub-signature-256': 'sha256=' + hexdigest('gh', BODY)}))
+        self.assertFalse(self.verify('github', {'x-hub-signature-256': hexdigest('gh', BODY)}))
+        self.assertFalse(self.verify('github', {'x-hub-signature-256': 'sha256=' + hexdigest('gh', BODY)}, BODY + b' '))
+        self.assertFalse(self.verify('github', {}))
+
+    def test_shopify(self):
+        signature = base64.b64encode(hmac.new(b'shop', BODY, hashlib.sha256).digest()).decode()
+        self.assertTrue(self.verify('shopify', {'x-shopify-hmac-sha256': signature}))
+        self.assertFalse(self.verify('shopify', {'x-shopify-hmac-sha256': 'é'}))
+
+    def test_stripe(self):
+        signature = hexdigest('whsec', f"{NOW}.".encode() + BODY)
+        self.assertTrue(self.verify('stripe', {'stripe-signature': f"t={NOW},v1=bad,v1={signature}"}))
+        self.assertFalse(self.verify('stripe', {'stripe-signature': f"v1={signature}"}))
+        # Replays of an old, validly signed event are rejected
+        old = NOW - 301
+        stale = hexdigest('whsec', f"{old}.".encode() + BODY)
+        self.assertFalse(self.verify('stripe', {'stripe-signature': f"t={old},v1={stale}"}))
+
+    def test_webflow(self):
+        timestamp = str(NOW * 1000)
+        signature = hexdigest('wf', f"{timestamp}:".encode() + BODY)
+        self.assertTrue(self.verify('webflow', {'x-webflow-timestamp': timestamp, 'x-webflow-signature': signature}))
+        self.assertFalse(self.verify('webflow', {'x-webflow-timestamp': 'soon', 'x-webflow-signature': signature}))
+
+    def test_cloudflare(self):
+        self.assertTrue(self.verify('cloudflare', {'cf-webhook-auth': 'cf-token'}))
+        self.assertFalse(self.verify('cloudflare', {'cf-webhook-auth': 'cf-tok'}))
+
+    def test_sources_without_a_secret(self):
+        self.assertTrue(self.verify('wix', {}))
+        self.assertFalse(SignatureVerifier({}, required=True).verify('wix', {}, BODY))
+
+    def test_unsupported_source(self):
+        with self.assertRaises(ValueError):
+            SignatureVerifier({'wix': 'secret'})
+
+    def test_keyed_hmac_is_cached(self):
+        self.assertIs(keyed('gh'), keyed('gh'))
+        self.verify('github', {'x-hub-signature-256': 'sha256=00'})
+        # Requests sign copies, so the cached object still holds only the key
+        self.assertEqual(keyed('gh').hexdigest(), hexdigest('gh', b''))
+
+    def test_parse_secrets(self):
+        self.assertEqual(parse_secrets('github=a; shopify=b=c'), {'github': 'a', 'shopify': 'b=c'})
+        with self.assertRaises(ValueError):
+            parse_secrets('github=')
+
+
+if __name__ == '__main__':
+    unittest.main()
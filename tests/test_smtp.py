@@ -0,0 +1,188 @@
+import os
+import smtplib
+import socket
+import socketserver
+import sys
+import threading
+import time
+import unittest
+from email.message import EmailMessage
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from delivery.smtp import SMTPBatcher, SMTPPool
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Speaks just enough SMTP to accept messages from smtplib.
+    """
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+            server.sockets.append(self.connection)
+        self.reply('220 stub ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith('EHLO') or command.startswith('HELO'):
+                self.reply('250 stub')
+            elif command == 'DATA':
+                self.reply('354 end with .')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with server.lock:
+                    server.messages += 1
+                self.reply('250 queued')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+    def reply(self, text):
+        self.wfile.write(f"{text}\r\n".encode())
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubSMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        self.sockets = []
+
+    def drop_connections(self):
+        with self.lock:
+            for sock in self.sockets:
+                sock.shutdown(socket.SHUT_RDWR)
+            self.sockets = []
+
+
+def make_message(n):
+    msg = EmailMessage()
+    msg['From'] = 'sender@example.com'
+    msg['To'] = 'receiver@example.com'
+    msg['Subject'] = f"Notification {n}"
+    msg.set_content(f"Body {n}")
+    return msg
+
+
+class TestSMTPPool(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSMTPServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.host, self.port = self.server.server_address
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def wait_for_messages(self, count):
+        deadline = time.monotonic() + 5
+        while self.server.messages < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_pool_reuses_one_connection(self):
+        pool = SMTPPool(self.host, self.port, starttls=False, size=1)
+        for n in range(20):
+            pool.send(make_message(n))
+        pool.close()
+
+        self.assertEqual(self.server.messages, 20)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_pool_reconnects_after_disconnect(self):
+        pool = SMTPPool(self.host, self.port, starttls=False, size=1)
+        pool.send(make_message(1))
+        self.server.drop_connections()
+        pool.send(make_message(2))
+        pool.close()
+
+        self.assertEqual(self.server.messages, 2)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_idle_connections_are_checked_with_noop(self):
+        pool = SMTPPool(self.host, self.port, starttls=False, size=1, keepalive=0)
+        pool.send(make_message(1))
+        self.server.drop_connections()
+        pool.send(make_message(2))
+        pool.close()
+
+        self.assertEqual(self.server.messages, 2)
+
+    def test_failed_reset_frees_the_slot(self):
+        pool = SMTPPool(self.host, self.port, starttls=False, size=1)
+        with self.assertRaises(smtplib.SMTPResponseException):
+            with pool.connection() as smtp:
+                smtp.rset = lambda: (_ for _ in ()).throw(smtplib.SMTPResponseException(451, b'busy'))
+                raise smtplib.SMTPDataError(554, b'rejected')
+        # The session was discarded and its slot given back
+        self.assertEqual(pool.stats(), {'idle': 0, 'in_use': 0})
+        self.assertTrue(pool._slots.acquire(timeout=1))
+        pool._slots.release()
+        pool.send(make_message(1))
+        pool.close()
+        self.assertEqual(self.server.messages, 1)
+
+    def test_batcher_sends_batch_over_one_session(self):
+        batcher = SMTPBatcher(SMTPPool(self.host, self.port, starttls=False), window=0.05, max_size=100)
+        futures = [batcher.send(make_message(n)) for n in range(10)]
+        for future in futures:
+            future.result(timeout=5)
+        batcher.close()
+
+        self.assertEqual(self.server.messages, 10)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_batcher_sends_later_batches(self):
+        batcher = SMTPBatcher(SMTPPool(self.host, self.port, starttls=False), window=0.05, max_size=100)
+        batcher.send(make_message(1)).result(timeout=5)
+        # The flusher is idle now, and this batch is far below max_size
+        batcher.send(make_message(2)).result(timeout=5)
+        batcher.close()
+
+        self.assertEqual(self.server.messages, 2)
+
+    def test_batcher_coalesces_into_digest(self):
+        batcher = SMTPBatcher(SMTPPool(self.host, self.port, starttls=False), window=0.05, coalesce=True)
+        futures = [batcher.send(make_message(n)) for n in range(10)]
+        for future in futures:
+            future.result(timeout=5)
+        batcher.close()
+
+        self.assertEqual(self.server.messages, 1)
+
+    def test_sends_per_second_before_and_after_pooling(self):
+        count = 100
+
+        # Before: a fresh connection per message, as send_payload used to do
+        unpooled = time.perf_counter()
+        for n in range(count):
+            pool = SMTPPool(self.host, self.port, starttls=False, size=1)
+            pool.send(make_message(n))
+            pool.close()
+        unpooled = count / (time.perf_counter() - unpooled)
+
+        pool = SMTPPool(self.host, self.port, starttls=False, size=1)
+        pooled = time.perf_counter()
+        for n in range(count):
+            pool.send(make_message(n))
+        pooled = count / (time.perf_counter() - pooled)
+        pool.close()
+
+        self.wait_for_messages(2 * count)
+        print(f"\nSMTP sends/sec: unpooled={unpooled:.0f} pooled={pooled:.0f}")
+        self.assertEqual(self.server.connections, count + 1)
+        self.assertEqual(self.server.messages, 2 * count)
+
+
+if __name__ == '__main__':
+    unittest.main()
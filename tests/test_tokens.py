@@ -0,0 +1,36 @@
+import os
+import sys
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from auth.tokens import TokenCache
+
+
+class TestTokenCache(unittest.TestCase):
+
+    def test_claims_expire_with_the_token(self):
+        cache = TokenCache()
+        now = time.time()
+        cache.set('a.b.c', {'sub': 'user', 'exp': now + 60})
+        self.assertEqual(cache.get('a.b.c')['sub'], 'user')
+        with patch('time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(cache.get('a.b.c'))
+
+    def test_expired_and_unexpiring_tokens_are_not_cached(self):
+        cache = TokenCache()
+        cache.set('old', {'sub': 'user', 'exp': time.time() - 1})
+        cache.set('forever', {'sub': 'user'})
+        self.assertEqual(len(cache), 0)
+
+    def test_bounded(self):
+        cache = TokenCache(maxsize=2)
+        for token in ('one', 'two', 'three'):
+            cache.set(token, {'exp': time.time() + 60})
+        self.assertIsNone(cache.get('one'))
+        self.assertEqual(len(cache), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from storage.cache import LRUCache
+from storage.users import MemoryUserStore, SQLiteUserStore
+
+
+class TestSQLiteUserStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'users.db')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_persists_across_instances(self):
+        SQLiteUserStore(self.path).add('alice')
+        self.assertIn('alice', SQLiteUserStore(self.path))
+
+    def test_sees_writes_from_other_workers(self):
+        worker = SQLiteUserStore(self.path, cache_ttl=3600)
+        other = SQLiteUserStore(self.path)
+
+        # Cache a negative answer, then pay through another connection
+        self.assertNotIn('bob', worker)
+        other.add('bob')
+        self.assertIn('bob', worker)
+
+        other.discard('bob')
+        self.assertNotIn('bob', worker)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs fork')
+    def test_forked_worker_opens_its_own_connections(self):
+        # As a gunicorn worker of a preloaded app, which inherits the master's store
+        store = SQLiteUserStore(self.path)
+        store.add('alice')
+        parent = store.db.connect()
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            ok = store.db.connect() is not parent and 'alice' in store
+            store.add('bob')
+            os.write(write, b'1' if ok else b'0')
+            os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertEqual(os.read(read, 1), b'1')
+        self.assertIs(store.db.connect(), parent)
+        self.assertIn('bob', store)
+
+    def test_clear(self):
+        store = SQLiteUserStore(self.path)
+        store.add('carol')
+        store.clear()
+        self.assertNotIn('carol', store)
+
+
+class TestMemoryUserStore(unittest.TestCase):
+
+    def test_add_and_discard(self):
+        store = MemoryUserStore()
+        store.add('alice')
+        self.assertIn('alice', store)
+        store.discard('alice')
+        self.assertNotIn('alice', store)
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+    def test_entries_expire(self):
+        cache = LRUCache(ttl=0.05)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        time.sleep(0.06)
+        self.assertIsNone(cache.get('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
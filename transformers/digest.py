@@ -0,0 +1,236 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from observability import metrics
+from transformers.rules import lookup
+
+logger = logging.getLogger(__name__)
+
+# Distinct values tracked per field of a window; rarer ones are only counted
+MAX_VALUES = 64
+
+AGGREGATED = metrics.counter('webhookmaster_digest_events_total', 'Events folded into a digest window', ('source',))
+DIGESTS = metrics.counter('webhookmaster_digests_total', 'Digest windows flushed, by source', ('source',))
+
+
+class DigestRule:
+    """
+    How one source is aggregated: `key` is the dotted path of the parsed
+    field events are grouped by and `sums` the fields that are added up.
+    """
+
+    def __init__(self, key, sums=()):
+        self.key = key
+        self.path = tuple(key.split('.'))
+        self.sums = frozenset(sums)
+
+
+def parse_digest_rules(value):
+    """
+    Parses "github=repository:commits;shopify=currency:total_price" into rules.
+    """
+    rules = {}
+    for entry in value.split(';'):
+        if not entry.strip():
+            continue
+        source, _, spec = entry.partition('=')
+        key, _, sums = spec.partition(':')
+        if not key.strip():
+            raise ValueError(f"Invalid digest rule: {entry!r}")
+        rules[source.strip()] = DigestRule(key.strip(), [s.strip() for s in sums.split(',') if s.strip()])
+    return rules
+
+
+def _hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return str(value)
+    return value
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Window:
+    """
+    Events of one source, format and key, summarized as they arrive so the
+    window's memory does not grow with the number of events.
+    """
+
+    def __init__(self, source, output_format, first, deadline):
+        self.source = source
+        self.output_format = output_format
+        self.first = first
+        self.deadline = deadline
+        self.count = 0
+        self.totals = {}
+        self.values = {}
+        self.others = Counter()
+
+    def add(self, parsed, sums):
+        self.count += 1
+        for field, value in parsed.items():
+            if field in sums:
+                number = _number(value)
+                if number is not None:
+                    self.totals[field] = self.totals.get(field, 0) + number
+                continue
+            values = self.values.setdefault(field, Counter())
+            value = _hashable(value)
+            if value in values or len(values) < MAX_VALUES:
+                values[value] += 1
+            else:
+                self.others[field] += 1
+
+    def summary(self, top_n):
+        """
+        Returns the window as one parsed payload of the same shape: sums for
+        summed fields, the value itself for fields all events agree on, and
+        the most common values with their counts otherwise.
+        """
+        if self.count == 1:
+            return self.first
+        digest = {}
+        for field, values in self.values.items():
+            if len(values) == 1 and not self.others[field]:
+                digest[field] = next(iter(values))
+                continue
+            common = values.most_common(top_n)
+            parts = [str(value) if count == 1 else f"{value} ({count})" for value, count in common]
+            more = len(values) - len(common) + self.others[field]
+            if more:
+                parts.append(f"+{more} more")
+            digest[field] = ', '.join(parts)
+        for field, total in self.totals.items():
+            digest[field] = round(total, 2) if isinstance(total, float) else total
+        digest['events'] = self.count
+        digest['digest'] = True
+        return digest
+
+
+class DigestAggregator:
+    """
+    Groups the parsed events of bursty sources into tumbling windows and emits
+    one digest per window instead of one message per event.
+
+    A window opens with the first event for its key and is flushed `window`
+    seconds later through `emit(source, output_format, summary)`. At most
+    `max_keys` windows are open; when another is needed the oldest is flushed
+    early. Open windows are flushed by `close()`, which runs at exit.
+    """
+
+    def __init__(self, rules, emit, window=60, max_keys=10000, top_n=5):
+        self.rules = dict(rules)
+        self.emit = emit
+        self.window = window
+        self.max_keys = max_keys
+        self.top_n = top_n
+        # Windows all last as long, so insertion order is deadline order
+        self._windows = OrderedDict()
+        self._lock = threading.Condition()
+        self._pid = None
+        self._closed = False
+
+    def handles(self, source):
+        return source in self.rules
+
+    def add(self, source, output_format, parsed):
+        """
+        Folds a parsed event into its window and returns the window's key.
+        """
+        rule = self.rules[source]
+        key = (source, output_format, _hashable(lookup(parsed, rule.path)))
+        self._start()
+        evicted = None
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                if len(self._windows) >= self.max_keys:
+                    evicted = self._windows.popitem(last=False)[1]
+                window = self._windows[key] = Window(source, output_format, parsed, time.monotonic() + self.window)
+                self._lock.notify()
+            window.add(parsed, rule.sums)
+        AGGREGATED.inc((source,))
+        if evicted is not None:
+            self._flush(evicted)
+        return key[2]
+
+    def _start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Windows inherited from a parent process are the parent's to send
+            self._windows.clear()
+            self._closed = False
+            threading.Thread(target=self._run, name='digest-flusher', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._closed:
+                    now = time.monotonic()
+                    if self._windows:
+                        window = next(iter(self._windows.values()))
+                        if window.deadline <= now:
+                            break
+                        self._lock.wait(window.deadline - now)
+                    else:
+                        self._lock.wait()
+                if self._closed:
+                    return
+                window = self._windows.popitem(last=False)[1]
+            self._flush(window)
+
+    def _flush(self, window):
+        DIGESTS.inc((window.source,))
+        try:
+            self.emit(window.source, window.output_format, window.summary(self.top_n))
+        except Exception as e:
+            logger.error("Error emitting %s digest: %s", window.source, e, extra={'event': 'digest.failed'})
+
+    def flush(self):
+        """
+        Emits every open window now.
+        """
+        with self._lock:
+            windows = list(self._windows.values())
+            self._windows.clear()
+        for window in windows:
+            self._flush(window)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._lock.notify()
+        self.flush()
+
+    def __len__(self):
+        return len(self._windows)
+
+
+def create_aggregator(config, emit):
+    """
+    Builds the digest aggregator for the sources listed in DIGEST_SOURCES.
+    """
+    return DigestAggregator(
+        parse_digest_rules(config.DIGEST_SOURCES),
+        emit,
+        window=config.DIGEST_WINDOW,
+        max_keys=config.DIGEST_MAX_KEYS,
+        top_n=config.DIGEST_TOP_N,
+    )
@@ -0,0 +1,60 @@
+from typing import Any, Optional
+
+# Marks a path whose list is only counted, never decoded
+COUNTED = object()
+
+
+def field_tree(fields):
+    """
+    Turns JSON paths into a nested dict of the keys to decode.
+
+    Paths are dotted keys, like 'repository.full_name'. A path ending in '[]'
+    is a list whose elements are counted but not decoded. When a path and one
+    of its parents are both listed, the parent is decoded whole.
+    """
+    tree = {}
+    for path in fields:
+        counted = path.endswith('[]')
+        *parents, leaf = path.removesuffix('[]').split('.')
+        node = tree
+        for key in parents:
+            child = node.get(key)
+            if child is Any:
+                break
+            if not isinstance(child, dict):
+                child = node[key] = {}
+            node = child
+        else:
+            node[leaf] = COUNTED if counted else Any
+    return tree
+
+
+def build_schema(name, fields):
+    """
+    Builds a msgspec Struct that decodes only the given JSON paths.
+
+    Returns None when msgspec is not installed, in which case payloads are
+    decoded whole.
+    """
+    try:
+        import msgspec
+    except ImportError:
+        return None
+    return _struct(msgspec, name, field_tree(fields))
+
+
+def _struct(msgspec, name, tree):
+    fields = []
+    rename = {}
+    for index, (key, node) in enumerate(tree.items()):
+        if node is COUNTED:
+            field_type = Optional[list[msgspec.Raw]]
+        elif isinstance(node, dict):
+            field_type = Optional[_struct(msgspec, f"{name}_{index}", node)]
+        else:
+            field_type = Any
+        # JSON keys need not be identifiers, so attributes are renamed to them
+        attribute = f"field_{index}"
+        rename[attribute] = key
+        fields.append((attribute, field_type, None))
+    return msgspec.defstruct(name, fields, omit_defaults=True, rename=rename)
@@ -1,3 +1,6 @@
+# Only these paths are decoded from the request body; commits are just counted
+FIELDS = ('repository.full_name', 'pusher.name', 'commits[]')
+
 def parse_payload(data):
     """
     Parses a GitHub push event webhook payload.
@@ -1,3 +1,6 @@
+# Only these paths are decoded from the request body
+FIELDS = ('id', 'total_price', 'currency', 'email')
+
 def parse_payload(data):
     """
     Parses a Shopify orders/create webhook payload.
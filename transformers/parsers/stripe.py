@@ -1,3 +1,6 @@
+# Only these paths are decoded from the request body
+FIELDS = ('data.object.amount', 'data.object.currency', 'data.object.billing_details.email')
+
 def parse_payload(data):
     """
     Parses a Stripe charge.succeeded event webhook payload.
@@ -0,0 +1,100 @@
+import importlib
+import pkgutil
+import sys
+from importlib import metadata
+
+from transformers import formatters, parsers
+from transformers.fields import build_schema
+
+# Third-party packages can register extra transformers under these entry point
+# groups, pointing either at a module or directly at the function.
+PARSERS_ENTRY_POINT_GROUP = 'webhookmaster.parsers'
+FORMATTERS_ENTRY_POINT_GROUP = 'webhookmaster.formatters'
+
+
+def discover(package, attribute, group):
+    """
+    Finds every transformer function in a package and in an entry point group.
+    """
+    found = {}
+    for module_info in pkgutil.iter_modules(package.__path__):
+        if module_info.name.startswith('_'):
+            continue
+        module = importlib.import_module(f"{package.__name__}.{module_info.name}")
+        func = getattr(module, attribute, None)
+        if callable(func):
+            found[module_info.name] = func
+
+    for entry_point in metadata.entry_points(group=group):
+        loaded = entry_point.load()
+        found[entry_point.name] = getattr(loaded, attribute, loaded)
+
+    return found
+
+
+def compose(parse, format_):
+    def pipeline(data):
+        return format_(parse(data))
+    return pipeline
+
+
+class Registry:
+    """
+    Resolves a (source, format) pair to a ready-made parse-then-format callable.
+    """
+
+    def __init__(self, parsers, formatters, schemas=None):
+        self.parsers = dict(parsers)
+        self.formatters = dict(formatters)
+        self.schemas = dict(schemas or {})
+        self.sources = frozenset(self.parsers)
+        self.formats = frozenset(self.formatters)
+        self._pipelines = {
+            (source, output_format): compose(parse, format_)
+            for source, parse in self.parsers.items()
+            for output_format, format_ in self.formatters.items()
+        }
+
+    def pipeline(self, source, output_format):
+        """
+        Returns the pipeline for a source and format, or None if either is unknown.
+        """
+        return self._pipelines.get((source, output_format))
+
+    def schema(self, source):
+        """
+        Returns the type a source's payload can be decoded into, if it declares one.
+        """
+        return self.schemas.get(source)
+
+
+def find_schemas(parsers):
+    """
+    Collects the optional SCHEMA or FIELDS declared next to each parser function.
+
+    A schema is a msgspec Struct listing only the fields the parser reads, so
+    the rest of a large payload is skipped while decoding. FIELDS lists the
+    JSON paths the parser reads and is turned into a schema when msgspec is
+    installed.
+    """
+    schemas = {}
+    for source, parse in parsers.items():
+        module = sys.modules.get(parse.__module__)
+        schema = getattr(module, 'SCHEMA', None)
+        if schema is None and getattr(module, 'FIELDS', None):
+            schema = build_schema(f"{source.title()}Payload", module.FIELDS)
+        if schema is not None:
+            schemas[source] = schema
+    return schemas
+
+
+def load_registry():
+    """
+    Builds the registry from the bundled transformers and installed plugins.
+    """
+    found = discover(parsers, 'parse_payload', PARSERS_ENTRY_POINT_GROUP)
+    return Registry(
+        found,
+        discover(formatters, 'format_payload', FORMATTERS_ENTRY_POINT_GROUP),
+        find_schemas(found),
+    )
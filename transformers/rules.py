@@ -0,0 +1,169 @@
+import ast
+import hashlib
+import json
+import threading
+
+# Functions conditions and templates may call
+FUNCTIONS = {
+    'len': len,
+    'str': str,
+    'int': int,
+    'float': float,
+    'round': round,
+    'abs': abs,
+    'min': min,
+    'max': max,
+    'lower': lambda value: str(value).lower(),
+    'upper': lambda value: str(value).upper(),
+}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn, ast.Is, ast.IsNot,
+    ast.IfExp, ast.Call, ast.Name, ast.Attribute, ast.Subscript, ast.Load,
+    ast.Constant, ast.List, ast.Tuple, ast.Dict, ast.JoinedStr, ast.FormattedValue,
+)
+
+
+class RuleError(ValueError):
+    """
+    Raised when a condition or template cannot be compiled.
+    """
+
+
+def lookup(value, keys):
+    """
+    Follows a path of dict keys and list indexes, returning None where it breaks off.
+    """
+    for key in keys:
+        if isinstance(value, dict):
+            value = value.get(key)
+        elif isinstance(value, list) and isinstance(key, int) and -len(value) <= key < len(value):
+            value = value[key]
+        else:
+            return None
+    return value
+
+
+def _path(node):
+    if isinstance(node, ast.Name):
+        return (node.id,)
+    if isinstance(node, ast.Attribute):
+        return _path(node.value) + (node.attr,)
+    if isinstance(node, ast.Subscript) and isinstance(node.slice, ast.Constant):
+        return _path(node.value) + (node.slice.value,)
+    raise RuleError(f"Unsupported expression: {ast.unparse(node)}")
+
+
+class _Rewriter(ast.NodeTransformer):
+    """
+    Turns field references into lookups on the payload and checks that only
+    plain expressions and whitelisted functions are used.
+    """
+
+    def generic_visit(self, node):
+        if not isinstance(node, ALLOWED_NODES):
+            raise RuleError(f"Unsupported syntax: {type(node).__name__}")
+        return super().generic_visit(node)
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+            raise RuleError(f"Unsupported call: {ast.unparse(node)}")
+        node.args = [self.visit(arg) for arg in node.args]
+        node.func = ast.Name(f"_fn_{node.func.id}", ast.Load())
+        return node
+
+    def _field(self, node):
+        return ast.Call(ast.Name('_lookup', ast.Load()), [ast.Name('data', ast.Load()), ast.Constant(_path(node))], [])
+
+    visit_Name = visit_Attribute = visit_Subscript = _field
+
+
+def _compile(body, name):
+    function = ast.Expression(ast.Lambda(
+        ast.arguments(posonlyargs=[], args=[ast.arg('data')], kwonlyargs=[], kw_defaults=[], defaults=[]),
+        _Rewriter().visit(body),
+    ))
+    ast.fix_missing_locations(function)
+    namespace = {'__builtins__': {}, '_lookup': lookup}
+    namespace.update({f"_fn_{key}": func for key, func in FUNCTIONS.items()})
+    return eval(compile(function, name, 'eval'), namespace)
+
+
+def _parse(text):
+    try:
+        return ast.parse(text.strip(), mode='eval').body
+    except SyntaxError as e:
+        raise RuleError(f"Invalid expression {text!r}: {e.msg}") from e
+
+
+def _template_node(value):
+    if isinstance(value, dict):
+        return ast.Dict([ast.Constant(str(key)) for key in value], [_template_node(item) for item in value.values()])
+    if isinstance(value, list):
+        return ast.List([_template_node(item) for item in value], ast.Load())
+    if isinstance(value, str) and '{' in value:
+        node = _parse('f' + repr(value))
+        # A lone placeholder keeps the type of its value
+        if len(node.values) == 1 and isinstance(node.values[0], ast.FormattedValue):
+            placeholder = node.values[0]
+            if placeholder.conversion == -1 and placeholder.format_spec is None:
+                return placeholder.value
+        return node
+    return ast.Constant(value)
+
+
+class _Cache:
+    """
+    Compiled conditions and templates, keyed by a hash of their definition.
+    """
+
+    def __init__(self):
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind, definition, build):
+        key = (kind, hashlib.sha256(json.dumps(definition, sort_keys=True).encode()).hexdigest())
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = build()
+            with self._lock:
+                compiled = self._compiled.setdefault(key, compiled)
+        return compiled
+
+
+_cache = _Cache()
+
+
+def compile_condition(text):
+    """
+    Compiles a condition like `event_type == "charge.succeeded" and amount > 100`
+    into a function of the payload returning True or False.
+
+    Names are dotted paths into the payload; missing fields are None. A
+    condition that fails while evaluating, say by comparing None with a
+    number, is False.
+    """
+    def build():
+        test = _compile(_parse(text), f"<condition {text!r}>")
+
+        def condition(data):
+            try:
+                return bool(test(data))
+            except Exception:
+                return False
+        return condition
+    return _cache.get('condition', text, build)
+
+
+def compile_template(template):
+    """
+    Compiles an output template into a function of the payload.
+
+    The template is any JSON value. Strings are f-strings whose placeholders
+    are expressions on the payload, like "Charge of {amount / 100:.2f}
+    {upper(currency)}"; a string that is a single placeholder keeps the
+    value's type.
+    """
+    return _cache.get('template', template, lambda: _compile(_template_node(template), '<template>'))